@@ -1,28 +1,241 @@
 import asyncio
 import importlib
-from urllib.parse import urlparse
+import logging
+import re
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from weakref import WeakKeyDictionary
 
 from zope.interface import implementer
 import aiopg
+import psycopg2
 
 from aiorm.interfaces import IDriver
 
 
+log = logging.getLogger(__name__)
+
+INVALID_SQL_STATEMENT_NAME = '26000'
+
+_placeholders = re.compile('%(s|%)')
+
+
+def _to_server_placeholders(query):
+    """
+    Convert the psycopg2 placeholders of the query to the $n one of
+    PREPARE, return the converted query and the number of parameters.
+    """
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(1) == '%':
+            return '%'
+        count += 1
+        return '${}'.format(count)
+
+    return _placeholders.sub(replace, query), count
+
+
+def _in_failed_transaction(cursor):
+    """ True if an error aborted the transaction of the cursor """
+    status = cursor.raw.connection.get_transaction_status()
+    return status == psycopg2.extensions.TRANSACTION_STATUS_INERROR
+
+
+def _is_true(value):
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+class PreparedStatements:
+    """
+    LRU of the statements prepared on a connection.
+
+    Every distinct query is prepared once, then executed with its
+    parameters. The least recently used statements are deallocated.
+    """
+    preparable = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'VALUES', 'WITH')
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._statements = OrderedDict()  # query -> (name, EXECUTE query)
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._statements)
+
+    @asyncio.coroutine
+    def _prepare(self, cursor, query):
+        try:
+            statement = self._statements[query][1]
+            self._statements.move_to_end(query)
+            return statement
+        except KeyError:
+            pass
+
+        while len(self._statements) >= self.maxsize:
+            _, (name, _) = self._statements.popitem(last=False)
+            yield from cursor.execute('DEALLOCATE {}'.format(name))
+
+        self._counter += 1
+        name = 'aiorm_{}'.format(self._counter)
+        prepared, count = _to_server_placeholders(query)
+        yield from cursor.execute('PREPARE {} AS {}'.format(name, prepared))
+        statement = 'EXECUTE {}'.format(name)
+        if count:
+            statement += ' ({})'.format(', '.join(['%s'] * count))
+        self._statements[query] = (name, statement)
+        return statement
+
+    @asyncio.coroutine
+    def execute(self, cursor, query, parameters=None):
+        if not query.lstrip()[:6].upper().startswith(self.preparable):
+            return (yield from cursor.execute(query, parameters))
+
+        statement = yield from self._prepare(cursor, query)
+        try:
+            return (yield from cursor.execute(statement, parameters))
+        except psycopg2.Error as exc:
+            if exc.pgcode != INVALID_SQL_STATEMENT_NAME:
+                raise
+            # The server forgot the prepared statements (DISCARD ALL, ...)
+            self._statements.clear()
+            if _in_failed_transaction(cursor):
+                raise  # the transaction is aborted, a retry would fail
+        statement = yield from self._prepare(cursor, query)
+        return (yield from cursor.execute(statement, parameters))
+
+
+class PooledCursor:
+    """
+    Cursor proxy that executes queries through the driver, as prepared
+    statements or counted to recycle the connection
+    """
+
+    def __init__(self, cursor, driver):
+        self._cursor = cursor
+        self._driver = driver
+
+    def execute(self, query, parameters=None):
+        # return the coroutine
+        return self._driver.execute(self._cursor, query, parameters)
+
+    def __getattr__(self, key):
+        return getattr(self._cursor, key)
+
+
+class PooledCursorContext:
+    """ Wrap the context manager returned by the pool cursor method """
+
+    def __init__(self, context, driver):
+        self._context = context
+        self._driver = driver
+        self._connection = None
+
+    def __enter__(self):
+        cursor = self._context.__enter__()
+        self._connection = cursor.connection
+        return PooledCursor(cursor, self._driver)
+
+    def __exit__(self, type, value, traceback):
+        try:
+            return self._context.__exit__(type, value, traceback)
+        finally:
+            self._driver.recycle(self._connection)
+
+
+class PooledConnection:
+    """ Connection proxy whose cursors execute queries through the driver """
+
+    def __init__(self, connection, driver):
+        self.connection = connection
+        self._driver = driver
+
+    @asyncio.coroutine
+    def cursor(self, *args, **kwargs):
+        cursor = yield from self.connection.cursor(*args, **kwargs)
+        return PooledCursor(cursor, self._driver)
+
+    def __getattr__(self, key):
+        return getattr(self.connection, key)
+
+
+_pool_options = {
+    # option: (type, create_pool parameter)
+    'minsize': (int, 'minsize'),
+    'maxsize': (int, 'maxsize'),
+    'timeout': (float, 'timeout'),
+    'max_idle': (float, 'pool_recycle'),
+    'max_lifetime': (float, None),
+    'max_queries': (int, None),
+    'warmup': (int, None),
+    'prepared': (None, None),
+    'statement_cache_size': (int, None),
+}
+
+
 @implementer(IDriver)
 class Driver:
     """ Apium driver handle the high level api of the broker communication.
     It is expose has a singleton to be the mediator for tasks treatment.
+
+    Server side prepared statements are enabled using the ``prepared``
+    parameter of the url, ``statement_cache_size`` is the number of
+    statements kept prepared per connection, e.g.
+    ``postgresql://localhost/db?prepared=true&statement_cache_size=100``
+
+    The pool is configured by parameters of the url, or keyword arguments
+    of ``connect``:
+
+     * ``minsize``, ``maxsize``: number of connections of the pool,
+     * ``timeout``: seconds to wait for a connection or a query,
+     * ``max_idle``: seconds a free connection is kept,
+     * ``max_lifetime``: seconds a connection is used before being closed,
+     * ``max_queries``: queries run on a connection before it is closed,
+     * ``warmup``: connections opened by ``connect``, up to ``maxsize``.
+
+    Unknown parameters or arguments raise a ``ValueError``.
     """
 
     def __init__(self):
         self.pool = None
+        self.prepared = False
+        self.statement_cache_size = 100
+        self.max_lifetime = None
+        self.max_queries = None
+        # per pooled connection, recycled connections comes with a new one
+        self._prepared_statements = WeakKeyDictionary()
+        self._queries = WeakKeyDictionary()
+        self._opened_at = WeakKeyDictionary()
 
     @asyncio.coroutine
-    def connect(self, url):
+    def connect(self, url, **options):
         """ create the driver and connect from the given url """
         url = urlparse(url)
         if url.scheme not in ('postgresql', 'aiopg+postgresql'):
             raise ValueError('Invalid scheme')
+        url_options = {key: val[-1]
+                       for key, val in parse_qs(url.query).items()}
+        url_options.update(options)
+        options = url_options
+        invalid = set(options) - set(_pool_options)
+        if invalid:
+            raise ValueError('Invalid options {}'.format(
+                ', '.join(sorted(invalid))))
+        prepared = options.get('prepared', False)
+        self.prepared = (_is_true(prepared) if isinstance(prepared, str)
+                         else bool(prepared))
+        pool_kwargs = {}
+        for key, (type_, parameter) in _pool_options.items():
+            if type_ is None or options.get(key) is None:
+                continue
+            value = type_(options[key])
+            if parameter is not None:
+                pool_kwargs[parameter] = value
+            else:
+                setattr(self, key, value)
+        if self.max_lifetime is not None:
+            pool_kwargs['on_connect'] = self._on_connect
 
         self.database = url.path[1:]
         self.pool = yield from aiopg.create_pool(
@@ -30,21 +243,99 @@ class Driver:
             port=url.port or 5432,
             user=url.username or 'postgres',
             password=url.password or 'secret',
-            database=self.database)
+            database=self.database,
+            **pool_kwargs)
+        if options.get('warmup'):
+            yield from self._warmup(int(options['warmup']))
+
+    @asyncio.coroutine
+    def _warmup(self, count):
+        """ Open connections, kept free in the pool, up to its maxsize """
+        connections = []
+        try:
+            for _ in range(min(count, self.pool.maxsize)):
+                connections.append((yield from self.pool.acquire()))
+        finally:
+            for connection in connections:
+                self.pool.release(connection)
+
+    @asyncio.coroutine
+    def _on_connect(self, connection):
+        self._opened_at[connection] = asyncio.get_event_loop().time()
 
     @asyncio.coroutine
     def disconnect(self):
         yield from self.pool.clear()
 
+    def prepared_statements(self, connection):
+        """ Return the statements prepared on the given connection """
+        try:
+            return self._prepared_statements[connection]
+        except KeyError:
+            statements = PreparedStatements(self.statement_cache_size)
+            self._prepared_statements[connection] = statements
+            return statements
+
+    def execute(self, cursor, query, parameters=None):
+        """ Execute a query with a cursor of the pool, return the coroutine """
+        connection = cursor.connection
+        if self.max_queries is not None:
+            self._queries[connection] = self._queries.get(connection, 0) + 1
+        if self.prepared:
+            return self.prepared_statements(connection).execute(
+                cursor, query, parameters)
+        return cursor.execute(query, parameters)
+
+    def recycle(self, connection):
+        """
+        Close a connection released to the pool if it ran too many queries
+        or is too old, the pool discards its closed connections.
+        """
+        if connection is None or connection.closed:
+            return
+        expired = (self.max_queries is not None and
+                   self._queries.get(connection, 0) >= self.max_queries)
+        if not expired and self.max_lifetime is not None:
+            now = asyncio.get_event_loop().time()
+            opened_at = self._opened_at.setdefault(connection, now)
+            expired = now - opened_at >= self.max_lifetime
+        if expired:
+            log.debug('Recycling connection {!r}'.format(connection))
+            connection.close()
+
+    @property
+    def _pooled(self):
+        """ True if the queries are executed through the driver """
+        return bool(self.prepared or self.max_queries is not None or
+                    self.max_lifetime is not None)
+
     # Used for context manager access
 
     def cursor(self):
+        if self._pooled:
+            return self._pooled_cursor()
         return self.pool.cursor()  # return the coroutine
 
+    @asyncio.coroutine
+    def _pooled_cursor(self):
+        context = yield from self.pool.cursor()
+        return PooledCursorContext(context, self)
+
     # Used for transaction
 
     def acquire(self):
+        if self._pooled:
+            return self._pooled_acquire()
         return self.pool.acquire()  # return the coroutine
 
+    @asyncio.coroutine
+    def _pooled_acquire(self):
+        connection = yield from self.pool.acquire()
+        return PooledConnection(connection, self)
+
     def release(self, connection):
-        return self.pool.release(connection)
+        if isinstance(connection, PooledConnection):
+            connection = connection.connection
+        released = self.pool.release(connection)
+        self.recycle(connection)
+        return released
@@ -8,9 +8,9 @@ class IDriver(Interface):
     database = Attribute(""" The connected database or None if not connected
                          """)
 
-    def connect(self, url):
+    def connect(self, url, **options):
         """ coroutine that connect the driver using parameters from the
-        given url """
+        given url, overridden by the options """
 
     def cursor(self):
         """ coroutine that retrieve a cursor to execute sql query """
@@ -2,7 +2,7 @@ from weakref import WeakKeyDictionary
 import copy
 
 from ..query import operators
-from .meta import db
+from .meta import db, get_values, _unset
 
 
 class ImmutableFieldUpdateError(Exception):
@@ -10,7 +10,7 @@ class ImmutableFieldUpdateError(Exception):
         super().__init__("You can't update a field declared immutable ({}.{} = {})"
                          ''.format(model.__class__.__name__,
                                    column.name,
-                                   column.data.get(model)))
+                                   column._get_model(model)))
 
 
 class BaseField:
@@ -63,6 +63,16 @@ class BaseColumn(BaseField):
         self.unique = unique
         self.immutable = immutable
         self.primary_key = primary_key
+        # position of the column in the values of the models, set by the
+        # scan. Models of not scanned tables store their values in data.
+        self.index = None
+
+    def _get_model(self, model):
+        try:
+            value = model.__dict__['__values__'][self.index]
+        except (KeyError, TypeError):
+            return self.data.get(model, self.default_value)
+        return self.default_value if value is _unset else value
 
     def _get_model_cls(self, model_cls):
         # class access
@@ -87,13 +97,22 @@ class BaseColumn(BaseField):
         return self
 
     def __set__(self, model, value):
+        if self.index is None:
+            current = self.data.get(model, _unset)
+        else:
+            values = get_values(model)
+            current = values[self.index]
 
         if (self.immutable and
-            self.data.get(model, value) != value
+            current is not _unset and
+            current != value
             ):
             raise ImmutableFieldUpdateError(model, self)
 
-        self.data[model] = value
+        if self.index is None:
+            self.data[model] = value
+        else:
+            values[self.index] = value
 
     def __eq__(self, value):
         return operators.equal(self, value)
@@ -135,9 +154,6 @@ class Column(BaseColumn):
         for key, val in options.items():
             setattr(self.type, key, val)
 
-    def _get_model(self, model):
-        return self.data.get(model, self.default_value)
-
     def render_sql(self, renderer):
         return renderer.render_column(self)
 
@@ -181,9 +197,6 @@ class ForeignKey(BaseColumn):
     def render_sql(self, renderer):
         return renderer.render_foreign_key(self)
 
-    def _get_model(self, model):
-        return self.data.get(model, self.options.get('default'))
-
     def _get_model_cls(self, model_cls):
         super()._get_model_cls(model_cls)
         if not hasattr(self.model, '__meta__'):
@@ -1,5 +1,7 @@
+import copy
 import logging
 from collections import defaultdict
+from types import MappingProxyType
 
 log =logging.getLogger(__name__)
 
@@ -34,3 +36,126 @@ def list_tables(database):
 
 def list_all_tables():
     return {dbname: list_tables(dbname) for dbname in db}
+
+
+class CompiledMeta:
+    """
+    Read only metadata of a model, computed once by ``orm.scan``.
+
+    It holds the SQL fragments the dialects only have to assemble.
+    """
+
+    __slots__ = ('tablename', 'alias', 'columns', 'attributes',
+                 'select_from', 'primary_key', 'primary_key_attributes',
+                 'primary_key_indexes', 'get_where', 'pk_where',
+                 'insert_attributes', 'insert_fields', 'insert_placeholders',
+                 'returning', 'update_columns', 'update_attributes',
+                 'update_set',
+                 'relations',
+                 )
+
+    def __init__(self, model_class, relations=None):
+        meta = model_class.__meta__
+        columns = tuple(meta['columns'])
+        attributes = tuple(meta['attributes'][col] for col in columns)
+        fields = [getattr(model_class, attr) for attr in attributes]
+        primary_key = tuple(sorted(meta['primary_key'].keys()))
+
+        init = super().__setattr__
+        init('tablename', meta['tablename'])
+        init('alias', meta['alias'])
+        init('columns', columns)
+        init('attributes', attributes)
+        init('select_from', 'SELECT {}\nFROM "{}" AS {}\n'.format(
+            ', '.join('{}."{}"'.format(meta['alias'], col) for col in columns),
+            meta['tablename'],
+            meta['alias']))
+
+        init('primary_key', primary_key)
+        init('primary_key_attributes',
+             tuple(meta['attributes'][col] for col in primary_key))
+        init('primary_key_indexes',
+             tuple(columns.index(col) for col in primary_key))
+        init('get_where', ' AND '.join('{}."{}" = %s'.format(meta['alias'],
+                                                             col)
+                                       for col in primary_key))
+        init('pk_where', ' AND '.join('"{}" = %s'.format(col)
+                                      for col in primary_key))
+
+        insert = [(col, attr)
+                  for col, attr, field in zip(columns, attributes, fields)
+                  if not field.autofield]
+        init('insert_attributes', tuple(attr for _, attr in insert))
+        init('insert_fields', ', '.join('"{}"'.format(col)
+                                        for col, _ in insert))
+        init('insert_placeholders', ', '.join('%s' for _ in insert))
+        init('returning', ', '.join('"{}"'.format(col) for col in columns))
+
+        update = [(col, attr)
+                  for col, attr, field in zip(columns, attributes, fields)
+                  if not field.immutable]
+        init('update_columns', tuple(col for col, _ in update))
+        init('update_attributes', tuple(attr for _, attr in update))
+        init('update_set', ', '.join('"{}" = %s'.format(col)
+                                     for col, _ in update))
+        init('relations', MappingProxyType(dict(relations or {})))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} is read only'.format(
+            self.__class__.__name__))
+
+    def __delattr__(self, key):
+        raise AttributeError('{} is read only'.format(
+            self.__class__.__name__))
+
+
+_unset = object()
+
+
+def get_values(model):
+    """
+    Return the list of the column values of a scanned model, in the columns
+    order. Values never set are ``_unset``.
+    """
+    try:
+        return model.__dict__['__values__']
+    except KeyError:
+        values = [_unset] * len(model.__meta__['columns'])
+        model.__dict__['__values__'] = values
+        return values
+
+
+def set_values(model, row):
+    """ Set all the column values of a scanned model from a row at once """
+    model.__dict__['__values__'] = list(row)
+
+
+def mark_loaded(model):
+    """
+    Record the current values of the model as the loaded ones, so updates
+    only write the columns changed since then.
+    Mutable values (dict, list) are copied to detect in place changes.
+    """
+    loaded = tuple(get_values(model))
+    if any(isinstance(value, (dict, list)) for value in loaded):
+        loaded = tuple(copy.deepcopy(value)
+                       if isinstance(value, (dict, list)) else value
+                       for value in loaded)
+    model.__dict__['__loaded__'] = loaded
+
+
+def changed_columns(model):
+    """
+    Return the name of the columns changed since the model was loaded,
+    or None if the model has not been loaded from the database.
+    """
+    try:
+        loaded = model.__dict__['__loaded__']
+    except KeyError:
+        return None
+    compiled = model.__meta__['compiled']
+    updatable = set(compiled.update_columns)
+    return [col for col, value, loaded_value in zip(compiled.columns,
+                                                    get_values(model),
+                                                    loaded)
+            if col in updatable and value != loaded_value]
@@ -2,19 +2,40 @@ import asyncio
 
 from .meta import db
 from .columns import BaseField
-from ..query import Select
+from ..query import Select, any_
+from ..query.events import subscribe
+from ..query.loader import get_loader
+from ..query.statements import SelectRelated
 
 
 class BaseRelation(BaseField):
 
+    def __init__(self, *args, **options):
+        super().__init__(*args, **options)
+        self.target = None  # the related model, set once resolved
+
     def _get_model_cls(self, model):
         ret = super()._get_model_cls(model)
-        self._resolve_foreign_keys()
+        if self.target is None:
+            self._resolve_foreign_keys()
         return ret
 
     def _resolve_foreign_keys(self):
         raise NotImplementedError
 
+    def invalidate(self, model=None):
+        """ Forget the loaded relation of the model, or of every models """
+        if model is None:
+            self.data.clear()
+        else:
+            self.data.pop(model, None)
+
+    @asyncio.coroutine
+    def refresh(self, model):
+        """ Load the relation of the model from the database again """
+        self.invalidate(model)
+        return (yield from self._get_model(model))
+
 
 class OneToOne(BaseRelation):
 
@@ -32,16 +53,28 @@ class OneToOne(BaseRelation):
             try:
                 self.foreign_key = getattr(db[meta['database']][table], field)
             except KeyError:
-                pass # The model has not been scanned
+                return # The model has not been scanned
+        self.target = self._get_target()
+
+    def _get_target(self):
+        # the foreign key may itself not be resolved yet
+        return getattr(self.foreign_key.foreign_key, 'model', None)
 
     @asyncio.coroutine
     def _get_model(self, model):
+        """
+        Load the related model, the loads of the models of the same target
+        requested in the same loop iteration are done in a single query.
+        """
         if model not in self.data:
-            self._resolve_foreign_keys()
-            fkey = self.foreign_key.foreign_key
-            value = self.model.__meta__['pkv'](model)[fkey.name]
-            data = (yield from Select(fkey.model).where(fkey == value)
-                                                 .run(fetchall=False))
+            value = getattr(model, self.model.__meta__['attributes'][
+                self.foreign_key.name])
+            if value is None:
+                data = None
+            else:
+                # the load is shared, cancelling a waiter must not cancel it
+                data = yield from asyncio.shield(
+                    get_loader(self.foreign_key.foreign_key).load(value))
             self.data[model] = data
         return self.data[model]
 
@@ -54,24 +87,95 @@ class OneToOne(BaseRelation):
         setattr(model, self.foreign_key.name, value)
 
 
-class OneToMany(OneToOne):
+class _CachedRelation:
+    """
+    A relation loading many models. With ``cache`` set, the loaded models
+    are kept per instance until a write of the related tables touches
+    them, or until the relation is invalidated.
+    """
+
+    def _init_cache(self, cache):
+        self.cache = cache
+        self._generation = 0  # incremented on every invalidation
+
+    def invalidate(self, model=None):
+        self._generation += 1
+        super().invalidate(model)
+
+    def _invalidate_values(self, attr, values):
+        """ Invalidate the models whose attribute is one of the values """
+        if values is None:
+            self.invalidate()
+            return
+        for model in list(self.data.keys()):
+            if getattr(model, attr) in values:
+                self.invalidate(model)
+
+    @asyncio.coroutine
+    def _load_cached(self, model, query):
+        if not self.cache:
+            return (yield from query.run())
+        generation = self._generation
+        models = list((yield from query.run()))
+        # do not keep a result loaded concurrently with a write
+        if generation == self._generation:
+            self.data[model] = models
+        return iter(models)
+
+
+class OneToMany(_CachedRelation, OneToOne):
+
+    def __init__(self, foreign_key, cache=False, **option):
+        super().__init__(foreign_key, **option)
+        self._init_cache(cache)
 
     def render_sql(self, renderer):
         renderer.render_one_to_many(self)
 
+    def _resolve_foreign_keys(self):
+        super()._resolve_foreign_keys()
+        if self.cache and self.target is not None:
+            subscribe(self._on_write, self.target)
+
+    def _get_target(self):
+        return self.foreign_key.model
+
+    def _on_write(self, event):
+        fkey = self.foreign_key
+        self._invalidate_values(
+            self.model.__meta__['attributes'][fkey.foreign_key.name],
+            event.values(fkey.name))
+
     @asyncio.coroutine
     def _get_model(self, model):
-        self._resolve_foreign_keys()
+        if model in self.data:  # prefetched or cached
+            return iter(self.data[model])
         fkey = self.foreign_key
         value = self.model.__meta__['pkv'](model)[fkey.foreign_key.name]
-        return (yield from Select(fkey.model).where(fkey == value)
-                                             .run())
+        return (yield from self._load_cached(
+            model, Select(fkey.model).where(fkey == value)))
+
+    @asyncio.coroutine
+    def prefetch(self, models, cursor=None):
+        """ Load the relation of all the models with a single query """
+        fkey = self.foreign_key
+        attr = self.model.__meta__['attributes'][fkey.foreign_key.name]
+        children = {}
+        for model in models:
+            self.data[model] = children.setdefault(getattr(model, attr), [])
+        keys = [key for key in children if key is not None]
+        if not keys:
+            return
+        attr = fkey.model.__meta__['attributes'][fkey.name]
+        for child in (yield from Select(fkey.model)
+                      .where(any_(fkey, keys)).run(cursor=cursor)):
+            children[getattr(child, attr)].append(child)
 
     def __set__(self, model, value):
         raise TypeError('Cannot set a value for OneToMany, must append/remove')
 
 
-class ManyToMany(BaseRelation):
+class ManyToMany(_CachedRelation, BaseRelation):
     """
     Describe a relation using 3 tables.
      * the table where the ManyToMany relation is described
@@ -79,10 +183,13 @@ class ManyToMany(BaseRelation):
      * the secondary containing foreign keys between the two other tables
     """
 
-    def __init__(self, foreign_model, secondary):
+    def __init__(self, foreign_model, secondary, cache=False):
         super().__init__(None)
         self.foreign_model = foreign_model
         self.secondary = secondary
+        # (secondary column, model attribute) joining the secondary table
+        self.secondary_keys = ()
+        self._init_cache(cache)
 
     def render_sql(self, renderer):
         renderer.render_many_to_many(self)
@@ -95,21 +202,57 @@ class ManyToMany(BaseRelation):
             if isinstance(self.secondary, str):
                 self.secondary = db[meta['database']][self.secondary]
         except KeyError:
-            pass # The model has not been scanned
+            return # The model has not been scanned
+        self.secondary_keys = tuple(
+            (name, foreign_key.foreign_key.name)
+            for (name, foreign_key) in
+                self.secondary.__meta__['foreign_keys'].items()
+            if foreign_key.foreign_key.model == self.model)
+        self.target = self.foreign_model
+        if self.cache:
+            subscribe(self._on_secondary_write, self.secondary)
+            subscribe(self._on_target_write, self.target)
+
+    def _on_secondary_write(self, event):
+        if len(self.secondary_keys) != 1:
+            self.invalidate()
+            return
+        (name, attr), = self.secondary_keys
+        self._invalidate_values(attr, event.values(name))
+
+    def _on_target_write(self, event):
+        # inserted models are not related until the secondary is written
+        if event.action != 'insert':
+            self.invalidate()
 
     @asyncio.coroutine
     def _get_model(self, model):
-        self._resolve_foreign_keys()
-        condition = [(getattr(self.secondary, name) ==
-                      getattr(model, foreign_model.foreign_key.name)
-                      )
-                     for (name, foreign_model) in
-                        self.secondary.__meta__['foreign_keys'].items()
-                     if foreign_model.foreign_key.model == model.__class__]
-
-        return (yield from Select(self.foreign_model)
-                .join(self.secondary)
-                .where(*condition).run())
+        if model in self.data:  # prefetched or cached
+            return iter(self.data[model])
+        condition = [(getattr(self.secondary, name) == getattr(model, attr))
+                     for (name, attr) in self.secondary_keys]
+
+        return (yield from self._load_cached(
+            model, Select(self.foreign_model).join(self.secondary)
+                                             .where(*condition)))
+
+    @asyncio.coroutine
+    def prefetch(self, models, cursor=None):
+        """ Load the relation of all the models with a single query """
+        if len(self.secondary_keys) != 1:
+            raise RuntimeError('Cannot prefetch {}.{}, the secondary table '
+                               'must have one foreign key to it'.format(
+                                   self.model.__name__, self.name))
+        (_, attr), = self.secondary_keys
+        children = {}
+        for model in models:
+            self.data[model] = children.setdefault(getattr(model, attr), [])
+        keys = [key for key in children if key is not None]
+        if not keys:
+            return
+        for key, child in (yield from SelectRelated(self, keys)
+                           .run(cursor=cursor)):
+            children[key].append(child)
 
     def __set__(self, model, value):
         raise NotImplementedError
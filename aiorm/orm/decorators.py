@@ -6,6 +6,8 @@ import venusian
 
 from .declaration import Column, ForeignKey
 from .declaration import meta
+from .declaration.relations import BaseRelation
+from .query.cache import sql_cache
 
 
 log = logging.getLogger(__name__)
@@ -14,13 +16,24 @@ log = logging.getLogger(__name__)
 class table:
     """
     Decorator to register a table in a database.
+
+    With ``cache_results``, the rows of every Get and Select of the model
+    are kept in the result cache, for ``cache_results`` seconds if it is
+    a number, see :class:`aiorm.orm.query.statements.Cached`.
+
+    With a ``cache``, e.g. ``cache=orm.LRU(50000, ttl=30)``, the rows of
+    the model are kept by primary key and read by Get before querying,
+    see :class:`aiorm.orm.query.cache.EntityCache`.
     """
     _counter = 1
 
-    def __init__(self, database, collation='en_US.UTF8', name=None):
+    def __init__(self, database, collation='en_US.UTF8', name=None,
+                 cache_results=False, cache=None):
         self.database = database
         self.collation = collation
         self.name = name
+        self.cache_results = cache_results
+        self.cache = cache
 
     def __call__(self, wrapped):
 
@@ -37,6 +50,9 @@ class table:
                      'primary_key': {},
                      'pkv': None,
                      'foreign_keys': {},
+                     'compiled': None,  # populated by the scan
+                     'cache_results': self.cache_results,
+                     'cache': self.cache,
                      })
 
             self.__class__._counter += 1
@@ -74,3 +90,22 @@ def scan(*modules):
                        if isinstance(getattr(table, attr), (Column,
                                                             ForeignKey))}
             table.__meta__['attributes'] = fields
+
+            # models store their column values in a list, by column position
+            for index, column in enumerate(table.__meta__['columns']):
+                getattr(table, fields[column]).index = index
+
+    for dbname, db in meta.list_all_tables().items():
+        for table in db:
+            # every foreign keys are known, resolve the relations once
+            relations = {attr: getattr(table, attr)
+                         for attr in dir(table)
+                         if isinstance(getattr(table, attr), BaseRelation)}
+            for relation in relations.values():
+                relation._resolve_foreign_keys()
+            table.__meta__['compiled'] = meta.CompiledMeta(table, relations)
+            if table.__meta__['cache'] is not None:
+                table.__meta__['cache'].bind(table)
+
+    # table aliases may have changed, rendered queries are outdated
+    sql_cache.clear()
@@ -3,6 +3,11 @@
 SQL Dialect of postrgresql engine
 
 """
+import json
+import struct
+import uuid
+from datetime import datetime, timezone
+
 from  zope.interface import implementer, Interface, implementedBy
 
 from aiorm import registry
@@ -15,113 +20,303 @@ class Dialect:
     def __init__(self):
         self.query = ''
         self._from_model = None
+        self._where = False
         self.parameters = []
 
     def render_get(self, model_class, *primary_key, **primary_keys):
-        meta = model_class.__meta__
-        fields = ', '.join(['{}."{}"'.format(meta['alias'], col)
-                            for col in meta['columns']])
+        compiled = model_class.__meta__['compiled']
 
         if primary_key and primary_keys:
             raise RuntimeError('args and kwargs cannot be combined here')
 
         if primary_key:
-            if len(primary_key) > 1 or len(meta['primary_key']) > 1:
+            if len(primary_key) > 1 or len(compiled.primary_key) > 1:
                 raise RuntimeError('Cannot use args one multiple primary key')
-            where_clause = '{}."{}" = %s'.format(meta['alias'],
-                                                 list(meta['primary_key'].keys()
-                                                      )[0])
-            self.parameters.append(primary_key[0])
+            parameters = [primary_key[0]]
         elif primary_keys:
             try:
-                where_clause = []
-                for pkey in sorted(meta['primary_key'].keys()):
-                    where_clause.append('{}."{}" = %s'.format(meta['alias'],
-                                                              pkey))
-                    self.parameters.append(primary_keys[pkey])
+                parameters = [primary_keys[pkey]
+                              for pkey in compiled.primary_key]
             except KeyError as exc:
                 raise RuntimeError('Missing primary key value %s' % exc)
-
-            where_clause = ' AND '.join(where_clause)
         else:
             raise RuntimeError('Missing primary key value')
 
-        self.query += ('SELECT {}\n'
-                       'FROM "{}" AS {}\n'
-                       'WHERE {}\n').format(fields,
-                                            meta['tablename'],
-                                            meta['alias'],
-                                            where_clause)
-
-    def render_select(self, expression):
+        self.parameters.extend(parameters)
+        self.query += '{}WHERE {}\n'.format(compiled.select_from,
+                                            compiled.get_where)
+
+    def render_select(self, expression, join_load=()):
+        """
+        Render the select of an expression, a model or a function. The
+        models of the OneToOne relations in join_load are selected after
+        the model, left joined.
+        """
+        if join_load:
+            self._render_select_join_load(expression, join_load)
+            return
         if interfaces.IFunction.implementedBy(expression.__class__):
             model_class = expression.field.model
             meta = model_class.__meta__
             fields = expression.render_sql(self)
+            self.query += ('SELECT {}\n'
+                           'FROM "{}" AS {}\n').format(fields,
+                                                       meta['tablename'],
+                                                       meta['alias'])
         else:
             model_class = expression
-            meta = model_class.__meta__
-            fields = ', '.join(['{}."{}"'.format(meta['alias'], col)
-                                for col in meta['columns']])
+            self.query += model_class.__meta__['compiled'].select_from
         self._from_model = model_class
-        self.query += ('SELECT {}\n'
-                       'FROM "{}" AS {}\n').format(fields,
-                                                   meta['tablename'],
-                                                   meta['alias'])
-
-    def render_insert(self, model):
-        meta = model.__meta__
-        attributes = meta['attributes']
-        fields = ', '.join(['"{}"'.format(col) for col in meta['columns']
-            if not getattr(model.__class__, attributes[col]).autofield])
-        values = ', '.join(
-            [getattr(model, attributes[col]).render_sql(self)  # defaults
-            if interfaces.IFunction.providedBy(getattr(model, attributes[col]))
-            else '%s'
-            for col in meta['columns']
-            if not getattr(model.__class__, attributes[col]).autofield])
-        all_fields = ', '.join(['"{}"'.format(col) for col in meta['columns']])
 
+    def _render_select_join_load(self, model_class, relations):
+        models = [model_class] + [relation.target for relation in relations]
+        if len(set(models)) != len(models):
+            raise RuntimeError('A table cannot be joined twice, its alias '
+                               'would be ambiguous')
+        self.query += 'SELECT {}\nFROM "{}" AS {}\n'.format(
+            ', '.join('{}."{}"'.format(model.__meta__['alias'], col)
+                      for model in models
+                      for col in model.__meta__['columns']),
+            model_class.__meta__['tablename'],
+            model_class.__meta__['alias'])
+        self._from_model = model_class
+        for relation in relations:
+            fkey = relation.foreign_key
+            self._render_join(relation.target,
+                              ['{}."{}" = {}."{}"'.format(
+                                  relation.target.__meta__['alias'],
+                                  fkey.foreign_key.name,
+                                  model_class.__meta__['alias'],
+                                  fkey.name)],
+                              'LEFT')
+
+    def render_insert(self, model, returning=True):
+        compiled = model.__meta__['compiled']
+        values = [getattr(model, attr)
+                  for attr in compiled.insert_attributes]
+        placeholders = compiled.insert_placeholders
+        if any(interfaces.IFunction.providedBy(val) for val in values):
+            placeholders = ', '.join(
+                val.render_sql(self)  # defaults
+                if interfaces.IFunction.providedBy(val) else '%s'
+                for val in values)
+            values = [val for val in values
+                      if not interfaces.IFunction.providedBy(val)]
+
+        self._from_model = model.__class__
         self.query += ('INSERT INTO "{}"({})\n'
-                       'VALUES ({})\n'
-                       'RETURNING {}\n').format(meta['tablename'],
-                                                fields,
-                                                values,
-                                                all_fields)
-        self.parameters = [
-            getattr(model, attributes[col])
-            for col in meta['columns']
-            if not getattr(model.__class__, attributes[col]).autofield
-            and not hasattr(getattr(model, attributes[col]), 'render_sql')]
-
-    def render_update(self, model):
-        meta = model.__meta__
-        fields = ', '.join(['"{}" = %s'.format(col) for col in meta['columns']
-            if not getattr(model.__class__,
-                           meta['attributes'][col]).immutable])
-        all_fields = ', '.join(['"{}"'.format(col) for col in meta['columns']])
-        keys = list(model.__class__.__meta__['pkv'](model).items())
-
-        where = ','.join(['"{}" = %s'.format(key[0]) for key in keys])
-
+                       'VALUES ({})\n').format(compiled.tablename,
+                                               compiled.insert_fields,
+                                               placeholders)
+        if returning:
+            self.render_returning(model.__class__)
+        self.parameters = values
+
+    def render_insert_many(self, models):
+        compiled = models[0].__meta__['compiled']
+        rows = []
+        for model in models:
+            values = [getattr(model, attr)
+                      for attr in compiled.insert_attributes]
+            if any(interfaces.IFunction.providedBy(val) for val in values):
+                rows.append(', '.join(
+                    val.render_sql(self)  # defaults
+                    if interfaces.IFunction.providedBy(val) else '%s'
+                    for val in values))
+                values = [val for val in values
+                          if not interfaces.IFunction.providedBy(val)]
+            else:
+                rows.append(compiled.insert_placeholders)
+            self.parameters.extend(values)
+
+        self._from_model = models[0].__class__
+        self.query += ('INSERT INTO "{}"({})\n'
+                       'VALUES ({})\n').format(compiled.tablename,
+                                               compiled.insert_fields,
+                                               '),\n       ('.join(rows))
+
+    def render_on_conflict(self, target, do_update=None, do_nothing=False):
+        """
+        Render the ON CONFLICT clause of the insert statement.
+
+        target is a constraint name, a column or a list of columns. The
+        unique and primary key constraints of the CREATE TABLE are used
+        when they match the columns.
+        do_update is a list of columns to update with the excluded values,
+        or True to update every column that is not immutable.
+        """
+        if bool(do_update) == bool(do_nothing):
+            raise RuntimeError('on_conflict requires do_update or do_nothing')
+        model_class = self._from_model
+        compiled = model_class.__meta__['compiled']
+
+        if isinstance(target, str):
+            conflict = 'ON CONSTRAINT "{}"'.format(target)
+        else:
+            columns = (target if isinstance(target, (list, tuple))
+                       else [target])
+            names = [column.name for column in columns]
+            # a primary key declared unique has no unique constraint
+            if sorted(names) == list(compiled.primary_key):
+                conflict = 'ON CONSTRAINT "{}"'.format(
+                    primary_key_constraint_name(model_class))
+            elif len(columns) == 1 and columns[0].unique:
+                conflict = 'ON CONSTRAINT "{}"'.format(
+                    unique_constraint_name(columns[0]))
+            else:
+                conflict = '({})'.format(', '.join('"{}"'.format(name)
+                                                   for name in names))
+
+        if do_nothing:
+            action = 'DO NOTHING'
+        else:
+            if do_update is True:
+                do_update = compiled.update_columns
+            action = 'DO UPDATE SET {}'.format(', '.join(
+                '"{0}" = EXCLUDED."{0}"'.format(getattr(column, 'name',
+                                                        column))
+                for column in do_update))
+
+        self.query += 'ON CONFLICT {} {}\n'.format(conflict, action)
+
+    def render_returning(self, model_class):
+        self.query += 'RETURNING {}\n'.format(
+            model_class.__meta__['compiled'].returning)
+
+    def render_copy(self, model_class, columns, format='text'):
+        if format not in ('text', 'binary'):
+            raise ValueError('Invalid COPY format {}'.format(format))
+        self.query += ('COPY "{}" ({})\n'
+                       'FROM STDIN WITH (FORMAT {})\n').format(
+            model_class.__meta__['tablename'],
+            ', '.join('"{}"'.format(col) for col in columns),
+            format)
+
+    def render_copy_start(self, format='text'):
+        if format == 'binary':
+            # signature, flags and header extension length
+            return b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+        return b''
+
+    def render_copy_rows(self, fields, rows, format='text'):
+        """ Encode rows for COPY FROM STDIN, fields are the descriptors """
+        if format == 'binary':
+            encoder = CopyBinaryEncoder()
+            encoders = [field.type.render_sql(encoder) for field in fields]
+            count = struct.pack('!h', len(fields))
+            data = bytearray()
+            for row in rows:
+                data += count
+                for encode, value in zip(encoders, row):
+                    if value is None:
+                        data += b'\xff\xff\xff\xff'
+                    else:
+                        value = encode(value)
+                        data += struct.pack('!i', len(value))
+                        data += value
+            return bytes(data)
+
+        encoder = CopyTextEncoder()
+        encoders = [field.type.render_sql(encoder) for field in fields]
+        return ''.join(
+            '\t'.join('\\N' if value is None else encode(value)
+                      for encode, value in zip(encoders, row)) + '\n'
+            for row in rows).encode('utf-8')
+
+    def render_copy_end(self, format='text'):
+        if format == 'binary':
+            return struct.pack('!h', -1)
+        return b''
+
+    def render_update(self, model, columns=None):
+        compiled = model.__meta__['compiled']
+        if columns is None:
+            update_set = compiled.update_set
+            attributes = compiled.update_attributes
+        else:
+            update_set = ', '.join('"{}" = %s'.format(col)
+                                   for col in columns)
+            attributes = [model.__meta__['attributes'][col]
+                          for col in columns]
         self.query += ('UPDATE "{}"\n'
                        'SET {}\n'
                        'WHERE {}\n'
-                       'RETURNING {}\n').format(meta['tablename'], fields,
-                                                where, all_fields)
-        self.parameters = [getattr(model, meta['attributes'][col])
-                           for col in meta['columns']
-            if not getattr(model.__class__, meta['attributes'][col]).immutable]
-        self.parameters += [key[1] for key in keys]
+                       'RETURNING {}\n').format(compiled.tablename,
+                                                update_set,
+                                                compiled.pk_where,
+                                                compiled.returning)
+        self.parameters = [getattr(model, attr) for attr in attributes]
+        self.parameters += [getattr(model, attr)
+                            for attr in compiled.primary_key_attributes]
+
+    def render_update_many(self, models, columns):
+        model_class = models[0].__class__
+        compiled = model_class.__meta__['compiled']
+        attributes = model_class.__meta__['attributes']
+        values = list(compiled.primary_key) + list(columns)
+        attrs = [attributes[col] for col in values]
+
+        # parameters of VALUES have no type, the first row cast them.
+        renderer = CastTypeDialect()
+        types = [getattr(model_class, attr).type.render_sql(renderer)
+                 for attr in attrs]
+        rows = [', '.join('%s::{}'.format(type_) for type_ in types)]
+        rows.extend([', '.join(['%s'] * len(values))] * (len(models) - 1))
+        for model in models:
+            self.parameters.extend(getattr(model, attr) for attr in attrs)
+
+        self.query += ('UPDATE "{table}"\n'
+                       'SET {set}\n'
+                       'FROM (VALUES ({rows})) AS v ({values})\n'
+                       'WHERE {where}\n').format(
+            table=compiled.tablename,
+            set=', '.join('"{0}" = v."{0}"'.format(col) for col in columns),
+            rows='),\n              ('.join(rows),
+            values=', '.join('"{}"'.format(col) for col in values),
+            where=' AND '.join('"{0}"."{1}" = v."{1}"'.format(
+                compiled.tablename, col) for col in compiled.primary_key))
 
     def render_delete(self, model):
-        meta = model.__meta__
-        keys = list(model.__class__.__meta__['pkv'](model).items())
-        where = ','.join(['"{}" = %s'.format(key[0]) for key in keys])
-
+        compiled = model.__meta__['compiled']
         self.query += ('DELETE FROM "{}"\n'
-                       'WHERE {}\n').format(meta['tablename'], where)
-        self.parameters += [key[1] for key in keys]
+                       'WHERE {}\n').format(compiled.tablename,
+                                            compiled.pk_where)
+        self.parameters += [getattr(model, attr)
+                            for attr in compiled.primary_key_attributes]
+
+    def render_delete_from(self, model_class):
+        meta = model_class.__meta__
+        self._from_model = model_class
+        self.query += 'DELETE FROM "{}" AS {}\n'.format(meta['tablename'],
+                                                        meta['alias'])
+
+    def render_delete_many(self, model_class, keys):
+        compiled = model_class.__meta__['compiled']
+        if len(compiled.primary_key) == 1:
+            self.query += ('DELETE FROM "{}"\n'
+                           'WHERE "{}" = ANY(%s)\n').format(
+                compiled.tablename, compiled.primary_key[0])
+            self.parameters.append([key[0] for key in keys])
+            return
+
+        # parameters of VALUES have no type, the first row cast them.
+        renderer = CastTypeDialect()
+        types = [getattr(model_class, attr).type.render_sql(renderer)
+                 for attr in compiled.primary_key_attributes]
+        rows = [', '.join('%s::{}'.format(type_) for type_ in types)]
+        rows.extend([', '.join(['%s'] * len(types))] * (len(keys) - 1))
+        for key in keys:
+            self.parameters.extend(key)
+
+        self.query += ('DELETE FROM "{table}"\n'
+                       'USING (VALUES ({rows})) AS v ({keys})\n'
+                       'WHERE {where}\n').format(
+            table=compiled.tablename,
+            rows='),\n             ('.join(rows),
+            keys=', '.join('"{}"'.format(col)
+                           for col in compiled.primary_key),
+            where=' AND '.join('"{0}"."{1}" = v."{1}"'.format(
+                compiled.tablename, col) for col in compiled.primary_key))
 
     def _render_join(self, foreign_model_class, condition, join_type):
         meta = foreign_model_class.__meta__
@@ -151,7 +346,27 @@ class Dialect:
     def render_left_join(self, foreign_model_class, condition=None):
         self._render_join(foreign_model_class, condition, 'LEFT')
 
+    def render_select_related(self, relation, keys):
+        """
+        Select the models of a many to many relation, prefixed by the key of
+        their parent, for all the given parent keys.
+        """
+        compiled = relation.target.__meta__['compiled']
+        secondary = relation.secondary.__meta__
+        (column, _), = relation.secondary_keys
+        self.query += 'SELECT {}."{}", {}\nFROM "{}" AS {}\n'.format(
+            secondary['alias'], column,
+            ', '.join('{}."{}"'.format(compiled.alias, col)
+                      for col in compiled.columns),
+            compiled.tablename, compiled.alias)
+        self._from_model = relation.target
+        self.render_join(relation.secondary)
+        self.query += 'WHERE {}."{}" = ANY(%s)\n'.format(secondary['alias'],
+                                                         column)
+        self.parameters.append(list(keys))
+
     def render_where(self, statement, *statements, **unused):
+        self._where = True
         self.query += 'WHERE '
         statement.render_sql(self)
         for statement in statements:
@@ -159,6 +374,17 @@ class Dialect:
             statement.render_sql(self)
         self.query += '\n'
 
+    def render_keyset(self, fields, values):
+        """ Render the row value comparison of the keyset pagination """
+        self.query += '{} ({}) > ({})\n'.format(
+            '  AND' if self._where else 'WHERE',
+            ', '.join('{}."{}"'.format(field.model.__meta__['alias'],
+                                       field.name)
+                      for field in fields),
+            ', '.join(['%s'] * len(fields)))
+        self._where = True
+        self.parameters.extend(values)
+
     def render_order_by(self, field, *fields, **unused):
         self.query += 'ORDER BY {}."{}"'.format(
             field.model.__meta__['alias'],
@@ -211,6 +437,12 @@ class Dialect:
     def render_less_than_or_equal(self, field):
         self.__render_cmp(field, '<=')
 
+    def render_any(self, field):
+        self.query += '{}."{}" = ANY(%s)'.format(
+            field.column.model.__meta__['alias'],
+            field.column.name)
+        self.parameters.append(field.values)
+
     def render_in(self, field):
         self.query += '{}."{}" IN ({})'.format(
             field.column.model.__meta__['alias'],
@@ -227,6 +459,25 @@ class Dialect:
     def render_commit_transaction(self):
         return 'commit'
 
+    def render_declare_cursor(self, name, query):
+        return 'DECLARE "{}" NO SCROLL CURSOR FOR\n{}'.format(name, query)
+
+    def render_fetch(self, name, count):
+        return 'FETCH FORWARD {:d} FROM "{}"'.format(count, name)
+
+    def render_close_cursor(self, name):
+        return 'CLOSE "{}"'.format(name)
+
+    def render_listen(self, channel):
+        return 'LISTEN "{}"'.format(channel)
+
+    def render_unlisten(self, channel):
+        return 'UNLISTEN "{}"'.format(channel)
+
+    def render_notify(self):
+        # pg_notify takes the channel and the payload as parameters
+        return 'SELECT pg_notify(%s, %s)'
+
     # XXX those methods return somethink instead of righting in the query
     def render_utcnow(self, utcnow):
         return "(NOW() at time zone 'utc')"
@@ -237,6 +488,87 @@ class Dialect:
             column.name)
 
 
+def unique_constraint_name(field):
+    return '{}_{}'.format(field.model.__meta__['tablename'], field.name)
+
+
+def primary_key_constraint_name(model_class):
+    return '{}_pkey'.format(model_class.__meta__['tablename'])
+
+
+_copy_text_escapes = str.maketrans({'\\': '\\\\',
+                                    '\t': '\\t',
+                                    '\n': '\\n',
+                                    '\r': '\\r',
+                                    })
+_postgres_epoch = datetime(2000, 1, 1)
+
+
+def _utc(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class CopyTextEncoder:
+    """ Visit the column types to return their COPY text format encoder """
+
+    def _render_text(self, field):
+        return lambda value: str(value).translate(_copy_text_escapes)
+
+    render_integer = render_string = render_text = _render_text
+    render_citext = render_uuid = _render_text
+
+    def render_boolean(self, field):
+        return lambda value: 't' if value else 'f'
+
+    def render_timestamp(self, field):
+        if field.with_timezone:
+            # without offset, the server reads it in the session TimeZone
+            return lambda value: _utc(value).isoformat(' ') + '+00'
+        return lambda value: _utc(value).isoformat(' ')
+
+    def render_jsonb(self, field):
+        def encode(value):
+            if not isinstance(value, str):
+                value = json.dumps(value)
+            return value.translate(_copy_text_escapes)
+        return encode
+
+
+class CopyBinaryEncoder:
+    """ Visit the column types to return their COPY binary format encoder """
+
+    def render_integer(self, field):
+        return struct.Struct('!i').pack
+
+    def render_boolean(self, field):
+        return lambda value: b'\x01' if value else b'\x00'
+
+    def render_timestamp(self, field):
+        def encode(value):
+            delta = _utc(value) - _postgres_epoch
+            return struct.pack('!q', (delta.days * 86400 + delta.seconds) *
+                                     1000000 + delta.microseconds)
+        return encode
+
+    def _render_text(self, field):
+        return lambda value: str(value).encode('utf-8')
+
+    render_string = render_text = render_citext = _render_text
+
+    def render_uuid(self, field):
+        return lambda value: (value if isinstance(value, uuid.UUID)
+                              else uuid.UUID(value)).bytes
+
+    def render_jsonb(self, field):
+        def encode(value):
+            if not isinstance(value, str):
+                value = json.dumps(value)
+            return b'\x01' + value.encode('utf-8')  # jsonb version
+        return encode
+
+
 @implementer(interfaces.ICreateTableDialect)
 class CreateTableDialect:
 
@@ -265,8 +597,8 @@ class CreateTableDialect:
 
         if pkeys:
             columns_declaration.append(
-                'CONSTRAINT "{}_pkey" PRIMARY KEY ("{}")'
-                ''.format(meta['tablename'],
+                'CONSTRAINT "{}" PRIMARY KEY ("{}")'
+                ''.format(primary_key_constraint_name(model_class),
                           '", "'.join(pkeys)
                           ))
         columns_declaration.extend(self.constraint)
@@ -283,9 +615,8 @@ class CreateTableDialect:
                                   )
 
     def _render_unique_constraint(self, field):
-        return ('CONSTRAINT "{}_{col}" UNIQUE ("{col}")'
-                '').format(field.model.__meta__['tablename'],
-                           col=field.name)
+        return 'CONSTRAINT "{}" UNIQUE ("{}")'.format(
+            unique_constraint_name(field), field.name)
 
     def _render_foreign_key(self, field):
         return ('CONSTRAINT "{}_{}_fkey" FOREIGN KEY ("{}")\n    '
@@ -343,3 +674,14 @@ class CreateTableDialect:
 
     def render_jsonb(self, field):
         return 'jsonb'
+
+
+class CastTypeDialect(CreateTableDialect):
+    """ Render the type of a column to cast a parameter """
+
+    def render_integer(self, field):
+        return 'int'
+
+    def render_string(self, field):
+        # a cast to varchar(n) truncates the value instead of failing
+        return 'varchar'
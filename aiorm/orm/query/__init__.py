@@ -1,6 +1,8 @@
 
+from .cache import LRU
 from .functions import utc_now, count
-from .operators import and_, or_, in_
+from .operators import and_, or_, in_, any_
 from .schema import CreateTable, CreateSchema
-from .statements import Get, Select, Insert, Update, Delete
+from .shared import SharedEntityCache
+from .statements import Get, Select, Insert, Update, Delete, Copy
 from .transaction import Transaction
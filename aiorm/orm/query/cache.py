@@ -0,0 +1,251 @@
+""" Caches used to avoid doing the same work on every query """
+import sys
+import time
+from collections import OrderedDict
+
+from .events import subscribe
+
+
+class LRUCache:
+    """
+    A size bounded mapping that evicts the least recently used entries.
+
+    Entries expire ``ttl`` seconds after they have been set, if a ttl is
+    given. Hits, misses and evictions are counted to monitor the cache
+    efficiency.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expiration time)
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and not self._expired(entry)
+
+    @staticmethod
+    def _expired(entry):
+        return entry[1] is not None and entry[1] <= time.monotonic()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """ Set the value, expiring after ttl seconds, or the cache ttl """
+        if key in self._data:
+            self._remove(key)
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (value,
+                           None if ttl is None else time.monotonic() + ttl)
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        """ Remove the entry of the key and return its value """
+        return self._data.pop(key)[0]
+
+    def pop(self, key, default=None):
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                }
+
+
+def _rows_size(rows):
+    """ Estimate the memory used by fetched rows, in bytes """
+    if rows is None:
+        return 0
+    if not isinstance(rows, list):  # a single row
+        return sys.getsizeof(rows) + sum(sys.getsizeof(value)
+                                         for value in rows)
+    return sys.getsizeof(rows) + sum(_rows_size(row) for row in rows)
+
+
+class ResultCache(LRUCache):
+    """
+    Rows fetched by the queries, keyed by their SQL and parameters.
+
+    Besides the number of entries, the cache is bounded by an estimate
+    of the memory used by the rows. Every entry depends on tables, the
+    writes of a table evict the entries depending on it. Entries of
+    unknown tables depend on every table.
+    """
+
+    def __init__(self, maxsize=1024, maxbytes=64 * 1024 * 1024, ttl=None):
+        super().__init__(maxsize, ttl)
+        self.maxbytes = maxbytes
+        self.bytes = 0
+        # incremented on every invalidation, see set
+        self.generation = 0
+        self._sizes = {}
+        self._tables = {}  # table -> keys of the entries depending on it
+        self._dependencies = {}  # key -> tables, None for every table
+
+    def set(self, key, rows, ttl=None, tables=None, generation=None):
+        """
+        Cache the rows of the key, depending on the given tables, as
+        (database, tablename). Rows fetched before the generation changed
+        may be outdated and are not cached.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        size = _rows_size(rows)
+        if size > self.maxbytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._sizes[key] = size
+        self.bytes += size
+        self._dependencies[key] = tables
+        for table in (None,) if tables is None else tables:
+            self._tables.setdefault(table, set()).add(key)
+        super().set(key, rows, ttl)
+        while self.bytes > self.maxbytes:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        self.bytes -= self._sizes.pop(key)
+        tables = self._dependencies.pop(key)
+        for table in (None,) if tables is None else tables:
+            keys = self._tables[table]
+            keys.discard(key)
+            if not keys:
+                del self._tables[table]
+        return super()._remove(key)
+
+    def invalidate(self, table=None):
+        """ Evict the entries depending on the table, or every entries """
+        self.generation += 1
+        if table is None:
+            self.clear()
+            return
+        keys = self._tables.get(table, set()) | self._tables.get(None, set())
+        for key in keys:
+            self._remove(key)
+
+    def clear(self):
+        super().clear()
+        self.bytes = 0
+        self._sizes.clear()
+        self._tables.clear()
+        self._dependencies.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats['bytes'] = self.bytes
+        stats['maxbytes'] = self.maxbytes
+        return stats
+
+
+not_found = object()
+""" Entity cache value of the primary keys without rows """
+
+
+class EntityCache(LRUCache):
+    """
+    Rows of a model by primary key, read by Get before querying, e.g.
+    ``@orm.table('db', cache=LRU(50000, ttl=30))``.
+
+    Primary keys without rows are cached as ``not_found`` for
+    ``negative_ttl`` seconds, if given. The writes of the model evict
+    the rows written.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, negative_ttl=None):
+        super().__init__(maxsize, ttl)
+        self.negative_ttl = negative_ttl
+        # incremented on every eviction, see set
+        self.generation = 0
+
+    def set(self, key, row, generation=None):
+        """
+        Cache the row of the primary key, None if there is no row. Rows
+        fetched before the generation changed may be outdated and are not
+        cached.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        if row is not None:
+            super().set(key, tuple(row))
+        elif self.negative_ttl is not None:
+            super().set(key, not_found, self.negative_ttl)
+
+    def bind(self, model_class):
+        """ Called by the scan with the model class of the cache """
+
+    def evict(self, keys=None):
+        """ Evict the rows of the primary keys, or every rows """
+        self.generation += 1
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            self.pop(key)
+
+
+LRU = EntityCache
+""" Short name of the entity cache, for the table declarations """
+
+
+def table_key(model_class):
+    """ Return the key of the table of a model in the result cache """
+    meta = model_class.__meta__
+    return (meta['database'], meta['tablename'])
+
+
+sql_cache = LRUCache(maxsize=512)
+"""
+Rendered SQL of Get and Select queries, keyed by the shape of the query
+(model, clauses, operators, columns, ...). Parameters are not part of the
+key, they are collected from the statements on every run.
+"""
+
+result_cache = ResultCache()
+"""
+Rows of the Get and Select queries run with ``.cached()``, or of the
+models of tables declared with ``cache_results``.
+"""
+
+
+def _invalidate_results(event):
+    result_cache.invalidate(table_key(event.model_class))
+
+
+def _evict_entities(event):
+    cache = event.model_class.__meta__.get('cache')
+    if cache is not None:
+        cache.evict(event.keys())
+
+
+subscribe(_invalidate_results)
+subscribe(_evict_entities)
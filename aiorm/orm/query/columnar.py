@@ -0,0 +1,110 @@
+""" Fetch the rows of a select query in NumPy arrays, column by column """
+import asyncio
+from datetime import timezone
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+def _naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class NumpyDtype:
+    """
+    Visit the column types to return their NumPy dtype and the converter
+    of their values, if any.
+    Nullable integers are stored as floats, NULL being NaN, and NULL
+    timestamps are NaT.
+    """
+
+    def __init__(self, nullable=False):
+        self.nullable = nullable
+
+    def render_integer(self, field):
+        return ('float64' if self.nullable else 'int64'), None
+
+    def render_boolean(self, field):
+        return (object if self.nullable else 'bool'), None
+
+    def render_timestamp(self, field):
+        # datetime64 has no timezone, values are stored in UTC
+        return 'datetime64[us]', _naive_utc
+
+    def _render_object(self, field):
+        return object, None
+
+    render_string = render_text = render_citext = _render_object
+    render_uuid = render_jsonb = _render_object
+
+
+class ColumnsBuilder:
+    """ Fill growing NumPy arrays, one per column, from batches of rows """
+
+    def __init__(self, model_class, capacity=1024):
+        if numpy is None:
+            raise RuntimeError('numpy is required to fetch columns, '
+                               'install aiorm[numpy]')
+        compiled = model_class.__meta__['compiled']
+        self.attributes = compiled.attributes
+        self.size = 0
+        self.capacity = capacity
+        self.arrays = []
+        self.converters = []
+        for attr in self.attributes:
+            field = getattr(model_class, attr)
+            dtype, converter = field.type.render_sql(
+                NumpyDtype(field.nullable))
+            self.arrays.append(numpy.empty(capacity, dtype=dtype))
+            self.converters.append(converter)
+
+    def _grow(self, size):
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        for array in self.arrays:
+            # the arrays are not shared, they are resized in place
+            array.resize(capacity, refcheck=False)
+        self.capacity = capacity
+
+    def append(self, rows):
+        start, end = self.size, self.size + len(rows)
+        if end > self.capacity:
+            self._grow(end)
+        for array, converter, values in zip(self.arrays, self.converters,
+                                            zip(*rows)):
+            if converter is not None:
+                values = [converter(value) for value in values]
+            if array.dtype == object:
+                # avoid numpy broadcasting sequences such as json lists
+                for index, value in enumerate(values, start):
+                    array[index] = value
+            else:
+                array[start:end] = values
+        self.size = end
+
+    def build(self):
+        """ Return the arrays, by attribute name, shrinked to their size """
+        for array in self.arrays:
+            array.resize(self.size, refcheck=False)
+        self.capacity = self.size
+        return dict(zip(self.attributes, self.arrays))
+
+
+@asyncio.coroutine
+def fetch_columns(stream, model_class):
+    """ Fill NumPy arrays with the rows of the stream, batch by batch """
+    builder = ColumnsBuilder(model_class, capacity=stream._batch_size)
+    try:
+        while True:
+            rows = yield from stream.fetchrows()
+            if not rows:
+                break
+            builder.append(rows)
+    finally:
+        yield from stream.close()
+    return builder.build()
@@ -0,0 +1,117 @@
+""" Notify the writes of rows done by the queries, to invalidate caches """
+import copy
+import logging
+from functools import partial
+
+from .transaction import Transaction
+
+log = logging.getLogger(__name__)
+
+_subscribers = {}
+""" Callbacks by model class, None for the writes of every model class """
+
+
+class WriteEvent:
+    """
+    Rows of a model class written by a query.
+
+    The rows are known by the written ``models``, with the values they had
+    when loaded from the database in ``loaded``, or by their
+    ``primary_keys``. None of them is set when the rows are not known,
+    e.g. for a ``DELETE ... WHERE``.
+
+    The ``cursor`` is the one given to the query, a transaction or None.
+    Events of the writes of other nodes are ``remote``. The events of the
+    writes of a transaction are published again once it is committed,
+    as ``committed``, for the caches filled meanwhile out of it.
+    """
+
+    def __init__(self, model_class, action, models=None, loaded=None,
+                 primary_keys=None, cursor=None, remote=False,
+                 committed=False):
+        self.model_class = model_class
+        self.action = action  # 'insert', 'update', 'delete' or 'copy'
+        self.models = models
+        self.loaded = loaded
+        self.primary_keys = primary_keys
+        self.cursor = cursor
+        self.remote = remote
+        self.committed = committed
+
+    def values(self, column):
+        """
+        Return the set of the values of the column in the written rows,
+        the new and the loaded ones, or None if they are not known.
+        """
+        compiled = self.model_class.__meta__['compiled']
+        index = compiled.columns.index(column)
+        if self.models is not None:
+            attr = compiled.attributes[index]
+            values = {getattr(model, attr) for model in self.models}
+            values.update(loaded[index] for loaded in self.loaded or ()
+                          if loaded is not None)
+            return values
+        if self.primary_keys is not None and column in compiled.primary_key:
+            index = compiled.primary_key.index(column)
+            return {key[index] for key in self.primary_keys}
+        return None
+
+    def keys(self):
+        """
+        Return the set of the primary keys of the written rows, the new and
+        the loaded ones, as tuples in the primary key order, or None if
+        they are not known.
+        """
+        if self.models is None:
+            return None if self.primary_keys is None else set(
+                self.primary_keys)
+        compiled = self.model_class.__meta__['compiled']
+        keys = {tuple(getattr(model, attr)
+                      for attr in compiled.primary_key_attributes)
+                for model in self.models}
+        keys.update(tuple(loaded[index]
+                          for index in compiled.primary_key_indexes)
+                    for loaded in self.loaded or () if loaded is not None)
+        return keys
+
+    def __repr__(self):
+        return '<WriteEvent {} {}>'.format(self.action,
+                                           self.model_class.__name__)
+
+
+def subscribe(callback, model_class=None):
+    """
+    Call ``callback(event)`` after the writes of the model class, or of
+    every model class.
+    """
+    callbacks = _subscribers.setdefault(model_class, [])
+    if callback not in callbacks:
+        callbacks.append(callback)
+
+
+def unsubscribe(callback, model_class=None):
+    try:
+        _subscribers[model_class].remove(callback)
+    except (KeyError, ValueError):
+        pass
+
+
+def publish(event):
+    """
+    Call the subscribers of the event, their errors are logged. The event
+    of a write done in a transaction is published again after its commit.
+    """
+    for callback in (_subscribers.get(event.model_class, []) +
+                     _subscribers.get(None, [])):
+        try:
+            callback(event)
+        except Exception:
+            log.exception('Error while publishing {!r}'.format(event))
+    if isinstance(event.cursor, Transaction) and not event.committed:
+        event.cursor.after_commit(partial(_publish_committed, event))
+
+
+def _publish_committed(event, transaction):
+    event = copy.copy(event)
+    event.committed = True
+    publish(event)
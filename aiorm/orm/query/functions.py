@@ -17,3 +17,6 @@ class count:
 
     def render_sql(self, renderer):
         return renderer.render_count(self.field)
+
+    def _shape(self, parameters):
+        return (self.__class__, self.field.model, self.field.name)
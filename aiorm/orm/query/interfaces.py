@@ -36,5 +36,21 @@ class ILimit(IStatement):
     """ A Limit clause statement """
 
 
+class IOnConflict(IStatement):
+    """ An On Conflict clause of an insert statement """
+
+
+class IPrefetch(IStatement):
+    """ Relations loaded for all the models of a select statement """
+
+
+class IJoinLoad(IStatement):
+    """ OneToOne relations loaded by joins in a select statement """
+
+
+class ICached(IStatement):
+    """ Rows of a query kept in the result cache """
+
+
 class IFunction(Interface):
     """ A SQL Function """
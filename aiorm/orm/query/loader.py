@@ -0,0 +1,84 @@
+""" Batch the loads of models requested in the same loop iteration """
+import asyncio
+import logging
+from weakref import WeakKeyDictionary
+
+from .operators import any_
+from .statements import Select
+
+log = logging.getLogger(__name__)
+
+_loaders = WeakKeyDictionary()
+""" Loaders by event loop, then by model class and column name """
+
+
+class BatchLoader:
+    """
+    Load models by the values of a unique column.
+
+    The values requested in the same loop iteration are loaded with a
+    single ``column = ANY(%s)`` query, and the requests of a value being
+    loaded share the pending load.
+    """
+
+    def __init__(self, column, loop):
+        self.column = column
+        self._loop = loop
+        self._pending = {}  # value -> future, to load in the next batch
+        self._loading = {}  # value -> future, of the running batches
+        self._scheduled = False
+
+    def load(self, value):
+        """ Return the future of the model, None if it does not exists """
+        future = self._pending.get(value) or self._loading.get(value)
+        if future is None:
+            future = asyncio.Future(loop=self._loop)
+            self._pending[value] = future
+            if not self._scheduled:
+                self._scheduled = True
+                self._loop.call_soon(self._dispatch)
+        return future
+
+    def _dispatch(self):
+        self._scheduled = False
+        batch, self._pending = self._pending, {}
+        self._loading.update(batch)
+        self._loop.create_task(self._load(batch))
+
+    @asyncio.coroutine
+    def _load(self, batch):
+        model_class = self.column.model
+        attr = model_class.__meta__['attributes'][self.column.name]
+        log.debug('Loading {} {} by {}'.format(len(batch),
+                                               model_class.__name__,
+                                               self.column.name))
+        try:
+            models = yield from Select(model_class).where(
+                any_(self.column, batch)).run()
+            models = {getattr(model, attr): model for model in models}
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for value, future in batch.items():
+                if not future.done():
+                    future.set_result(models.get(value))
+        finally:
+            for value in batch:
+                self._loading.pop(value, None)
+
+
+def get_loader(column, loop=None):
+    """ Return the batch loader of the column for the event loop """
+    loop = loop or asyncio.get_event_loop()
+    try:
+        loaders = _loaders[loop]
+    except KeyError:
+        loaders = _loaders[loop] = {}
+    key = (column.model, column.name)  # columns overrides __eq__
+    try:
+        return loaders[key]
+    except KeyError:
+        loader = loaders[key] = BatchLoader(column, loop)
+        return loader
@@ -0,0 +1,207 @@
+""" Invalidate the caches of the other nodes using LISTEN/NOTIFY """
+import asyncio
+import json
+import logging
+import uuid
+from weakref import WeakKeyDictionary
+
+from aiorm import registry
+from . import interfaces
+from .events import WriteEvent, subscribe, unsubscribe, publish
+from .statements import _encode_value, _decode_value
+from .transaction import Transaction
+from ..declaration.meta import db
+
+log = logging.getLogger(__name__)
+
+MAX_PAYLOAD_SIZE = 7999
+""" Size in bytes of the largest notification payload of PostgreSQL """
+
+
+class InvalidationChannel:
+    """
+    Notify the writes of the models of a database on a PostgreSQL channel,
+    and publish the writes notified by the other nodes, as remote write
+    events, to invalidate the local caches.
+
+    The writes of a transaction are notified in the transaction before its
+    commit, PostgreSQL delivers the notifications only once committed.
+    Other writes are notified once per loop iteration. Notifications hold
+    the table, the action and the primary keys of the written rows, by
+    table and action.
+
+    The listener uses a connection of the pool of the database, if it is
+    lost every cache of the database is invalidated once listening again.
+    """
+
+    def __init__(self, database, channel='aiorm_invalidation',
+                 retry_delay=1, loop=None):
+        self.database = database
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self.node = uuid.uuid4().hex  # to ignore our own notifications
+        self._loop = loop
+        self._pending = []  # events of the writes out of transactions
+        self._scheduled = False
+        self._transactions = WeakKeyDictionary()  # transaction -> events
+        self._listener = None
+
+    @asyncio.coroutine
+    def start(self):
+        """ Notify the writes and listen to the ones of the other nodes """
+        self._loop = self._loop or asyncio.get_event_loop()
+        subscribe(self._on_write)
+        self._listener = self._loop.create_task(self._listen())
+
+    @asyncio.coroutine
+    def stop(self):
+        unsubscribe(self._on_write)
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                yield from self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def _on_write(self, event):
+        if (event.remote or event.committed or
+                event.model_class.__meta__['database'] != self.database):
+            return
+        if isinstance(event.cursor, Transaction):
+            try:
+                events = self._transactions[event.cursor]
+            except KeyError:
+                events = self._transactions[event.cursor] = []
+            events.append(event)
+            event.cursor.before_commit(self._notify_transaction)
+            event.cursor.after_rollback(self._forget_transaction)
+            return
+        self._pending.append(event)
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._scheduled = False
+        events, self._pending = self._pending, []
+        self._loop.create_task(self._notify(events))
+
+    @asyncio.coroutine
+    def _notify(self, events):
+        driver = registry.get_driver(self.database)
+        try:
+            with (yield from driver.cursor()) as cursor:
+                yield from self._execute(cursor, events)
+        except Exception:
+            log.exception('Cannot notify the writes of {}'.format(
+                self.database))
+
+    @asyncio.coroutine
+    def _notify_transaction(self, transaction):
+        events = self._transactions.pop(transaction, [])
+        yield from self._execute(transaction, events)
+
+    def _forget_transaction(self, transaction):
+        # the writes rolled back never happened
+        self._transactions.pop(transaction, None)
+
+    @asyncio.coroutine
+    def _execute(self, cursor, events):
+        query = registry.get(interfaces.IDialect)().render_notify()
+        for payload in self.payloads(events):
+            log.debug('Notify {} {}'.format(self.channel, payload))
+            yield from cursor.execute(query, [self.channel, payload])
+
+    def payloads(self, events):
+        """
+        Return the notification payloads of the events, one per table and
+        action, split to fit the PostgreSQL limit.
+        """
+        writes = {}
+        for event in events:
+            key = (event.model_class.__meta__['tablename'], event.action)
+            keys = event.keys()
+            if key in writes and writes[key] is None:
+                continue
+            if keys is None:
+                writes[key] = None
+            else:
+                writes.setdefault(key, set()).update(keys)
+
+        payloads = []
+        for (tablename, action), keys in writes.items():
+            if keys is not None:
+                keys = [[_encode_value(value) for value in key]
+                        for key in keys]
+            self._split(tablename, action, keys, payloads)
+        return payloads
+
+    def _split(self, tablename, action, keys, payloads):
+        payload = json.dumps([self.node, tablename, action, keys],
+                             separators=(',', ':'))
+        if len(payload.encode('utf-8')) <= MAX_PAYLOAD_SIZE:
+            payloads.append(payload)
+        elif len(keys) > 1:
+            middle = len(keys) // 2
+            self._split(tablename, action, keys[:middle], payloads)
+            self._split(tablename, action, keys[middle:], payloads)
+        else:  # a huge primary key, invalidate the table
+            self._split(tablename, action, None, payloads)
+
+    def apply(self, payload):
+        """ Publish the remote write event of a notification payload """
+        try:
+            node, tablename, action, keys = json.loads(payload)
+        except ValueError:
+            log.warning('Invalid notification {!r}'.format(payload))
+            return
+        if node == self.node:
+            return
+        model_class = db[self.database].get(tablename)
+        if model_class is None:
+            return
+        if keys is not None:
+            keys = [tuple(_decode_value(value) for value in key)
+                    for key in keys]
+        publish(WriteEvent(model_class, action, primary_keys=keys,
+                           remote=True))
+
+    def _invalidate_all(self):
+        for model_class in list(db[self.database].values()):
+            publish(WriteEvent(model_class, 'update', remote=True))
+
+    @asyncio.coroutine
+    def _listen(self):
+        renderer = registry.get(interfaces.IDialect)()
+        driver = registry.get_driver(self.database)
+        listened = False
+        while True:
+            connection = cursor = None
+            try:
+                connection = yield from driver.acquire()
+                cursor = yield from connection.cursor()
+                yield from cursor.execute(renderer.render_listen(
+                    self.channel))
+                if listened:
+                    # notifications may have been missed meanwhile
+                    self._invalidate_all()
+                listened = True
+                while True:
+                    notify = yield from connection.notifies.get()
+                    self.apply(notify.payload)
+            except asyncio.CancelledError:
+                if connection is not None:
+                    try:
+                        if cursor is not None:
+                            yield from cursor.execute(
+                                renderer.render_unlisten(self.channel))
+                    finally:
+                        driver.release(connection)
+                raise
+            except Exception:
+                log.exception('Lost the notifications of {}'.format(
+                    self.channel))
+                if connection is not None:
+                    driver.release(connection)
+            yield from asyncio.sleep(self.retry_delay)
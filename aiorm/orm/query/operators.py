@@ -10,6 +10,13 @@ class and_:
     def render_sql(self, renderer):
         return renderer.render_and(self)
 
+    def _shape(self, parameters):
+        shapes = tuple(statement._shape(parameters)
+                       for statement in self.statements)
+        if None in shapes:
+            return None
+        return (self.__class__, shapes)
+
 
 class or_(and_):
 
@@ -25,6 +32,10 @@ class equal:
     def render_sql(self, renderer):
         return renderer.render_equal(self)
 
+    def _shape(self, parameters):
+        parameters.append(self.value)
+        return (self.__class__, self.column.model, self.column.name)
+
 
 class greater_than(equal):
 
@@ -47,6 +58,21 @@ class less_than_or_equal(equal):
         return renderer.render_less_than_or_equal(self)
 
 
+class any_:
+    """ Compare a column to any value of a list, a single parameter """
+
+    def __init__(self, column, values):
+        self.column = column
+        self.values = list(values)
+
+    def render_sql(self, renderer):
+        return renderer.render_any(self)
+
+    def _shape(self, parameters):
+        parameters.append(self.values)
+        return (self.__class__, self.column.model, self.column.name)
+
+
 class in_:
     def __init__(self, column, *values):
         self.column = column
@@ -54,3 +80,8 @@ class in_:
 
     def render_sql(self, renderer):
         return renderer.render_in(self)
+
+    def _shape(self, parameters):
+        parameters.extend(self.values)
+        return (self.__class__, self.column.model, self.column.name,
+                len(self.values))
@@ -0,0 +1,363 @@
+"""
+Entity cache shared by the processes of a host, in a memory mapped file.
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from .cache import not_found
+
+_MAGIC = b'aiormshm'
+_header = struct.Struct('<8sIIQ')  # magic, slots, slot size, generation
+_GENERATION = 16  # offset of the generation in the header
+# version, expiration time or 0, payload size, flags
+_slot = struct.Struct('<QdIB')
+_EMPTY, _ROW, _NOT_FOUND = 0, 1, 2
+_length = struct.Struct('<I')
+_timestamp = struct.Struct('<qh')  # microseconds since epoch, utc offset
+_NAIVE = -32768  # utc offset of timestamps without timezone
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _fixed(fmt):
+    packer = struct.Struct('<' + fmt)
+
+    def decode(buffer, offset):
+        return packer.unpack_from(buffer, offset)[0], offset + packer.size
+
+    return packer.pack, decode
+
+
+def _sized(to_bytes, from_bytes):
+    """ Codec of variable size values, prefixed by their size """
+
+    def encode(value):
+        data = to_bytes(value)
+        return _length.pack(len(data)) + data
+
+    def decode(buffer, offset):
+        size, = _length.unpack_from(buffer, offset)
+        offset += _length.size
+        return from_bytes(bytes(buffer[offset:offset + size])), offset + size
+
+    return encode, decode
+
+
+def _encode_timestamp(value):
+    offset = value.utcoffset()
+    if offset is None:
+        return _timestamp.pack((value - _EPOCH) // _MICROSECOND, _NAIVE)
+    value = value.replace(tzinfo=None) - offset
+    return _timestamp.pack((value - _EPOCH) // _MICROSECOND,
+                           offset // timedelta(minutes=1))
+
+
+def _decode_timestamp(buffer, offset):
+    microseconds, minutes = _timestamp.unpack_from(buffer, offset)
+    value = _EPOCH + microseconds * _MICROSECOND
+    if minutes != _NAIVE:
+        minutes = timedelta(minutes=minutes)
+        value = (value + minutes).replace(tzinfo=timezone(minutes))
+    return value, offset + _timestamp.size
+
+
+def _uuid_bytes(value):
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(value)
+    return value.bytes
+
+
+class BinaryCodec:
+    """
+    Visit the column types to return the functions encoding a value to
+    bytes, and decoding it from a buffer at an offset.
+    """
+
+    def render_integer(self, field):
+        return _fixed('q')
+
+    def render_boolean(self, field):
+        return _fixed('?')
+
+    def render_timestamp(self, field):
+        return _encode_timestamp, _decode_timestamp
+
+    def _render_text(self, field):
+        return _sized(str.encode, bytes.decode)
+
+    render_string = render_text = render_citext = _render_text
+
+    def render_uuid(self, field):
+        return _sized(_uuid_bytes, lambda data: uuid.UUID(bytes=data))
+
+    def render_jsonb(self, field):
+        return _sized(lambda value: json.dumps(value).encode(),
+                      lambda data: json.loads(data.decode()))
+
+
+class RowCodec:
+    """
+    Compact serialization of the rows of a model, from the declared types
+    of its columns: a bitmap of the NULL values, then the other values.
+    """
+
+    def __init__(self, fields):
+        codecs = [field.type.render_sql(BinaryCodec()) for field in fields]
+        self._encoders = [encode for encode, _ in codecs]
+        self._decoders = [decode for _, decode in codecs]
+        self._bitmap_size = (len(fields) + 7) // 8
+
+    def encode(self, row):
+        bitmap = bytearray(self._bitmap_size)
+        data = [bitmap]
+        for index, (encode, value) in enumerate(zip(self._encoders, row)):
+            if value is None:
+                bitmap[index // 8] |= 1 << index % 8
+            else:
+                data.append(encode(value))
+        return b''.join(data)
+
+    def decode(self, buffer, offset=0):
+        """ Return the row and the offset of its end in the buffer """
+        bitmap = buffer[offset:offset + self._bitmap_size]
+        offset += self._bitmap_size
+        row = []
+        for index, decode in enumerate(self._decoders):
+            if bitmap[index // 8] & 1 << index % 8:
+                row.append(None)
+            else:
+                value, offset = decode(buffer, offset)
+                row.append(value)
+        return tuple(row), offset
+
+
+class SharedEntityCache:
+    """
+    Entity cache of a model stored in a memory mapped file, shared by the
+    processes of a host, e.g.
+    ``@orm.table('db', cache=SharedEntityCache('/dev/shm/user', 65536))``.
+
+    The file holds ``slots`` slots of ``slot_size`` bytes, a primary key
+    is stored in the slot of its hash, replacing the row of another key.
+    Rows larger than a slot are not cached.
+
+    Every slot has a version, odd while the slot is written: readers
+    ignore the slots written or changed while they were read. Writers
+    lock the slot range of the file. An eviction, in any process, is
+    seen by all of them.
+    """
+
+    def __init__(self, path, slots=4096, slot_size=512, ttl=None,
+                 negative_ttl=None):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._fd = None
+        self._mmap = None
+        self._row_codec = None
+        self._key_codec = None
+        self.reset_stats()
+
+    def bind(self, model_class):
+        """ Build the codecs of the rows of the model and map the file """
+        compiled = model_class.__meta__['compiled']
+        fields = [getattr(model_class, attr) for attr in compiled.attributes]
+        self._row_codec = RowCodec(fields)
+        self._key_codec = RowCodec([fields[index] for index in
+                                    compiled.primary_key_indexes])
+        if self._mmap is None:
+            self._open()
+
+    def _open(self):
+        size = _header.size + self.slots * self.slot_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._locked(0, _header.size, fd):
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _header.pack(_MAGIC, self.slots,
+                                               self.slot_size, 0), 0)
+                magic, slots, slot_size, _ = _header.unpack(
+                    os.pread(fd, _header.size, 0))
+                if (magic, slots, slot_size) != (_MAGIC, self.slots,
+                                                 self.slot_size):
+                    raise ValueError('{} is not a cache of {} slots of {} '
+                                     'bytes'.format(self.path, self.slots,
+                                                    self.slot_size))
+            self._mmap = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            os.close(self._fd)
+            self._mmap = self._fd = None
+
+    @contextmanager
+    def _locked(self, start, length, fd=None):
+        fd = self._fd if fd is None else fd
+        fcntl.lockf(fd, fcntl.LOCK_EX, length, start)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, length, start)
+
+    @property
+    def generation(self):
+        """ Incremented on every eviction, by any process """
+        return struct.unpack_from('<Q', self._mmap, _GENERATION)[0]
+
+    def _incr_generation(self):
+        with self._locked(_GENERATION, 8):
+            struct.pack_into('<Q', self._mmap, _GENERATION,
+                             self.generation + 1)
+
+    def _key_data(self, key):
+        """ Return the encoded key, None if it cannot be encoded """
+        try:
+            return self._key_codec.encode(key)
+        except (struct.error, TypeError, ValueError, AttributeError):
+            return None
+
+    def _offset(self, key_data):
+        index = zlib.crc32(key_data) % self.slots
+        return _header.size + index * self.slot_size
+
+    def _read(self, key):
+        """ Return the row, ``not_found``, or None if not cached """
+        key_data = self._key_data(key)
+        if key_data is None:
+            return None
+        offset = self._offset(key_data)
+        buffer = self._mmap
+        version, expires, size, flags = _slot.unpack_from(buffer, offset)
+        if version % 2 or flags == _EMPTY:
+            return None
+        if expires and expires <= time.time():
+            return None
+        start = offset + _slot.size
+        data = buffer[start:start + size]
+        if _slot.unpack_from(buffer, offset)[0] != version:
+            return None  # written while read
+        if data[:len(key_data)] != key_data:
+            return None  # the slot of another key
+        if flags == _NOT_FOUND:
+            return not_found
+        return self._row_codec.decode(data, len(key_data))[0]
+
+    def _write(self, key_data, flags, data, ttl):
+        offset = self._offset(key_data)
+        payload = key_data + data
+        if _slot.size + len(payload) > self.slot_size:
+            return False
+        expires = time.time() + ttl if ttl is not None else 0
+        with self._locked(offset, self.slot_size):
+            version = _slot.unpack_from(self._mmap, offset)[0]
+            struct.pack_into('<Q', self._mmap, offset, version + 1)
+            start = offset + _slot.size
+            self._mmap[start:start + len(payload)] = payload
+            _slot.pack_into(self._mmap, offset, version + 2, expires,
+                            len(payload), flags)
+        return True
+
+    def __contains__(self, key):
+        return self._read(key) is not None
+
+    def __len__(self):
+        return sum(1 for index in range(self.slots)
+                   if _slot.unpack_from(self._mmap, _header.size +
+                                        index * self.slot_size)[3] != _EMPTY)
+
+    def get(self, key, default=None):
+        value = self._read(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, row, generation=None):
+        """
+        Cache the row of the primary key, None if there is no row. Rows
+        fetched before the generation changed may be outdated and are not
+        cached.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        key_data = self._key_data(key)
+        if key_data is None:
+            return
+        if row is not None:
+            try:
+                data = self._row_codec.encode(row)
+            except (struct.error, TypeError, ValueError, AttributeError):
+                return  # a value out of the range of its type
+            written = self._write(key_data, _ROW, data, self.ttl)
+        elif self.negative_ttl is not None:
+            written = self._write(key_data, _NOT_FOUND, b'',
+                                  self.negative_ttl)
+        else:
+            return
+        if not written:
+            self.oversized += 1
+
+    def pop(self, key, default=None):
+        value = self._read(key)
+        key_data = self._key_data(key)
+        if key_data is None:
+            return default
+        offset = self._offset(key_data)
+        with self._locked(offset, self.slot_size):
+            version, _, size, flags = _slot.unpack_from(self._mmap, offset)
+            start = offset + _slot.size
+            if (flags != _EMPTY and
+                    self._mmap[start:start + len(key_data)] == key_data):
+                _slot.pack_into(self._mmap, offset, version + 2, 0, 0,
+                                _EMPTY)
+                self.evictions += 1
+        return default if value is None or value is not_found else value
+
+    def evict(self, keys=None):
+        """ Evict the rows of the primary keys, or every rows """
+        self._incr_generation()
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            self.pop(key)
+
+    def clear(self):
+        with self._locked(_header.size, self.slots * self.slot_size):
+            for index in range(self.slots):
+                offset = _header.size + index * self.slot_size
+                version = _slot.unpack_from(self._mmap, offset)[0]
+                _slot.pack_into(self._mmap, offset, version + 2, 0, 0,
+                                _EMPTY)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'oversized': self.oversized,
+                'size': len(self),
+                'maxsize': self.slots,
+                }
@@ -1,17 +1,53 @@
 """ Abstract sql statements to query schema """
 import asyncio
+import base64
+import copy
+import inspect
+import itertools
+import json
 import logging
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
 
 from  zope.interface import implementer
 
 from aiorm import registry
 from . import interfaces
+from .cache import sql_cache, result_cache, table_key, not_found
+from .columnar import fetch_columns
+from .events import WriteEvent, publish
+from .functions import utc_now
+from .transaction import Transaction, IdentityMap
+from ..declaration.meta import set_values, mark_loaded, changed_columns
 
 
 log = logging.getLogger(__name__)
+_statements = {}
+
+
+def _get_statement(key):
+    """
+    Return the statement class registered for the chained method ``key``.
+
+    The interface name is built once, and the result is kept until the
+    registry is modified.
+    """
+    try:
+        version, statement = _statements[key]
+        if version == registry.version:
+            return statement
+    except KeyError:
+        pass
+    iface = 'I' + ''.join(txt.capitalize() for txt in key.split('_'))
+    iface = getattr(interfaces, iface)
+    statement = registry.get(iface)
+    _statements[key] = (registry.version, statement)
+    return statement
 
 
 class _Query:
+    _cacheable = False  # may the rows be kept in the result cache
 
     def __init__(self, *args, **kwargs):
         self._args = args
@@ -24,11 +60,69 @@ class _Query:
         If you want to had your own statement, register your own interface,
         with your own implementation in aiorm registry.
         """
-        iface = 'I' + ''.join(txt.capitalize() for txt in key.split('_'))
-        iface = getattr(interfaces, iface)
-        self._child = registry.get(iface)(self)
+        self._child = _get_statement(key)(self)
         return self._child
 
+    def _statements(self):
+        """ Iterate over the chained statements """
+        statement = self._child
+        while statement is not None:
+            yield statement
+            statement = statement._child
+
+    def _shape(self, parameters):
+        """
+        Return a hashable key describing the shape of the query, and append
+        the parameters values to ``parameters`` in the rendered order.
+        Return None if the query cannot be cached.
+        """
+        return None
+
+    def _render_cached_sql(self):
+        """ Render the query, reusing the SQL of a query of the same shape """
+        renderer = registry.get(interfaces.IDialect)
+        parameters = []
+        key = self._shape(parameters)
+        if key is not None:
+            key = (renderer, key)
+            try:
+                query = sql_cache.get(key)
+            except TypeError:  # an unhashable value is part of the shape
+                key = query = None
+            if query is not None:
+                return query, parameters
+
+        query, rendered_parameters = self._render_sql(renderer())
+        if key is not None and _same_parameters(rendered_parameters,
+                                                parameters):
+            sql_cache.set(key, query)
+        return query, rendered_parameters
+
+    def _cache_ttl(self):
+        """
+        Return the ttl of the rows in the result cache, True for the cache
+        ttl, or False if the rows are not cached.
+        """
+        if not self._cacheable:
+            return False
+        for statement in self._statements():
+            if isinstance(statement, Cached):
+                return statement._kwargs.get('ttl') or True
+        model_class = self._model_class()
+        return model_class is not None and model_class.__meta__.get(
+            'cache_results', False)
+
+    def _model_class(self):
+        """ Return the model class queried, of a model or a function """
+        expression = self._args[0]
+        if inspect.isclass(expression):
+            return expression
+        return getattr(getattr(expression, 'field', None), 'model', None)
+
+    def _tables(self):
+        """ Tables of the cached rows, None if they are not known """
+        return None
+
     @asyncio.coroutine
     def run(self, cursor=None, fetchall=True):
 
@@ -43,10 +137,56 @@ class _Query:
 
         if cursor:
             return (yield from wrapped(cursor))
+        ttl = self._cache_ttl()
+        if ttl is not False:
+            return (yield from self._run_cached(ttl, fetchall))
+        driver = registry.get_driver(self._args[0].__meta__['database'])
+        with (yield from driver.cursor()) as cursor:
+            return (yield from wrapped(cursor))
+
+    @asyncio.coroutine
+    def _run_cached(self, ttl, fetchall):
+        """
+        Run the query with the rows of the result cache. Queries run in a
+        transaction, given as cursor, are never cached: their rows may not
+        be committed.
+        """
+        query, parameters = self.render_sql()
+        database = self._model_class().__meta__['database']
+        key = (database, query, tuple(parameters), fetchall)
+        try:
+            entry = result_cache.get(key)
+        except TypeError:  # unhashable parameters
+            key = entry = None
+        if entry is not None:
+            rows, mutable = entry
+            if mutable:
+                return copy.deepcopy(rows)
+            return list(rows) if fetchall else rows
+
+        generation = result_cache.generation
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('{} % {!r}'.format(query, parameters))
+        driver = registry.get_driver(database)
+        with (yield from driver.cursor()) as cursor:
+            yield from cursor.execute(query, parameters)
+            rows = ((yield from cursor.fetchall())
+                    if fetchall else (yield from cursor.fetchone()))
+        if key is None:
+            return rows
+        if fetchall:
+            rows = [tuple(row) for row in rows]
+            values = (value for row in rows for value in row)
         else:
-            driver = registry.get_driver(self._args[0].__meta__['database'])
-            with (yield from driver.cursor()) as cursor:
-                return (yield from wrapped(cursor))
+            rows = None if rows is None else tuple(rows)
+            values = rows or ()
+        mutable = any(isinstance(value, (dict, list)) for value in values)
+        result_cache.set(key, (rows, mutable),
+                         ttl=None if ttl is True else ttl,
+                         tables=self._tables(), generation=generation)
+        if mutable:
+            return copy.deepcopy(rows)
+        return list(rows) if fetchall else rows
 
 
 class _NoResultQuery(_Query):
@@ -75,86 +215,714 @@ class _SingleResultQuery(_Query):
         row = yield from super().run(fetchall=False, cursor=cursor)
         if row is None:
             return None
-        model = self._args[0]()
-        for idx, col in enumerate(model.__meta__['columns']):
-            setattr(model, model.__meta__['attributes'][col], row[idx])
-        return model
+        return _hydrate(self._args[0], row, _identity_map(cursor))
 
 
 class _ManyResultQuery(_Query):
 
     @asyncio.coroutine
-    def run(self, cursor=None, fetchall=True):
-
-        def to_model(row):
-            if row is None:
-                return None
-            model = self._args[0]()
-            for idx, col in enumerate(model.__meta__['columns']):
-                setattr(model, model.__meta__['attributes'][col], row[idx])
-            return model
+    def run(self, cursor=None, fetchall=True, result='model'):
+        """
+        Run the query, and return the models, or with ``result`` set to
+        ``'tuple'``, ``'namedtuple'`` or ``'dict'``, a list of rows of that
+        type, without hydrating models.
+        """
+        if result != 'model':
+            if self._join_loads():
+                raise RuntimeError('The rows of a join_load select can only '
+                                   'be returned as models, not {}'.format(
+                                       result))
+            convert = _rows_converter(self._args[0], result)
+            rows = yield from super().run(fetchall=fetchall, cursor=cursor)
+            if fetchall:
+                return convert(rows)
+            return None if rows is None else convert([rows])[0]
+
+        to_model = self._row_hydrator(
+            _identity_map(cursor),
+            None if cursor else _entity_cache(self._args[0]))
 
         def iter_models(rows): # XXX Can't mix yield and yield from
             for row in rows:
                 yield to_model(row)
 
         rows = yield from super().run(fetchall=fetchall, cursor=cursor)
+        prefetches = [statement for statement in self._statements()
+                      if isinstance(statement, Prefetch)]
+        if fetchall and prefetches:
+            models = [to_model(row) for row in rows]
+            for prefetch in prefetches:
+                for relation in prefetch._args:
+                    yield from relation.prefetch(models, cursor=cursor)
+            return iter(models)
         return iter_models(rows) if fetchall else to_model(rows)
 
 
+    def _join_loads(self):
+        """ Return the OneToOne relations loaded by joins """
+        return [relation for statement in self._statements()
+                if isinstance(statement, JoinLoad)
+                for relation in statement._args]
+
+    def _row_hydrator(self, identity_map=None, entity_cache=None):
+        """
+        Return the function returning the model of a row, the rows of the
+        model are cached in the entity cache, if given.
+        """
+        model_class = self._args[0]
+        if not inspect.isclass(model_class):
+            identity_map = None
+        join_loads = self._join_loads()
+        if entity_cache is not None:
+            # rows read after a write of the model may be outdated
+            generation = entity_cache.generation
+            indexes = model_class.__meta__['compiled'].primary_key_indexes
+
+        def to_model(row):
+            if row is None:
+                return None
+            if entity_cache is not None:
+                entity_cache.set(tuple(row[index] for index in indexes),
+                                 row[:len(model_class.__meta__['columns'])],
+                                 generation)
+            if not join_loads:
+                return _hydrate(model_class, row, identity_map)
+            # the columns of the related models follow the model ones
+            end = len(model_class.__meta__['columns'])
+            model = _hydrate(model_class, row[:end], identity_map)
+            for relation in join_loads:
+                start, end = end, end + len(relation.target.__meta__[
+                    'columns'])
+                related = row[start:end]
+                if related[relation.target.__meta__[
+                        'compiled'].primary_key_indexes[0]] is None:
+                    related = None  # nothing joined
+                else:
+                    related = _hydrate(relation.target, related,
+                                       identity_map)
+                relation.data[model] = related
+            return model
+
+        return to_model
+
+
 class Get(_SingleResultQuery):
+    _cacheable = True
 
     def render_sql(self):
-        renderer = registry.get(interfaces.IDialect)()
+        return self._render_cached_sql()
+
+    def _tables(self):
+        return _chain_tables({table_key(self._args[0])}, self)
+
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        identity_map = _identity_map(cursor)
+        if identity_map is not None and self._child is None:
+            model = identity_map.get(self._args[0], self._primary_key())
+            if model is not None:
+                return model
+        entity_cache = _entity_cache(self._args[0])
+        if entity_cache is not None and not cursor and self._child is None:
+            key = _cache_key(self._args[0], self._primary_key())
+            if key is not None:
+                return (yield from self._run_entity_cache(entity_cache, key))
+        return (yield from super().run(cursor=cursor))
+
+    @asyncio.coroutine
+    def _run_entity_cache(self, entity_cache, key):
+        """ Read the row in the entity cache, query and cache it if missing """
+        row = entity_cache.get(key)
+        if row is None:
+            generation = entity_cache.generation
+            row = yield from _Query.run(self, fetchall=False)
+            if row is not None:  # the key of the row is the one evicted
+                key = tuple(row[index] for index in self._args[0].__meta__[
+                    'compiled'].primary_key_indexes)
+            entity_cache.set(key, row, generation)
+        elif row is not_found:
+            row = None
+        return None if row is None else _hydrate(self._args[0], row)
+
+    def _primary_key(self):
+        """ Return the primary key values, in the primary key order """
+        model_class, primary_key = self._args[0], self._args[1:]
+        if primary_key:
+            return primary_key
+        return tuple(self._kwargs.get(key) for key in
+                     model_class.__meta__['compiled'].primary_key)
+
+    def _render_sql(self, renderer):
         renderer.render_get(*self._args, **self._kwargs)
         if self._child:
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        model_class, primary_key = self._args[0], self._args[1:]
+        keys = tuple(sorted(self._kwargs))
+        parameters.extend(primary_key)
+        parameters.extend(self._kwargs[key] for key in keys)
+        return _chain_shape((self.__class__, model_class, len(primary_key),
+                             keys),
+                            self._child, parameters)
+
 
 class Select(_ManyResultQuery):
+    _cacheable = True
 
     def render_sql(self):
-        renderer = registry.get(interfaces.IDialect)()
-        renderer.render_select(*self._args, **self._kwargs)
+        return self._render_cached_sql()
+
+    def _tables(self):
+        model_class = self._model_class()
+        if model_class is None:
+            return None
+        return _chain_tables({table_key(model_class)}, self)
+
+    def stream(self, batch_size=100, cursor=None):
+        """
+        Return an asynchronous iterator over the selected models, fetched
+        by batches of ``batch_size`` rows using a server side cursor.
+
+        The cursor may be a :class:`Transaction`, otherwise a connection is
+        pinned in a transaction of its own until the stream is exhausted or
+        closed.
+        """
+        return Stream(self, batch_size=batch_size, cursor=cursor)
+
+    @asyncio.coroutine
+    def to_columns(self, batch_size=10000, cursor=None):
+        """
+        Return the selected rows as a dict of NumPy arrays, by attribute
+        name. Arrays are filled from a stream of ``batch_size`` rows, see
+        :meth:`stream`. NumPy must be installed.
+        """
+        stream = Stream(self, batch_size=batch_size, cursor=cursor)
+        return (yield from fetch_columns(stream, self._args[0]))
+
+    def _render_sql(self, renderer):
+        join_loads = self._join_loads()
+        if join_loads:
+            renderer.render_select(*self._args, join_load=join_loads,
+                                   **self._kwargs)
+        else:
+            renderer.render_select(*self._args, **self._kwargs)
         if self._child:
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        if len(self._args) != 1 or self._kwargs:
+            return None
+        expression = self._args[0]
+        if not inspect.isclass(expression):
+            if not hasattr(expression, '_shape'):
+                return None
+            expression = expression._shape(parameters)
+        return _chain_shape((self.__class__, expression),
+                            self._child, parameters)
+
+
+class SelectRelated(_Query):
+    """
+    Select the models of a many to many relation for many parents, with
+    the key of their parent. Used to prefetch the relation.
+    """
+
+    def render_sql(self):
+        renderer = registry.get(interfaces.IDialect)()
+        renderer.render_select_related(*self._args, **self._kwargs)
+        return renderer.query, renderer.parameters
+
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        """ Return the list of (parent key, model) """
+        relation = self._args[0]
+        identity_map = _identity_map(cursor)
+
+        @asyncio.coroutine
+        def wrapped(cursor):
+            sql_statement = self.render_sql()
+            log.debug('{!r} % {!r}'.format(*sql_statement))
+            yield from cursor.execute(*sql_statement)
+            return (yield from cursor.fetchall())
+
+        rows = yield from _with_cursor(relation.model.__meta__['database'],
+                                       cursor, wrapped)
+        return [(row[0], _hydrate(relation.target, row[1:], identity_map))
+                for row in rows]
+
 
 class Insert(_Query):
+    _action = 'insert'
 
     def render_sql(self):
         renderer = registry.get(interfaces.IDialect)()
-        renderer.render_insert(*self._args, **self._kwargs)
+        renderer.render_insert(*self._args, returning=False, **self._kwargs)
+        if self._child:
+            self._child.render_sql(renderer)
+        renderer.render_returning(self._args[0].__class__)
         return renderer.query, renderer.parameters
 
     @asyncio.coroutine
     def run(self, cursor=None):
+        loaded = _loaded(self._args[0])
         row = yield from super().run(fetchall=False, cursor=cursor)
         if row is None:
             return None
-        model = self._args[0]
-        for idx, col in enumerate(model.__meta__['columns']):
-            setattr(model, col, row[idx])
+        model = _set_columns(self._args[0], row)
+        identity_map = _identity_map(cursor)
+        if identity_map is not None:
+            identity_map.add(model)
+        publish(WriteEvent(model.__class__, self._action, [model], [loaded],
+                           cursor=cursor))
+        entity_cache = _entity_cache(model.__class__)
+        if entity_cache is not None and not cursor:
+            entity_cache.set(IdentityMap.key(model)[1], row)
         return model
 
+    @classmethod
+    def many(cls, models, returning=True, chunk_size=None):
+        """
+        Insert many models using multi-row INSERT statements.
+
+        If returning is True, the inserted rows are written back on every
+        model, in order, to retrieve autoincrement and server defaults.
+        """
+        return InsertMany(models, returning=returning, chunk_size=chunk_size)
+
+
+class _BulkQuery(_Query):
+    """ Query many rows by chunks, using a single statement per chunk """
+
+    max_parameters = 32767
+
+    def __init__(self, models, chunk_size=None, **kwargs):
+        super().__init__(models, **kwargs)
+        self._chunk_size = chunk_size
+
+    def _row_parameters(self, model):
+        """ Return the number of parameters per rendered row """
+        raise NotImplementedError
+
+    def _chunks(self, models, model=None):
+        size = self._chunk_size
+        if not size:
+            if model is None:
+                model = models[0]
+            size = max(1, self.max_parameters //
+                          max(1, self._row_parameters(model)))
+        for idx in range(0, len(models), size):
+            yield models[idx:idx + size]
+
+
+class InsertMany(_BulkQuery):
+    """ Insert models by chunks, using a single statement per chunk """
+
+    def __init__(self, models, returning=True, chunk_size=None):
+        super().__init__(models, chunk_size=chunk_size)
+        self._returning = returning
+
+    def _row_parameters(self, model):
+        return len(model.__meta__['compiled'].insert_attributes)
+
+    def _set_returned_rows(self, models, rows):
+        """
+        Some rows have been skipped by the conflict clause, returned rows
+        are matched to the models using the conflict target columns.
+        """
+        model_class = models[0].__class__
+        keys = self._child.key_attributes(model_class)
+        if not keys:
+            return
+        attributes = model_class.__meta__['compiled'].attributes
+        indexes = [attributes.index(key) for key in keys]
+        models = {tuple(getattr(model, key) for key in keys): model
+                  for model in models}
+        for row in rows:
+            model = models.get(tuple(row[idx] for idx in indexes))
+            if model is not None:
+                _set_columns(model, row)
+
+    def render_sql(self, models=None):
+        if models is None:
+            models = self._args[0]
+        renderer = registry.get(interfaces.IDialect)()
+        renderer.render_insert_many(models)
+        if self._child:
+            self._child.render_sql(renderer)
+        if self._returning:
+            renderer.render_returning(models[0].__class__)
+        return renderer.query, renderer.parameters
+
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        models = list(self._args[0])
+        if not models:
+            return models
+
+        @asyncio.coroutine
+        def wrapped(cursor):
+            for chunk in self._chunks(models):
+                sql_statement = self.render_sql(chunk)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('{} % {!r}'.format(*sql_statement))
+                yield from cursor.execute(*sql_statement)
+                if self._returning:
+                    rows = yield from cursor.fetchall()
+                    if getattr(self._child, 'skips_rows', False):
+                        self._set_returned_rows(chunk, rows)
+                    else:
+                        for model, row in zip(chunk, rows):
+                            _set_columns(model, row)
+            return models
+
+        models = yield from _with_cursor(models[0].__meta__['database'],
+                                         cursor, wrapped)
+        model_class = models[0].__class__
+        written = models
+        if not self._returning and any(
+                getattr(model_class, attr).autofield for attr in
+                model_class.__meta__['compiled'].primary_key_attributes):
+            # the keys set by the server are unknown, so are the rows
+            written = None
+        publish(WriteEvent(model_class, 'insert', written, cursor=cursor))
+        return models
+
+
+class Copy(_Query):
+    """
+    Bulk load rows with COPY FROM STDIN.
+
+    Rows are tuples in the columns order, or instances of the model.
+    They are consumed and sent by chunks, to keep a bounded memory usage.
+
+    COPY requires the driver to implement the optional coroutine
+    ``copy_from(statement, chunks, cursor=None)``, chunks being an iterator
+    of bytes. Otherwise the chunks are inserted using multi-row INSERT.
+
+    COPY data has no DEFAULT, the ``utc_now()`` defaults of the models
+    take the client time at the start of the copy, the same for every row.
+    """
+
+    def __init__(self, model_class, columns=None):
+        super().__init__(model_class)
+        compiled = model_class.__meta__['compiled']
+        if columns is None:  # autoincrement columns are set by the server
+            columns = [col for col in compiled.columns
+                       if not getattr(model_class,
+                                      model_class.__meta__['attributes'][col]
+                                      ).autofield]
+        self._columns = list(columns)
+        self._rows = ()
+        self._format = 'text'
+        self._chunk_size = 1000
+
+    def from_iterable(self, rows, format='text', chunk_size=1000):
+        self._rows = rows
+        self._format = format
+        self._chunk_size = chunk_size
+        return self
+
+    def render_sql(self):
+        renderer = registry.get(interfaces.IDialect)()
+        renderer.render_copy(self._args[0], self._columns, self._format)
+        return renderer.query, renderer.parameters
+
+    def _iter_chunks(self):
+        chunk = []
+        for row in self._rows:
+            chunk.append(row)
+            if len(chunk) >= self._chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _to_values(self, chunk, now):
+        model_class = self._args[0]
+        attributes = [model_class.__meta__['attributes'][col]
+                      for col in self._columns]
+        rows = []
+        for row in chunk:
+            if isinstance(row, model_class):
+                row = [getattr(row, attr) for attr in attributes]
+                # the client time, not the NOW() of the server
+                row = [now if isinstance(value, utc_now) else value
+                       for value in row]
+            rows.append(row)
+        return rows
+
+    def _to_models(self, chunk):
+        model_class = self._args[0]
+        attributes = [model_class.__meta__['attributes'][col]
+                      for col in self._columns]
+        models = []
+        for row in chunk:
+            if not isinstance(row, model_class):
+                model = model_class()
+                for attr, value in zip(attributes, row):
+                    setattr(model, attr, value)
+                row = model
+            models.append(row)
+        return models
+
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        """ Copy the rows, return the number of rows copied """
+        model_class = self._args[0]
+        driver = registry.get_driver(model_class.__meta__['database'])
+        copy_from = getattr(driver, 'copy_from', None)
+        count = 0
+
+        if copy_from is None:
+            for chunk in self._iter_chunks():
+                yield from InsertMany(self._to_models(chunk), returning=False
+                                      ).run(cursor=cursor)
+                count += len(chunk)
+            return count
+
+        renderer = registry.get(interfaces.IDialect)()
+        fields = [getattr(model_class,
+                          model_class.__meta__['attributes'][col])
+                  for col in self._columns]
+        now = datetime.now(timezone.utc)
+
+        def chunks():
+            nonlocal count
+            yield renderer.render_copy_start(self._format)
+            for chunk in self._iter_chunks():
+                yield renderer.render_copy_rows(fields,
+                                                self._to_values(chunk, now),
+                                                self._format)
+                count += len(chunk)
+            yield renderer.render_copy_end(self._format)
+
+        sql_statement = self.render_sql()
+        log.debug(sql_statement[0])
+        yield from copy_from(sql_statement[0], chunks(), cursor=cursor)
+        publish(WriteEvent(model_class, 'copy', cursor=cursor))
+        return count
+
 
 class Update(Insert):
+    """
+    Update a model. A model loaded from the database only updates the
+    columns changed since, and is not updated at all if nothing changed.
+    """
+    _action = 'update'
 
     def render_sql(self):
         renderer = registry.get(interfaces.IDialect)()
-        renderer.render_update(*self._args, **self._kwargs)
+        columns = changed_columns(self._args[0])
+        if columns is None:
+            renderer.render_update(*self._args, **self._kwargs)
+        else:
+            renderer.render_update(*self._args, columns=columns,
+                                   **self._kwargs)
+        return renderer.query, renderer.parameters
+
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        if changed_columns(self._args[0]) == []:
+            log.debug('{!r} not changed, not updated'.format(self._args[0]))
+            return self._args[0]
+        return (yield from super().run(cursor=cursor))
+
+    @classmethod
+    def many(cls, models, columns=None, chunk_size=None):
+        """
+        Update the given columns of many models, by primary key, using
+        a single UPDATE ... FROM (VALUES ...) statement per chunk.
+        columns default to every column that is not immutable.
+        """
+        return UpdateMany(models, columns=columns, chunk_size=chunk_size)
+
+
+class UpdateMany(_BulkQuery):
+    """ Update models by chunks, return the number of updated rows """
+
+    def __init__(self, models, columns=None, chunk_size=None):
+        super().__init__(models, chunk_size=chunk_size)
+        self._columns = columns
+
+    def _get_columns(self, model):
+        meta = model.__meta__
+        if self._columns is None:
+            return [col for col in meta['compiled'].columns
+                    if not getattr(model.__class__,
+                                   meta['attributes'][col]).immutable]
+        columns = [getattr(col, 'name', col) for col in self._columns]
+        for col in columns:
+            if getattr(model.__class__, meta['attributes'][col]).immutable:
+                raise RuntimeError('Column {}.{} is immutable'.format(
+                    meta['tablename'], col))
+        return columns
+
+    def _row_parameters(self, model):
+        return (len(model.__meta__['compiled'].primary_key) +
+                len(self._get_columns(model)))
+
+    def render_sql(self, models=None):
+        if models is None:
+            models = self._args[0]
+        renderer = registry.get(interfaces.IDialect)()
+        renderer.render_update_many(models, self._get_columns(models[0]))
         return renderer.query, renderer.parameters
 
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        models = list(self._args[0])
+        if not models or not self._get_columns(models[0]):
+            return 0  # no column to update, SET would be empty
+        loaded = [_loaded(model) for model in models]
+
+        @asyncio.coroutine
+        def wrapped(cursor):
+            count = 0
+            for chunk in self._chunks(models):
+                sql_statement = self.render_sql(chunk)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('{} % {!r}'.format(*sql_statement))
+                yield from cursor.execute(*sql_statement)
+                count += cursor.rowcount
+            return count
+
+        count = yield from _with_cursor(models[0].__meta__['database'],
+                                        cursor, wrapped)
+        publish(WriteEvent(models[0].__class__, 'update', models, loaded,
+                           cursor=cursor))
+        return count
+
 
 class Delete(_NoResultQuery):
+    """
+    Delete a model instance, or the rows of a model class matching a
+    where clause, e.g. ``Delete(User).where(User.lang == 'fr')``.
+    Run the query return the number of deleted rows.
+    """
 
     def render_sql(self):
         renderer = registry.get(interfaces.IDialect)()
-        renderer.render_delete(*self._args, **self._kwargs)
+        if inspect.isclass(self._args[0]):
+            renderer.render_delete_from(*self._args, **self._kwargs)
+            if self._child:
+                self._child.render_sql(renderer)
+        else:
+            renderer.render_delete(*self._args, **self._kwargs)
         return renderer.query, renderer.parameters
 
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        @asyncio.coroutine
+        def wrapped(cursor):
+            sql_statement = self.render_sql()
+            log.debug('{!r} % {!r}'.format(*sql_statement))
+            yield from cursor.execute(*sql_statement)
+            return cursor.rowcount
+
+        identity_map = _identity_map(cursor)
+        if identity_map is not None:
+            if inspect.isclass(self._args[0]):
+                identity_map.clear(self._args[0])
+            else:
+                identity_map.remove(self._args[0])
+        count = yield from _with_cursor(self._args[0].__meta__['database'],
+                                        cursor, wrapped)
+        if inspect.isclass(self._args[0]):
+            publish(WriteEvent(self._args[0], 'delete', cursor=cursor))
+        else:
+            publish(WriteEvent(self._args[0].__class__, 'delete',
+                               [self._args[0]], [_loaded(self._args[0])],
+                               cursor=cursor))
+        return count
+
+    @classmethod
+    def many(cls, models_or_pks, model_class=None, chunk_size=None):
+        """
+        Delete many rows by primary keys, using a single statement per
+        chunk. Primary keys are values, tuples or dicts for composite
+        keys, in that case the model_class is required.
+        """
+        return DeleteMany(models_or_pks, model_class=model_class,
+                          chunk_size=chunk_size)
+
+
+class DeleteMany(_BulkQuery):
+    """ Delete rows by chunks, return the number of deleted rows """
+
+    def __init__(self, models_or_pks, model_class=None, chunk_size=None):
+        super().__init__(models_or_pks, chunk_size=chunk_size)
+        self._model_class = model_class
+
+    def _row_parameters(self, model_class):
+        return len(model_class.__meta__['compiled'].primary_key)
+
+    def _get_keys(self, items):
+        """ Return the model class and the primary keys as tuples """
+        model_class = self._model_class
+        if model_class is None:
+            if inspect.isclass(items[0]) or not hasattr(items[0], '__meta__'):
+                raise RuntimeError('model_class is required to delete '
+                                   'by primary keys')
+            model_class = items[0].__class__
+
+        compiled = model_class.__meta__['compiled']
+        keys = []
+        for item in items:
+            if isinstance(item, model_class):
+                item = tuple(getattr(item, attr)
+                             for attr in compiled.primary_key_attributes)
+            elif isinstance(item, dict):
+                item = tuple(item[col] for col in compiled.primary_key)
+            elif not isinstance(item, tuple):
+                item = (item,)
+            if len(item) != len(compiled.primary_key):
+                raise RuntimeError('Invalid primary key {!r}'.format(item))
+            keys.append(item)
+        return model_class, keys
+
+    def render_sql(self, keys=None, model_class=None):
+        if keys is None:
+            model_class, keys = self._get_keys(list(self._args[0]))
+        renderer = registry.get(interfaces.IDialect)()
+        renderer.render_delete_many(model_class, keys)
+        return renderer.query, renderer.parameters
+
+    @asyncio.coroutine
+    def run(self, cursor=None):
+        items = list(self._args[0])
+        if not items:
+            return 0
+        model_class, keys = self._get_keys(items)
+        identity_map = _identity_map(cursor)
+        if identity_map is not None:
+            for key in keys:
+                identity_map.discard(model_class, key)
+
+        @asyncio.coroutine
+        def wrapped(cursor):
+            count = 0
+            for chunk in self._chunks(keys, model_class):
+                sql_statement = self.render_sql(chunk, model_class)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('{} % {!r}'.format(*sql_statement))
+                yield from cursor.execute(*sql_statement)
+                count += cursor.rowcount
+            return count
+
+        count = yield from _with_cursor(model_class.__meta__['database'],
+                                        cursor, wrapped)
+        if all(isinstance(item, model_class) for item in items):
+            publish(WriteEvent(model_class, 'delete', items,
+                               [_loaded(item) for item in items],
+                               cursor=cursor))
+        else:
+            publish(WriteEvent(model_class, 'delete', primary_keys=keys,
+                               cursor=cursor))
+        return count
+
 
 class Statement:
 
@@ -170,9 +938,7 @@ class Statement:
         If you want to had your own statement, register your own interface,
         with your own implementation in aiorm registry.
         """
-        iface = ['I'] + [word.capitalize() for word in  key.split('_')]
-        iface = getattr(interfaces, ''.join(iface))
-        self._child = registry.get(iface)(self._query)
+        self._child = _get_statement(key)(self._query)
         return self._child
 
     def __call__(self, *args, **kwargs):
@@ -180,10 +946,417 @@ class Statement:
         self._kwargs = kwargs
         return self
 
+    def _shape(self, parameters):
+        """ Statements are not cached unless they describe their shape """
+        return None
+
     @asyncio.coroutine
     def run(self, *args, **kwargs):
         return (yield from self._query.run(*args, **kwargs))
 
+    def stream(self, *args, **kwargs):
+        return self._query.stream(*args, **kwargs)
+
+    def to_columns(self, *args, **kwargs):
+        return self._query.to_columns(*args, **kwargs)  # the coroutine
+
+
+class _AsyncIterator:
+    """
+    Asynchronous iteration over the models returned by fetchmany, the
+    ``async for`` sugar of Python 3.5.
+    """
+
+    _buffer = ()
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if not self._buffer:
+            self._buffer = yield from self.fetchmany()
+            if not self._buffer:
+                raise StopAsyncIteration
+            self._buffer.reverse()
+        return self._buffer.pop()
+
+
+class Stream(_AsyncIterator):
+    """
+    Asynchronous iterator over the models of a select query, fetching rows
+    by batches from a server side cursor, to keep the memory bounded::
+
+        stream = Select(User).stream(batch_size=500)
+        while True:
+            users = yield from stream.fetchmany()
+            if not users:
+                break
+            ...
+
+    :meth:`fetchmany` returns the next batch of models, an empty list when
+    the stream is exhausted. With Python 3.5, streams also support
+    ``async for user in Select(User).stream(batch_size=500)``.
+
+    Streamed in a transaction, the models are the ones of its identity
+    map, as for :meth:`Select.run`.
+    A stream not consumed to the end must be closed with :meth:`close`.
+    """
+    _names = itertools.count(1)
+
+    def __init__(self, query, batch_size=100, cursor=None):
+        self._query = query
+        self._batch_size = batch_size
+        self._cursor = cursor
+        self._transaction = None
+        self._name = 'aiorm_stream_{}'.format(next(self._names))
+        self._buffer = []
+        self._declared = False
+        self._exhausted = False
+
+    @asyncio.coroutine
+    def _declare(self):
+        if self._cursor is None:
+            self._transaction = Transaction(
+                self._query._args[0].__meta__['database'])
+            yield from self._transaction.begin()
+            self._cursor = self._transaction
+        query, parameters = self._query.render_sql()
+        renderer = registry.get(interfaces.IDialect)()
+        stmt = renderer.render_declare_cursor(self._name, query)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('{} % {!r}'.format(stmt, parameters))
+        try:
+            yield from self._cursor.execute(stmt, parameters)
+        except Exception:
+            yield from self._release(commit=False)
+            raise
+        self._declared = True
+
+    @asyncio.coroutine
+    def _release(self, commit=True):
+        self._exhausted = True
+        transaction, self._transaction = self._transaction, None
+        if transaction is not None:
+            if commit:
+                yield from transaction.commit()
+            else:
+                yield from transaction.rollback()
+
+    @asyncio.coroutine
+    def fetchmany(self):
+        """ Return the next batch of models, an empty list at the end """
+        rows = yield from self.fetchrows()
+        return list(map(self._query._row_hydrator(
+            _identity_map(self._cursor)), rows))
+
+    @asyncio.coroutine
+    def fetchrows(self):
+        """ Return the next batch of rows, an empty list at the end """
+        if self._exhausted:
+            return []
+        if not self._declared:
+            yield from self._declare()
+        renderer = registry.get(interfaces.IDialect)()
+        try:
+            yield from self._cursor.execute(
+                renderer.render_fetch(self._name, self._batch_size))
+            rows = yield from self._cursor.fetchall()
+        except Exception:
+            yield from self._release(commit=False)
+            raise
+        if len(rows) < self._batch_size:
+            yield from self.close()
+        return rows
+
+    @asyncio.coroutine
+    def close(self):
+        """ Close the server side cursor and release the connection """
+        if self._exhausted:
+            return
+        if self._declared:
+            renderer = registry.get(interfaces.IDialect)()
+            try:
+                yield from self._cursor.execute(
+                    renderer.render_close_cursor(self._name))
+            except Exception:
+                yield from self._release(commit=False)
+                raise
+        yield from self._release()
+
+
+class Page:
+    """
+    A page of models returned by :meth:`OrderBy.paginate_after`.
+    ``next_token`` is the opaque token of the next page, None if this page
+    is the last one.
+    """
+
+    def __init__(self, models, next_token=None):
+        self.models = models
+        self.next_token = next_token
+
+    def __iter__(self):
+        return iter(self.models)
+
+    def __len__(self):
+        return len(self.models)
+
+
+class KeysetIterator(_AsyncIterator):
+    """
+    Asynchronous iterator over all the models of an ordered select query,
+    fetched page by page with :meth:`OrderBy.paginate_after`.
+    """
+
+    def __init__(self, order_by, page_size=1000, cursor=None):
+        self._order_by = order_by
+        self._page_size = page_size
+        self._cursor = cursor
+        self._next_token = None
+        self._exhausted = False
+
+    @asyncio.coroutine
+    def fetchmany(self):
+        """ Return the models of the next page, an empty list at the end """
+        if self._exhausted:
+            return []
+        page = yield from self._order_by.paginate_after(
+            self._next_token, page_size=self._page_size, cursor=self._cursor)
+        self._next_token = page.next_token
+        self._exhausted = page.next_token is None
+        return page.models
+
+
+_datetime_format = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        offset = value.utcoffset()
+        return {'datetime': value.strftime(_datetime_format),
+                'utcoffset': (None if offset is None
+                              else int(offset.total_seconds()))}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, uuid.UUID):
+        return {'uuid': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            decoded = datetime.strptime(value['datetime'], _datetime_format)
+            if value['utcoffset'] is not None:
+                decoded = decoded.replace(tzinfo=timezone(
+                    timedelta(seconds=value['utcoffset'])))
+            return decoded
+        if 'date' in value:
+            return datetime.strptime(value['date'], '%Y-%m-%d').date()
+        if 'uuid' in value:
+            return uuid.UUID(value['uuid'])
+    return value
+
+
+def encode_page_token(values):
+    """ Encode the keyset values of a row in an opaque pagination token """
+    token = json.dumps([_encode_value(value) for value in values],
+                       separators=(',', ':'))
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+
+
+def decode_page_token(token):
+    """ Decode the keyset values of a pagination token """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(
+            token.encode('ascii')).decode('utf-8'))
+    except ValueError:
+        raise ValueError('Invalid pagination token {!r}'.format(token))
+    if not isinstance(values, list):
+        raise ValueError('Invalid pagination token {!r}'.format(token))
+    return [_decode_value(value) for value in values]
+
+
+_row_types = {}
+""" Named tuple classes of the rows, by type name and fields """
+
+
+def _row_fields(expression):
+    """ Return the type name and the fields of the rows of a select """
+    if inspect.isclass(expression):
+        return (expression.__name__,
+                expression.__meta__['compiled'].attributes)
+    name = expression.__class__.__name__
+    return name, (name,)
+
+
+def _row_type(typename, fields):
+    """ Return the named tuple class of rows, created once """
+    try:
+        return _row_types[typename, fields]
+    except KeyError:
+        row_type = namedtuple(typename[:1].upper() + typename[1:] + 'Row',
+                              fields)
+        _row_types[typename, fields] = row_type
+        return row_type
+
+
+def _rows_converter(expression, result):
+    """ Return the function converting fetched rows to the result type """
+    if result == 'tuple':
+        return lambda rows: rows
+    typename, fields = _row_fields(expression)
+    if result == 'namedtuple':
+        make = _row_type(typename, fields)._make
+        return lambda rows: list(map(make, rows))
+    if result == 'dict':
+        return lambda rows: [dict(zip(fields, row)) for row in rows]
+    raise ValueError('Invalid result type {!r}, expected model, tuple, '
+                     'namedtuple or dict'.format(result))
+
+
+def _identity_map(cursor):
+    """ Return the identity map of the transaction used as cursor, if any """
+    if isinstance(cursor, Transaction):
+        return cursor.identity_map
+    return None
+
+
+def _entity_cache(model_class):
+    """ Return the entity cache of the model class, if any """
+    if not inspect.isclass(model_class):
+        return None
+    return model_class.__meta__.get('cache')
+
+
+def _to_int(value):
+    if isinstance(value, (int, str)):
+        return int(value)
+    raise ValueError('{!r} is not an integer'.format(value))
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    raise ValueError('{!r} is not a string'.format(value))
+
+
+def _to_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+
+
+class _KeyCast:
+    """
+    Visit the column types to return the function casting a primary key
+    value given to Get to the type of the fetched values.
+    """
+
+    def render_integer(self, field):
+        return _to_int
+
+    def _render_text(self, field):
+        return _to_str
+
+    render_string = render_text = render_citext = _render_text
+
+    def render_uuid(self, field):
+        return _to_uuid
+
+    def _render_value(self, field):
+        return lambda value: value
+
+    render_boolean = render_timestamp = render_jsonb = _render_value
+
+
+def _cache_key(model_class, primary_key):
+    """
+    Return the entity cache key of primary key values, as the keys of the
+    fetched rows, None if they cannot be cast to the column types.
+    """
+    fields = [getattr(model_class, attr).type for attr in
+              model_class.__meta__['compiled'].primary_key_attributes]
+    try:
+        return tuple(field.render_sql(_KeyCast())(value)
+                     for field, value in zip(fields, primary_key))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _hydrate(model_class, row, identity_map=None):
+    """ Return the model of a row, the one of the identity map if loaded """
+    if identity_map is None:
+        return _set_columns(model_class(), row)
+    compiled = model_class.__meta__['compiled']
+    model = identity_map.get(model_class,
+                             tuple(row[index]
+                                   for index in compiled.primary_key_indexes))
+    if model is None:
+        model = _set_columns(model_class(), row)
+        identity_map.add(model)
+    return model
+
+
+def _loaded(model):
+    """ Return the values of the model loaded from the database, if any """
+    return model.__dict__.get('__loaded__')
+
+
+def _set_columns(model, row):
+    """
+    Set the values of a row, in the columns order, on a model, and record
+    them as the loaded values.
+    """
+    set_values(model, row)
+    mark_loaded(model)
+    return model
+
+
+@asyncio.coroutine
+def _with_cursor(database, cursor, wrapped):
+    """ Run the wrapped coroutine with the cursor, or a cursor of the pool """
+    if cursor:
+        return (yield from wrapped(cursor))
+    driver = registry.get_driver(database)
+    with (yield from driver.cursor()) as cursor:
+        return (yield from wrapped(cursor))
+
+
+def _same_parameters(rendered, collected):
+    """ Ensure that the statements collect parameters as the dialect does """
+    return (isinstance(rendered, list) and
+            len(rendered) == len(collected) and
+            all(val is collected[idx] for idx, val in enumerate(rendered)))
+
+
+def _chain_shape(shape, child, parameters):
+    if child is None:
+        return shape
+    child_shape = child._shape(parameters)
+    if child_shape is None:
+        return None
+    return shape + (child_shape,)
+
+
+def _chain_tables(tables, query):
+    """
+    Add the tables of the statements of the query to the tables, return
+    None if the tables of a statement are not known.
+    """
+    for statement in query._statements():
+        if isinstance(statement, (Join, LeftJoin)):
+            if not inspect.isclass(statement._args[0]):
+                return None
+            tables.add(table_key(statement._args[0]))
+        elif isinstance(statement, JoinLoad):
+            tables.update(table_key(relation.target)
+                          for relation in statement._args)
+    return tables
+
+
+def _columns_shape(columns):
+    return tuple((column.model, column.name) for column in columns)
+
 
 @implementer(interfaces.IJoin)
 class Join(Statement):
@@ -194,6 +1367,14 @@ class Join(Statement):
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        # custom join conditions are not cached
+        if (len(self._args) != 1 or self._kwargs or
+                not inspect.isclass(self._args[0])):
+            return None
+        return _chain_shape((self.__class__, self._args[0]),
+                            self._child, parameters)
+
 
 @implementer(interfaces.ILeftJoin)
 class LeftJoin(Statement):
@@ -204,6 +1385,8 @@ class LeftJoin(Statement):
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    _shape = Join._shape
+
 
 
 @implementer(interfaces.IWhere)
@@ -215,6 +1398,19 @@ class Where(Statement):
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        if self._kwargs:
+            return None
+        shapes = []
+        for condition in self._args:
+            if not hasattr(condition, '_shape'):
+                return None
+            shapes.append(condition._shape(parameters))
+        if None in shapes:
+            return None
+        return _chain_shape((self.__class__, tuple(shapes)),
+                            self._child, parameters)
+
 
 @implementer(interfaces.ILimit)
 class Limit(Statement):
@@ -225,6 +1421,12 @@ class Limit(Statement):
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        # limit and offset are rendered in the query, not as parameters
+        return _chain_shape((self.__class__, self._args,
+                             tuple(sorted(self._kwargs.items()))),
+                            self._child, parameters)
+
 
 @implementer(interfaces.IGroupBy)
 class GroupBy(Statement):
@@ -236,16 +1438,192 @@ class GroupBy(Statement):
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        if self._kwargs:
+            return None
+        return _chain_shape((self.__class__, _columns_shape(self._args)),
+                            self._child, parameters)
+
 
 @implementer(interfaces.IOrderBy)
 class OrderBy(Statement):
+    """
+    An Order By clause statement.
+
+    The ordered columns can be used to paginate with a keyset instead of
+    an offset, they must be columns of the selected model, and identify
+    a row, the primary key should be the last one.
+    """
+    _keyset = None  # (values of the previous row or None, page size)
 
     def render_sql(self, renderer):
+        if self._keyset is not None and self._keyset[0] is not None:
+            renderer.render_keyset(self._args, self._keyset[0])
         renderer.render_order_by(*self._args, **self._kwargs)
+        if self._keyset is not None:
+            # one more row tells if there is a next page
+            renderer.render_limit(self._keyset[1] + 1)
         if self._child:
             self._child.render_sql(renderer)
         return renderer.query, renderer.parameters
 
+    def _shape(self, parameters):
+        if self._kwargs:
+            return None
+        keyset = None
+        if self._keyset is not None:
+            values, page_size = self._keyset
+            keyset = (values is not None, page_size)
+            if values is not None:
+                parameters.extend(values)
+        return _chain_shape((self.__class__, _columns_shape(self._args),
+                             keyset),
+                            self._child, parameters)
+
+    def _keyset_values(self, row):
+        return [getattr(row, field.model.__meta__['attributes'][field.name])
+                for field in self._args]
+
+    @asyncio.coroutine
+    def paginate_after(self, after=None, page_size=100, cursor=None):
+        """
+        Return the :class:`Page` of the ``page_size`` models that follow
+        ``after`` in the order of the columns, the first page if ``after``
+        is None.
+
+        ``after`` is the last model of the previous page, the values of its
+        ordered columns, or the ``next_token`` of the previous page.
+        """
+        if self._child:
+            raise RuntimeError('paginate_after cannot be followed by '
+                               'another statement')
+        if after is None:
+            values = None
+        elif isinstance(after, str):
+            values = decode_page_token(after)
+        elif hasattr(after, '__meta__'):
+            values = self._keyset_values(after)
+        elif isinstance(after, (list, tuple)):
+            values = list(after)
+        else:
+            values = [after]
+        if values is not None and len(values) != len(self._args):
+            raise RuntimeError('{} values expected to paginate after, '
+                               'got {}'.format(len(self._args), len(values)))
+
+        self._keyset = (values, page_size)
+        try:
+            models = list((yield from self._query.run(cursor=cursor)))
+        finally:
+            self._keyset = None
+        next_token = None
+        if len(models) > page_size:
+            models = models[:page_size]
+            next_token = encode_page_token(self._keyset_values(models[-1]))
+        return Page(models, next_token)
+
+    def iterate_all(self, page_size=1000, cursor=None):
+        """
+        Return an asynchronous iterator over all the models of the query,
+        fetched by pages of ``page_size`` models, without OFFSET.
+        """
+        return KeysetIterator(self, page_size=page_size, cursor=cursor)
+
+
+@implementer(interfaces.IPrefetch)
+class Prefetch(Statement):
+    """
+    Load OneToMany and ManyToMany relations of all the selected models
+    with one query per relation, e.g.
+    ``Select(User).prefetch(User.groups, User.preferences)``
+    """
+
+    def render_sql(self, renderer):
+        # nothing to render, relations are loaded after the select
+        if self._child:
+            self._child.render_sql(renderer)
+        return renderer.query, renderer.parameters
+
+    def _shape(self, parameters):
+        return _chain_shape((self.__class__,), self._child, parameters)
+
+
+@implementer(interfaces.ICached)
+class Cached(Statement):
+    """
+    Keep the rows of a Get or a Select in the result cache, for ``ttl``
+    seconds or the cache ttl, until a table of the query is written, e.g.
+    ``Select(Group).order_by(Group.name).cached(ttl=5)``
+    """
+
+    def render_sql(self, renderer):
+        # nothing to render, see _Query.run
+        if self._child:
+            self._child.render_sql(renderer)
+        return renderer.query, renderer.parameters
+
+    def _shape(self, parameters):
+        return _chain_shape((self.__class__,), self._child, parameters)
+
+
+@implementer(interfaces.IJoinLoad)
+class JoinLoad(Statement):
+    """
+    Load OneToOne relations of the selected models in the select query,
+    using a LEFT JOIN per relation, e.g.
+    ``Select(UserPreference).join_load(UserPreference.preference)``
+    """
+
+    def __call__(self, *relations):
+        for relation in relations:
+            # OneToMany relations have the foreign key of the target,
+            # ManyToMany ones have none
+            foreign_key = getattr(relation, 'foreign_key', None)
+            if getattr(foreign_key, 'model', None) is not relation.model:
+                raise RuntimeError('Only OneToOne relations can be join '
+                                   'loaded, not {}.{}'.format(
+                                       relation.model.__name__,
+                                       relation.name))
+        return super().__call__(*relations)
+
+    def render_sql(self, renderer):
+        # joins are rendered with the select, see Select._render_sql
+        if self._child:
+            self._child.render_sql(renderer)
+        return renderer.query, renderer.parameters
+
+    def _shape(self, parameters):
+        return _chain_shape((self.__class__, self._args), self._child,
+                            parameters)
+
+
+@implementer(interfaces.IOnConflict)
+class OnConflict(Statement):
+    """
+    ON CONFLICT clause of Insert and Insert.many, e.g.
+    ``Insert(user).on_conflict(User.login, do_update=[User.email])``
+    """
+
+    def render_sql(self, renderer):
+        renderer.render_on_conflict(*self._args, **self._kwargs)
+        if self._child:
+            self._child.render_sql(renderer)
+        return renderer.query, renderer.parameters
+
+    @property
+    def skips_rows(self):
+        """ True if conflicting rows are not returned """
+        return bool(self._kwargs.get('do_nothing'))
+
+    def key_attributes(self, model_class):
+        """ Attributes of the target columns, None for a constraint name """
+        target = self._args[0]
+        if isinstance(target, str):
+            return None
+        columns = target if isinstance(target, (list, tuple)) else [target]
+        attributes = model_class.__meta__['attributes']
+        return [attributes[column.name] for column in columns]
+
 
 registry.register(Where, interfaces.IWhere)
 registry.register(Join, interfaces.IJoin)
@@ -253,3 +1631,7 @@ registry.register(LeftJoin, interfaces.ILeftJoin)
 registry.register(Limit, interfaces.ILimit)
 registry.register(GroupBy, interfaces.IGroupBy)
 registry.register(OrderBy, interfaces.IOrderBy)
+registry.register(OnConflict, interfaces.IOnConflict)
+registry.register(Prefetch, interfaces.IPrefetch)
+registry.register(JoinLoad, interfaces.IJoinLoad)
+registry.register(Cached, interfaces.ICached)
@@ -7,12 +7,96 @@ from . import interfaces
 log = logging.getLogger(__name__)
 
 
+class IdentityMap:
+    """
+    Models loaded in a transaction, by model class and primary key, to
+    get a single instance per row.
+    """
+
+    def __init__(self):
+        self._models = {}
+
+    def __len__(self):
+        return len(self._models)
+
+    @staticmethod
+    def key(model):
+        compiled = model.__meta__['compiled']
+        return (model.__class__,
+                tuple(getattr(model, attr)
+                      for attr in compiled.primary_key_attributes))
+
+    def get(self, model_class, primary_key):
+        """
+        Return the model of the given primary key values, in the primary
+        key columns order, None if not loaded
+        """
+        return self._models.get((model_class, primary_key))
+
+    def add(self, model):
+        """ Add the model, return the instance previously loaded if any """
+        return self._models.setdefault(self.key(model), model)
+
+    def remove(self, model):
+        self._models.pop(self.key(model), None)
+
+    def discard(self, model_class, primary_key):
+        self._models.pop((model_class, primary_key), None)
+
+    def clear(self, model_class=None):
+        """ Remove the models of the given class, or all the models """
+        if model_class is None:
+            self._models.clear()
+        else:
+            for key in [key for key in self._models if key[0] is model_class]:
+                del self._models[key]
+
+
 class Transaction(object):
+    """
+    A database transaction, queries are run in it by passing it as their
+    cursor.
 
-    def __init__(self, database):
+    With ``identity_map`` set, the transaction keeps the loaded models in
+    an :class:`IdentityMap`, a row is then hydrated once, and ``Get`` does
+    not query a model already loaded.
+    """
+
+    def __init__(self, database, identity_map=False):
         self.driver = registry.get_driver(database)
         self.connection = None
         self.cursor = None
+        self.identity_map = IdentityMap() if identity_map else None
+        self._before_commit = []
+        self._after_commit = []
+        self._after_rollback = []
+
+    def before_commit(self, callback):
+        """
+        Register a coroutine function called with the transaction before it
+        is committed, once if registered many times. Callbacks are forgotten
+        on rollback.
+        """
+        if callback not in self._before_commit:
+            self._before_commit.append(callback)
+
+    def after_commit(self, callback):
+        """
+        Register a function called with the transaction once it has been
+        committed, once if registered many times. Callbacks are forgotten
+        on rollback.
+        """
+        if callback not in self._after_commit:
+            self._after_commit.append(callback)
+
+    def after_rollback(self, callback):
+        """
+        Register a function called with the transaction once it has been
+        rolled back, once if registered many times. Callbacks are forgotten
+        on commit.
+        """
+        if callback not in self._after_rollback:
+            self._after_rollback.append(callback)
 
     @asyncio.coroutine
     def begin(self, timeout=None):
@@ -29,21 +113,33 @@ class Transaction(object):
         self.driver.release(self.connection)
         self.connection = None
         self.cursor = None
+        self._before_commit = []
+        self._after_commit = []
+        self._after_rollback = []
+        if self.identity_map is not None:
+            self.identity_map.clear()
 
     @asyncio.coroutine
     def commit(self):
+        after_commit = []
         try:
             if not self.cursor:
                 raise RuntimeError('transaction #{} not begun'.format(id(self)))
+            for callback in self._before_commit:
+                yield from callback(self)
             log.info('commiting transaction #{}'.format(id(self)))
             renderer = registry.get(interfaces.IDialect)()
             stmt = renderer.render_commit_transaction()
             yield from self.cursor.execute(stmt)
+            after_commit = self._after_commit
         finally:
             self._release()
+        for callback in after_commit:
+            callback(self)
 
     @asyncio.coroutine
     def rollback(self):
+        after_rollback = self._after_rollback
         try:
             if not self.cursor:
                 raise RuntimeError('transaction #{} not begun'.format(id(self)))
@@ -53,6 +149,8 @@ class Transaction(object):
             yield from self.cursor.execute(stmt)
         finally:
             self._release()
+            for callback in after_rollback:
+                callback(self)
 
     # Proxy cursor coroutines
 
@@ -67,3 +165,7 @@ class Transaction(object):
 
     def fetchall(self, *args, **kwargs):
         return self.cursor.fetchall(*args, **kwargs)  # return the coroutine
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
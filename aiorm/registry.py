@@ -13,6 +13,16 @@ from zope.interface.adapter import AdapterRegistry
 from .interfaces import IDriver
 
 _iface_registry = AdapterRegistry()
+_lookup_cache = {}
+
+version = 0
+""" Incremented every time the registry is modified """
+
+
+def _invalidate():
+    global version
+    version += 1
+    _lookup_cache.clear()
 
 
 def register(registred_type, *adapted_ifaces, adapt=IDriver):
@@ -35,6 +45,7 @@ def register(registred_type, *adapted_ifaces, adapt=IDriver):
 
     for iface in adapted_ifaces:
         _iface_registry.register([adapt], iface, '', registred_type)
+    _invalidate()
 
 
 def unregister(registred_type, adapt=IDriver):
@@ -43,19 +54,30 @@ def unregister(registred_type, adapt=IDriver):
         factory = _iface_registry.registered([adapt], iface)
         if factory is registred_type:
             _iface_registry.register([adapt], iface, '', None)
+    _invalidate()
 
 
 def get(adapted_iface, adapt=IDriver):
-    """ Return registered adapter for a given class and interface. """
+    """ Return registered adapter for a given class and interface.
+
+    Lookups are memoized until the next register or unregister call.
+    """
+    if (not isinstance(adapt, interface.InterfaceClass) and
+            not inspect.isclass(adapt)):
+        adapt = adapt.__class__
+
+    key = (adapted_iface, adapt)
+    registred_type = _lookup_cache.get(key)
+    if registred_type is not None:
+        return registred_type
 
     if not isinstance(adapt, interface.InterfaceClass):
-        if not inspect.isclass(adapt):
-            adapt = adapt.__class__
         adapt = declarations.implementedBy(adapt)
 
     registred_type = _iface_registry.lookup1(adapt, adapted_iface, '')
     if not registred_type:
         raise NotImplementedError('No implementation has been registered')
+    _lookup_cache[key] = registred_type
     return registred_type
 
 
@@ -63,17 +85,20 @@ _drivers = {}
 
 
 @asyncio.coroutine
-def connect(url, name=None):
+def connect(url, name=None, **options):
     """
     If name is provided, it's override the database in the url for
     the database in the code. e.g. you can have a database name which
     does not match the database name in your aiorm decorated class.
+
+    Options, e.g. the pool sizes, are given to the driver, they override
+    the ones of the url.
     """
     # XXX actually aiorm support only postgresql so this works,
     # but if we have to manage many connection on different
     # engine we are screwed, a lots of refactor have to be planned
     driver = get(IDriver)()
-    yield from driver.connect(url)
+    yield from driver.connect(url, **options)
     if name is None:
         name = driver.database
     _drivers[name] = driver
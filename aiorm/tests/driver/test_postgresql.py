@@ -1,6 +1,9 @@
 import asyncio
 from unittest import mock
 
+import psycopg2
+import psycopg2.extensions
+
 from aiorm.tests.testing import TestCase
 
 
@@ -49,3 +52,223 @@ class PostgresTestCase(TestCase):
             yield from driver.disconnect()
             driver.pool.mocked_cleared.assert_called_once_with()
         asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_connect_prepared(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.driver.postgresql.aiopg import Driver
+            driver = Driver()
+            yield from driver.connect('postgresql://localhost/db?prepared=1'
+                                      '&statement_cache_size=10')
+            self.assertTrue(driver.prepared)
+            self.assertEqual(driver.statement_cache_size, 10)
+            self._pool.connect.assert_called_with(host='localhost',
+                                                  port=5432,
+                                                  user='postgres',
+                                                  password='secret',
+                                                  database='db')
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_connect_pool_options(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.driver.postgresql.aiopg import Driver
+            driver = Driver()
+            yield from driver.connect('postgresql://localhost/db?minsize=2'
+                                      '&maxsize=20&timeout=5&max_idle=300',
+                                      maxsize=30, max_queries=1000)
+            self._pool.connect.assert_called_with(host='localhost',
+                                                  port=5432,
+                                                  user='postgres',
+                                                  password='secret',
+                                                  database='db',
+                                                  minsize=2,
+                                                  maxsize=30,
+                                                  timeout=5.0,
+                                                  pool_recycle=300.0)
+            self.assertEqual(driver.max_queries, 1000)
+            self.assertIsNone(driver.max_lifetime)
+            self.assertFalse(driver.prepared)
+
+            yield from driver.connect('postgresql://localhost/db',
+                                      max_lifetime=3600)
+            self.assertEqual(self._pool.connect.call_args[1]['on_connect'],
+                             driver._on_connect)
+            self.assertEqual(driver.max_lifetime, 3600.0)
+
+            with self.assertRaises(ValueError):
+                yield from driver.connect('postgresql://localhost/db',
+                                          pool_size=2)
+            with self.assertRaises(ValueError):
+                yield from driver.connect(
+                    'postgresql://localhost/db?max_size=20')
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_connect_warmup(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.driver.postgresql.aiopg import Driver
+            pool = self._pool.connect.return_value
+            connections = [mock.Mock(), mock.Mock(), mock.Mock()]
+
+            @asyncio.coroutine
+            def acquire():
+                return connections.pop(0)
+
+            pool.acquire = acquire
+            pool.maxsize = 10
+            yield from Driver().connect('postgresql://localhost/db?warmup=2')
+            self.assertEqual(len(connections), 1)
+            self.assertEqual(pool.release.call_count, 2)
+
+            # no more connections than the pool holds
+            pool.release.reset_mock()
+            pool.maxsize = 1
+            connections[:] = [mock.Mock(), mock.Mock()]
+            yield from Driver().connect('postgresql://localhost/db?warmup=2')
+            self.assertEqual(len(connections), 1)
+            self.assertEqual(pool.release.call_count, 1)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_recycle(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.driver.postgresql.aiopg import Driver
+            driver = Driver()
+            driver.pool = mock.Mock()
+            driver.max_queries = 2
+            cursor = PreparedCursor()
+            cursor.connection = connection = mock.Mock(closed=False)
+
+            yield from driver.execute(cursor, 'SELECT 1')
+            driver.release(connection)
+            self.assertFalse(connection.close.called)
+            yield from driver.execute(cursor, 'SELECT 2')
+            driver.release(connection)
+            driver.pool.release.assert_called_with(connection)
+            connection.close.assert_called_once_with()
+            self.assertEqual(cursor.queries, [('SELECT 1', None),
+                                              ('SELECT 2', None)])
+
+            driver.max_queries = None
+            driver.max_lifetime = 60
+            connection = mock.Mock(closed=False)
+            loop = asyncio.get_event_loop()
+            yield from driver._on_connect(connection)
+            driver.recycle(connection)
+            self.assertFalse(connection.close.called)
+            with mock.patch.object(loop, 'time',
+                                   return_value=loop.time() + 60):
+                driver.recycle(connection)
+            connection.close.assert_called_once_with()
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_prepared_statements_per_connection(self):
+        from aiorm.driver.postgresql.aiopg import Driver
+        driver = Driver()
+        connection, connection2 = mock.Mock(), mock.Mock()
+        statements = driver.prepared_statements(connection)
+        self.assertIs(driver.prepared_statements(connection), statements)
+        self.assertIsNot(driver.prepared_statements(connection2), statements)
+
+
+class PreparedCursor:
+
+    def __init__(self, status=psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+        self.queries = []
+        self.errors = []
+        self.raw = mock.Mock()
+        self.raw.connection.get_transaction_status.return_value = status
+
+    @asyncio.coroutine
+    def execute(self, query, parameters=None):
+        self.queries.append((query, parameters))
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+class PreparedStatementsTestCase(TestCase):
+
+    def test_to_server_placeholders(self):
+        from aiorm.driver.postgresql.aiopg import _to_server_placeholders
+        self.assertEqual(_to_server_placeholders(
+            'SELECT "a" FROM "t" WHERE "a" = %s AND "b" LIKE \'x%%\' '
+            'AND "c" IN (%s, %s)'),
+            ('SELECT "a" FROM "t" WHERE "a" = $1 AND "b" LIKE \'x%\' '
+             'AND "c" IN ($2, $3)', 3))
+
+    def test_execute(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.driver.postgresql.aiopg import PreparedStatements
+            statements = PreparedStatements(maxsize=1)
+            cursor = PreparedCursor()
+
+            yield from statements.execute(cursor, 'SELECT %s', [1])
+            yield from statements.execute(cursor, 'SELECT %s', [2])
+            self.assertEqual(cursor.queries,
+                             [('PREPARE aiorm_1 AS SELECT $1', None),
+                              ('EXECUTE aiorm_1 (%s)', [1]),
+                              ('EXECUTE aiorm_1 (%s)', [2]),
+                              ])
+            cursor.queries = []
+            yield from statements.execute(cursor, 'SELECT 1', [])
+            self.assertEqual(cursor.queries,
+                             [('DEALLOCATE aiorm_1', None),
+                              ('PREPARE aiorm_2 AS SELECT 1', None),
+                              ('EXECUTE aiorm_2', []),
+                              ])
+            self.assertEqual(len(statements), 1)
+
+            cursor.queries = []
+            yield from statements.execute(cursor, 'begin')
+            self.assertEqual(cursor.queries, [('begin', None)])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_execute_forgotten_statement(self):
+        @asyncio.coroutine
+        def aiotest():
+            import psycopg2
+            from aiorm.driver.postgresql.aiopg import PreparedStatements
+            statements = PreparedStatements()
+            cursor = PreparedCursor()
+            yield from statements.execute(cursor, 'SELECT %s', [1])
+
+            error = type('InvalidSqlStatementName', (psycopg2.Error,),
+                         {'pgcode': '26000'})()
+            cursor.errors = [error]
+            cursor.queries = []
+            yield from statements.execute(cursor, 'SELECT %s', [2])
+            self.assertEqual(cursor.queries,
+                             [('EXECUTE aiorm_1 (%s)', [2]),
+                              ('PREPARE aiorm_2 AS SELECT $1', None),
+                              ('EXECUTE aiorm_2 (%s)', [2]),
+                              ])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_execute_forgotten_statement_transaction(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.driver.postgresql.aiopg import PreparedStatements
+            statements = PreparedStatements()
+            cursor = PreparedCursor(
+                psycopg2.extensions.TRANSACTION_STATUS_INERROR)
+            yield from statements.execute(cursor, 'SELECT %s', [1])
+
+            error = type('InvalidSqlStatementName', (psycopg2.Error,),
+                         {'pgcode': '26000'})()
+            cursor.errors = [error]
+            cursor.queries = []
+            # the transaction is aborted, the error is not hidden by a retry
+            with self.assertRaises(psycopg2.Error) as raised:
+                yield from statements.execute(cursor, 'SELECT %s', [2])
+            self.assertIs(raised.exception, error)
+            self.assertEqual(cursor.queries, [('EXECUTE aiorm_1 (%s)', [2])])
+            self.assertEqual(len(statements), 0)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
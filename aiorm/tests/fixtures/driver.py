@@ -10,6 +10,7 @@ from aiorm.interfaces import IDriver
 class DummyCursor:
     last_query = None
     last_parameters = None
+    rowcount = 1
     # set many query results in those vars
     return_many = [None,]
     return_one = [None]
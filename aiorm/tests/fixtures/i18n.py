@@ -0,0 +1,19 @@
+from aiorm import orm
+
+
+@orm.table(database='i18n', name='translation')
+class Translation:
+
+    lang = orm.PrimaryKey(orm.String, length=2)
+    key = orm.PrimaryKey(orm.String, length=50)
+    value = orm.Column(orm.Text)
+
+
+class I18nFixture:
+
+    def setUp(self):
+        orm.scan('aiorm.tests.fixtures.i18n')
+
+    def tearDown(self):
+        from aiorm.orm.declaration.meta import db
+        db.pop('i18n')
@@ -136,9 +136,9 @@ class SchemaTestCase(TestCase):
         user = sample.User(id=1)
         meta = sample.User.__meta__
         self.assertEqual(sorted(meta.keys()),
-                         ['alias', 'attributes', 'collation', 'columns',
-                          'database', 'foreign_keys', 'pkv', 'primary_key',
-                          'tablename'])
+                         ['alias', 'attributes', 'cache', 'cache_results',
+                          'collation', 'columns', 'compiled', 'database',
+                          'foreign_keys', 'pkv', 'primary_key', 'tablename'])
         self.assertEqual(meta['database'], 'sample')
         self.assertEqual(meta['tablename'], 'user')
         self.assertEqual(meta['collation'], 'en_US.UTF8')
@@ -156,3 +156,21 @@ class SchemaTestCase(TestCase):
         self.assertEqual(meta['primary_key'],
                          {'group_id': sample.UserGroup.group_id,
                           'user_id': sample.UserGroup.user_id})
+
+    def test_values(self):
+        from aiorm.orm.declaration.columns import ImmutableFieldUpdateError
+        from aiorm.orm.declaration.meta import get_values, set_values
+        self.assertEqual(sample.Group.created_at.index, 0)
+        self.assertEqual(sample.Group.id.index, 1)
+        self.assertEqual(sample.Group.name.index, 2)
+
+        group = sample.Group(name='staff')
+        self.assertIsNone(group.id)
+        self.assertEqual(get_values(group)[2], 'staff')
+        self.assertNotIn(group, sample.Group.name.data)
+
+        set_values(group, (None, 3, 'admin'))
+        self.assertEqual(group.id, 3)
+        self.assertEqual(group.name, 'admin')
+        with self.assertRaises(ImmutableFieldUpdateError):
+            group.id = 4
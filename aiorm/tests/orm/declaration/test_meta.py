@@ -55,4 +55,53 @@ class MetaTestCase(TestCase):
     def test_list_all_tables(self):
         from aiorm.orm.declaration.meta import list_all_tables
         tables = list_all_tables()
-        self.assertEqual(set(tables.keys()), {'sample'})
\ No newline at end of file
+        self.assertEqual(set(tables.keys()), {'sample'})
+
+class CompiledMetaTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture]
+
+    def test_compiled(self):
+        compiled = sample.Group.__meta__['compiled']
+        alias = sample.Group.__meta__['alias']
+        self.assertEqual(compiled.tablename, 'group')
+        self.assertEqual(compiled.columns, ('created_at', 'id', 'name'))
+        self.assertEqual(compiled.select_from,
+                         'SELECT {0}."created_at", {0}."id", {0}."name"\n'
+                         'FROM "group" AS {0}\n'.format(alias))
+        self.assertEqual(compiled.primary_key, ('id',))
+        self.assertEqual(compiled.get_where, '{}."id" = %s'.format(alias))
+        self.assertEqual(compiled.insert_attributes, ('created_at', 'name'))
+        self.assertEqual(compiled.insert_fields, '"created_at", "name"')
+        self.assertEqual(compiled.insert_placeholders, '%s, %s')
+        self.assertEqual(compiled.returning, '"created_at", "id", "name"')
+        self.assertEqual(compiled.update_attributes, ('created_at', 'name'))
+        self.assertEqual(compiled.update_set,
+                         '"created_at" = %s, "name" = %s')
+        self.assertEqual(dict(compiled.relations),
+                         {'users': sample.Group.users})
+
+    def test_compiled_read_only(self):
+        compiled = sample.Group.__meta__['compiled']
+        with self.assertRaises(AttributeError):
+            compiled.tablename = 'other'
+        with self.assertRaises(AttributeError):
+            compiled.other = 'other'
+
+    def test_changed_columns(self):
+        from aiorm.orm.declaration.meta import mark_loaded, changed_columns
+        group = sample.Group(id=1, name='one', created_at='now')
+        self.assertIsNone(changed_columns(group))
+        mark_loaded(group)
+        self.assertEqual(changed_columns(group), [])
+        group.name = 'two'
+        self.assertEqual(changed_columns(group), ['name'])
+
+    def test_relations_target(self):
+        self.assertIs(sample.UserPreference.preference.target,
+                      sample.Preference)
+        self.assertIs(sample.UserPreference.user.target, sample.User)
+        self.assertIs(sample.User.preferences.target, sample.UserPreference)
+        self.assertIs(sample.User.groups.target, sample.Group)
+        self.assertEqual(sample.User.groups.secondary_keys,
+                         (('user_id', 'id'),))
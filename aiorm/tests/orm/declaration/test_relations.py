@@ -74,10 +74,11 @@ class SchemaTestCase(TestCase):
 
             userpref = UserPreference(user_id=1, preference_id=19, value='1')
             created_at = datetime.now()
-            driver.DummyCursor.return_one = [
-                [created_at, 'default', 19, 'name', 'str'],
+            driver.DummyCursor.return_many = [
+                [[created_at, 'default', 19, 'name', 'str']],
             ]
             pref = yield from userpref.preference
+            self.assertEqual(driver.DummyCursor.last_parameters, [[19]])
             self.assertIsInstance(pref, Preference)
             self.assertEqual(pref.id, 19)
             self.assertEqual(pref.created_at, created_at)
@@ -85,12 +86,37 @@ class SchemaTestCase(TestCase):
             self.assertEqual(pref.type, 'str')
             self.assertEqual(pref.default, 'default')
 
-            driver.DummyCursor.return_one = [None]
+            driver.DummyCursor.return_many = [[]]
             pref = yield from userpref.preference
             self.assertEqual(pref.id, 19, 'The preference is not cached')
 
         asyncio.get_event_loop().run_until_complete(aiotest())
 
+    def test_one_to_one_batch_load(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.tests.fixtures.sample import UserPreference
+
+            userprefs = [UserPreference(id=1, preference_id=19),
+                         UserPreference(id=2, preference_id=20),
+                         UserPreference(id=3, preference_id=19),
+                         UserPreference(id=4, preference_id=21)]
+            driver.DummyCursor.return_many = [
+                [[None, None, 19, 'lang', 'str'],
+                 [None, None, 20, 'tz', 'str']],
+            ]
+            prefs = yield from asyncio.gather(
+                *[userpref.preference for userpref in userprefs] +
+                [userprefs[0].preference])
+            self.assertEqual(driver.DummyCursor.return_many, [])
+            self.assertEqual(driver.DummyCursor.last_parameters,
+                             [[19, 20, 21]])
+            self.assertEqual([pref and pref.key for pref in prefs],
+                             ['lang', 'tz', 'lang', None, 'lang'])
+            self.assertIs(prefs[0], prefs[2])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
     def test_one_to_one_set_foreign_key(self):
         from aiorm.tests.fixtures.sample import Preference, UserPreference
         preference = Preference(id=12)
@@ -174,3 +200,142 @@ class SchemaTestCase(TestCase):
             self.assertEqual(groups[1].name, 'staff')
 
         asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_prefetch(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.tests.fixtures.sample import User
+
+            driver.DummyCursor.return_many = [
+                [[None, 'a@b.c', None, 1, 'fr', None, 'alice', None],
+                 [None, 'b@b.c', None, 2, 'fr', None, 'bob', None]],
+                [[1, None, 10, 'user'],
+                 [2, None, 10, 'user'],
+                 [2, None, 20, 'staff']],
+                [[None, 30, 40, 2, 'one']],
+                ]
+            users = list((yield from stmt.Select(User).prefetch(
+                User.groups, User.preferences).run()))
+            self.assertEqual(driver.DummyCursor.return_many, [])
+            self.assertIn('"user_id" = ANY(%s)', driver.DummyCursor.last_query)
+            self.assertEqual(driver.DummyCursor.last_parameters, [[1, 2]])
+
+            groups = list((yield from users[1].groups))
+            self.assertEqual([group.name for group in groups],
+                             ['user', 'staff'])
+            self.assertEqual([group.id for group in (yield from
+                                                     users[0].groups)],
+                             [10])
+            self.assertEqual(list((yield from users[0].preferences)), [])
+            prefs = list((yield from users[1].preferences))
+            self.assertEqual([pref.value for pref in prefs], ['one'])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_join_load(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.tests.fixtures.sample import UserPreference
+
+            driver.DummyCursor.return_many = [
+                [[None, 1, 10, 5, 'one', None, None, 10, 'lang', 'str'],
+                 [None, 2, 11, 5, 'two', None, None, None, None, None]],
+                ]
+            prefs = list((yield from stmt.Select(UserPreference).join_load(
+                UserPreference.preference).where(
+                    UserPreference.user_id == 5).run()))
+            query = driver.DummyCursor.last_query
+            self.assertIn('LEFT JOIN  "preference" AS {0} ON {0}."id" = '
+                          '{1}."preference_id"\nWHERE '.format(
+                              UserPreference.preference.target.__meta__[
+                                  'alias'],
+                              UserPreference.__meta__['alias']),
+                          query)
+            self.assertEqual(driver.DummyCursor.last_parameters, [5])
+            self.assertEqual([pref.value for pref in prefs], ['one', 'two'])
+
+            preference = yield from prefs[0].preference
+            self.assertEqual(preference.key, 'lang')
+            self.assertIsNone((yield from prefs[1].preference))
+            self.assertEqual(driver.DummyCursor.return_many, [])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_join_load_result(self):
+        from aiorm.orm.query import statements as stmt
+        from aiorm.tests.fixtures.sample import UserPreference
+        select = stmt.Select(UserPreference).join_load(
+            UserPreference.preference)
+        for result in ('tuple', 'namedtuple', 'dict'):
+            self.assertRaises(RuntimeError,
+                              asyncio.get_event_loop().run_until_complete,
+                              select.run(result=result))
+
+    def test_join_load_one_to_many(self):
+        from aiorm.orm.query import statements as stmt
+        from aiorm.tests.fixtures.sample import User
+        self.assertRaises(RuntimeError,
+                          stmt.Select(User).join_load, User.preferences)
+        self.assertRaises(RuntimeError,
+                          stmt.Select(User).join_load, User.groups)
+
+    def test_cache(self):
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import events, statements as stmt
+            from aiorm.tests.fixtures.sample import (User, UserPreference,
+                                                     Group, UserGroup)
+
+            for relation in (User.preferences, User.groups):
+                relation.cache = True
+                relation._resolve_foreign_keys()
+            try:
+                alice = User(id=1)
+                bob = User(id=2)
+                driver.DummyCursor.return_many = [
+                    [[None, 10, 20, 1, 'one']],
+                    [[None, 11, 20, 2, 'two']],
+                    [[None, 1, 'user']],
+                    [[None, 1, 'user']],
+                    ]
+                for _ in range(2):
+                    prefs = list((yield from alice.preferences))
+                    self.assertEqual([pref.value for pref in prefs], ['one'])
+                    list((yield from bob.preferences))
+                    list((yield from alice.groups))
+                    list((yield from bob.groups))
+                self.assertEqual(driver.DummyCursor.return_many, [])
+
+                # the preference of alice moves to bob
+                prefs[0].user_id = 2
+                driver.DummyCursor.return_one = [[None, 10, 20, 2, 'one']]
+                yield from stmt.Update(prefs[0]).run()
+                self.assertNotIn(alice, User.preferences.data)
+                self.assertNotIn(bob, User.preferences.data)
+
+                yield from stmt.Delete.many([(1, 2)], UserGroup).run()
+                self.assertIn(alice, User.groups.data)
+                self.assertNotIn(bob, User.groups.data)
+                driver.DummyCursor.return_one = [[None, 2, 'staff']]
+                yield from stmt.Insert(Group(name='staff')).run()
+                self.assertIn(alice, User.groups.data)
+                yield from stmt.Delete(Group).run()
+                self.assertNotIn(alice, User.groups.data)
+
+                driver.DummyCursor.return_many = [[], []]
+                self.assertEqual(list((yield from alice.preferences)), [])
+                self.assertIn(alice, User.preferences.data)
+                self.assertEqual(list((yield from
+                                       User.preferences.refresh(alice))), [])
+                self.assertEqual(driver.DummyCursor.return_many, [])
+            finally:
+                for relation in (User.preferences, User.groups):
+                    relation.cache = False
+                    relation.invalidate()
+                events.unsubscribe(User.preferences._on_write, UserPreference)
+                events.unsubscribe(User.groups._on_secondary_write, UserGroup)
+                events.unsubscribe(User.groups._on_target_write, Group)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
@@ -3,6 +3,7 @@ from unittest import mock
 
 from aiorm.tests.testing import TestCase
 from aiorm.tests.fixtures import sample
+from aiorm.tests.fixtures.i18n import I18nFixture, Translation
 
 
 class DialectTestCase(TestCase):
@@ -62,6 +63,119 @@ RETURNING "created_at", "id", "name"
 """)
         self.assertEqual(self._dialect.parameters, ['test'])
 
+    def test_render_insert_many(self):
+        groups = [sample.Group(name='one'),
+                  sample.Group(name='two', created_at='XXX now XXX')]
+        self._dialect.render_insert_many(groups)
+        self._dialect.render_returning(sample.Group)
+        self.assertEqual(self._dialect.query, """\
+INSERT INTO "group"("created_at", "name")
+VALUES ((NOW() at time zone 'utc'), %s),
+       (%s, %s)
+RETURNING "created_at", "id", "name"
+""")
+        self.assertEqual(self._dialect.parameters,
+                         ['one', 'XXX now XXX', 'two'])
+
+    def test_render_on_conflict(self):
+        user = sample.User(login='bob', email='bob@example.com')
+        self._dialect.render_insert(user, returning=False)
+        self._dialect.render_on_conflict(sample.User.login,
+                                         do_update=[sample.User.email])
+        self._dialect.render_returning(sample.User)
+        self.assertEqual(self._dialect.query, """\
+INSERT INTO "user"("created_at", "email", "firstname", "lang", "lastname", \
+"login", "password")
+VALUES ((NOW() at time zone 'utc'), %s, %s, %s, %s, %s, %s)
+ON CONFLICT ON CONSTRAINT "user_login" DO UPDATE SET "email" = EXCLUDED."email"
+RETURNING "created_at", "email", "firstname", "id", "lang", "lastname", \
+"login", "password"
+""")
+
+    def test_render_on_conflict_targets(self):
+        self._dialect._from_model = sample.Group
+        self._dialect.render_on_conflict(sample.Group.id, do_nothing=True)
+        self.assertEqual(self._dialect.query,
+                         'ON CONFLICT ON CONSTRAINT "group_pkey" DO NOTHING\n')
+
+        # the primary key constraint, even for a primary key declared unique
+        self._dialect.query = ''
+        with mock.patch.object(sample.Group.id, 'unique', True):
+            self._dialect.render_on_conflict(sample.Group.id,
+                                             do_nothing=True)
+        self.assertEqual(self._dialect.query,
+                         'ON CONFLICT ON CONSTRAINT "group_pkey" DO NOTHING\n')
+
+        self._dialect.query = ''
+        self._dialect.render_on_conflict([sample.Group.name],
+                                         do_update=True)
+        self.assertEqual(self._dialect.query,
+                         'ON CONFLICT ("name") DO UPDATE SET '
+                         '"created_at" = EXCLUDED."created_at", '
+                         '"name" = EXCLUDED."name"\n')
+
+        self._dialect.query = ''
+        self._dialect.render_on_conflict('my_constraint', do_nothing=True)
+        self.assertEqual(self._dialect.query,
+                         'ON CONFLICT ON CONSTRAINT "my_constraint" '
+                         'DO NOTHING\n')
+
+        self.assertRaises(RuntimeError, self._dialect.render_on_conflict,
+                          sample.Group.id)
+        self.assertRaises(RuntimeError, self._dialect.render_on_conflict,
+                          sample.Group.id, do_update=True, do_nothing=True)
+
+    def test_render_copy(self):
+        self._dialect.render_copy(sample.Group, ['created_at', 'name'])
+        self.assertEqual(self._dialect.query, """\
+COPY "group" ("created_at", "name")
+FROM STDIN WITH (FORMAT text)
+""")
+        self.assertRaises(ValueError, self._dialect.render_copy,
+                          sample.Group, ['name'], 'csv')
+
+    def test_render_copy_text(self):
+        from datetime import datetime
+        fields = [sample.Group.id, sample.Group.created_at, sample.Group.name]
+        self.assertEqual(self._dialect.render_copy_start(), b'')
+        data = self._dialect.render_copy_rows(
+            fields,
+            [(1, datetime(2015, 1, 2, 3, 4, 5), 'a\tb\\c'),
+             (2, None, 'd\ne')])
+        self.assertEqual(data,
+                         b'1\t2015-01-02 03:04:05+00\ta\\tb\\\\c\n'
+                         b'2\t\\N\td\\ne\n')
+        self.assertEqual(self._dialect.render_copy_end(), b'')
+
+    def test_render_copy_text_timezone(self):
+        from datetime import datetime, timedelta, timezone
+        from aiorm import orm
+        paris = timezone(timedelta(hours=1))
+        value = datetime(2015, 1, 2, 4, 4, 5, tzinfo=paris)
+        self.assertEqual(self._dialect.render_copy_rows(
+            [sample.Group.created_at], [(value,)]),
+            b'2015-01-02 03:04:05+00\n')
+
+        field = orm.Column(orm.Timestamp)
+        field.type.with_timezone = False
+        self.assertEqual(self._dialect.render_copy_rows([field], [(value,)]),
+                         b'2015-01-02 03:04:05\n')
+
+    def test_render_copy_binary(self):
+        from datetime import datetime
+        fields = [sample.Group.id, sample.Group.created_at, sample.Group.name]
+        self.assertEqual(self._dialect.render_copy_start('binary'),
+                         b'PGCOPY\n\xff\r\n\x00' + b'\x00' * 8)
+        data = self._dialect.render_copy_rows(
+            fields, [(1, datetime(2000, 1, 1, 0, 0, 1), None)], 'binary')
+        self.assertEqual(data,
+                         b'\x00\x03'
+                         b'\x00\x00\x00\x04\x00\x00\x00\x01'
+                         b'\x00\x00\x00\x08\x00\x00\x00\x00\x00\x0f\x42\x40'
+                         b'\xff\xff\xff\xff')
+        self.assertEqual(self._dialect.render_copy_end('binary'),
+                         b'\xff\xff')
+
     def test_render_update(self):
         user = sample.User(id=89, login='john', email='j@hn.me',
                            created_at='XXX now XXX')
@@ -80,6 +194,51 @@ RETURNING "created_at", "email", "firstname", "id", "lang", "lastname", \
                          ['XXX now XXX', 'j@hn.me', 'first', None, 'last',
                           'john', None, 89])
 
+    def test_render_update_columns(self):
+        user = sample.User(id=89, login='john', firstname='first')
+        self._dialect.render_update(user, columns=['firstname'])
+        self.assertEqual(self._dialect.query, """\
+UPDATE "user"
+SET "firstname" = %s
+WHERE "id" = %s
+RETURNING "created_at", "email", "firstname", "id", "lang", "lastname", \
+"login", "password"
+""")
+        self.assertEqual(self._dialect.parameters, ['first', 89])
+
+    def test_render_update_many(self):
+        from datetime import datetime
+        now = datetime.now()
+        groups = [sample.Group(id=1, name='one', created_at=now),
+                  sample.Group(id=2, name='two', created_at=now)]
+        self._dialect.render_update_many(groups, ['created_at', 'name'])
+        self.assertEqual(self._dialect.query, """\
+UPDATE "group"
+SET "created_at" = v."created_at", "name" = v."name"
+FROM (VALUES (%s::int, %s::timestamp, %s::varchar),
+              (%s, %s, %s)) AS v ("id", "created_at", "name")
+WHERE "group"."id" = v."id"
+""")
+        self.assertEqual(self._dialect.parameters,
+                         [1, now, 'one', 2, now, 'two'])
+
+    def test_render_update_many_coumpound_pk(self):
+        user_groups = [sample.UserGroup(user_id=18, group_id=76)]
+        self._dialect.render_update_many(user_groups, [])
+        self.assertIn('WHERE "user_group"."group_id" = v."group_id" '
+                      'AND "user_group"."user_id" = v."user_id"\n',
+                      self._dialect.query)
+        self.assertEqual(self._dialect.parameters, [76, 18])
+
+    def test_render_delete_coumpound_pk(self):
+        user_group = sample.UserGroup(user_id=18, group_id=76)
+        self._dialect.render_delete(user_group)
+        self.assertEqual(self._dialect.query, """\
+DELETE FROM "user_group"
+WHERE "group_id" = %s AND "user_id" = %s
+""")
+        self.assertEqual(self._dialect.parameters, [76, 18])
+
     def test_render_delete(self):
         user = sample.User(id=89, login='john', email='j@hn.me')
         self._dialect.render_delete(user)
@@ -90,6 +249,34 @@ WHERE "id" = %s
         self.assertEqual(self._dialect.parameters,
                          [89])
 
+    def test_render_delete_from(self):
+        self._dialect.render_delete_from(sample.User)
+        self._dialect.render_where(sample.User.lang == 'fr')
+        self.assertEqual(self._dialect.query, """\
+DELETE FROM "user" AS {0}
+WHERE {0}."lang" = %s
+""".format(sample.User.__meta__['alias']))
+        self.assertEqual(self._dialect.parameters, ['fr'])
+
+    def test_render_delete_many(self):
+        self._dialect.render_delete_many(sample.User, [(1,), (2,)])
+        self.assertEqual(self._dialect.query, """\
+DELETE FROM "user"
+WHERE "id" = ANY(%s)
+""")
+        self.assertEqual(self._dialect.parameters, [[1, 2]])
+
+    def test_render_delete_many_coumpound_pk(self):
+        self._dialect.render_delete_many(sample.UserGroup, [(1, 2), (3, 4)])
+        self.assertEqual(self._dialect.query, """\
+DELETE FROM "user_group"
+USING (VALUES (%s::int, %s::int),
+             (%s, %s)) AS v ("group_id", "user_id")
+WHERE "user_group"."group_id" = v."group_id" \
+AND "user_group"."user_id" = v."user_id"
+""")
+        self.assertEqual(self._dialect.parameters, [1, 2, 3, 4])
+
     def test_render_join(self):
         self._dialect._from_model = sample.User
         user_group = sample.UserGroup(user_id=89, group_id=7)
@@ -131,6 +318,56 @@ ORDER BY {}."name", {}."login"
 """.format(sample.Group.__meta__['alias'], sample.User.__meta__['alias']))
         self.assertEqual(self._dialect.parameters, [])
 
+    def test_render_any(self):
+        from aiorm import orm
+        self._dialect.render_where(orm.any_(sample.Group.id, (1, 2)))
+        self.assertEqual(self._dialect.query,
+                         'WHERE {}."id" = ANY(%s)\n'
+                         ''.format(sample.Group.__meta__['alias']))
+        self.assertEqual(self._dialect.parameters, [[1, 2]])
+
+    def test_render_select_join_load(self):
+        self._dialect.render_select(sample.UserPreference,
+                                    join_load=[sample.UserPreference.user])
+        self.assertEqual(self._dialect.query, """\
+SELECT {0}."created_at", {0}."id", {0}."preference_id", {0}."user_id", \
+{0}."value", {1}."created_at", {1}."email", {1}."firstname", {1}."id", \
+{1}."lang", {1}."lastname", {1}."login", {1}."password"
+FROM "user_preference" AS {0}
+LEFT JOIN  "user" AS {1} ON {1}."id" = {0}."user_id"
+""".format(sample.UserPreference.__meta__['alias'],
+           sample.User.__meta__['alias']))
+
+    def test_render_select_related(self):
+        self._dialect.render_select_related(sample.User.groups, [1, 2])
+        self.assertEqual(self._dialect.query, """\
+SELECT {1}."user_id", {0}."created_at", {0}."id", {0}."name"
+FROM "group" AS {0}
+INNER JOIN  "user_group" AS {1} ON "{0}".id = "{1}".group_id
+WHERE {1}."user_id" = ANY(%s)
+""".format(sample.Group.__meta__['alias'],
+           sample.UserGroup.__meta__['alias']))
+        self.assertEqual(self._dialect.parameters, [[1, 2]])
+
+    def test_render_keyset(self):
+        self._dialect.render_keyset((sample.Group.name, sample.Group.id),
+                                    ['staff', 7])
+        self._dialect.render_order_by(sample.Group.name, sample.Group.id)
+        self.assertEqual(self._dialect.query, """\
+WHERE ({0}."name", {0}."id") > (%s, %s)
+ORDER BY {0}."name", {0}."id"
+""".format(sample.Group.__meta__['alias']))
+        self.assertEqual(self._dialect.parameters, ['staff', 7])
+
+    def test_render_keyset_where(self):
+        self._dialect.render_where(sample.Group.name == 'staff')
+        self._dialect.render_keyset((sample.Group.id,), [7])
+        self.assertEqual(self._dialect.query, """\
+WHERE {0}."name" = %s
+  AND ({0}."id") > (%s)
+""".format(sample.Group.__meta__['alias']))
+        self.assertEqual(self._dialect.parameters, ['staff', 7])
+
     def test_render_equal(self):
         equal = mock.Mock()
         equal.column = sample.Group.name
@@ -221,6 +458,29 @@ ORDER BY {}."name", {}."login"
         self.assertEqual(self._dialect.parameters, [])
 
 
+class CompositeStringKeyTestCase(TestCase):
+
+    _fixtures = [I18nFixture]
+
+    def setUp(self):
+        super().setUp()
+        from aiorm.orm.dialect.postgresql import Dialect
+        self._dialect = Dialect()
+
+    def test_render_delete_many(self):
+        self._dialect.render_delete_many(Translation,
+                                         [('hello', 'en'), ('hello', 'fr')])
+        self.assertEqual(self._dialect.query, """\
+DELETE FROM "translation"
+USING (VALUES (%s::varchar, %s::varchar),
+             (%s, %s)) AS v ("key", "lang")
+WHERE "translation"."key" = v."key" \
+AND "translation"."lang" = v."lang"
+""")
+        self.assertEqual(self._dialect.parameters,
+                         ['hello', 'en', 'hello', 'fr'])
+
+
 class CreateTableDialectTestCase(TestCase):
 
     _fixtures = [sample.SampleFixture]
@@ -0,0 +1,92 @@
+from aiorm.tests.testing import TestCase
+
+
+class LRUCacheTestCase(TestCase):
+
+    def test_get_set(self):
+        from aiorm.orm.query.cache import LRUCache
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'evictions': 0,
+                          'size': 1, 'maxsize': 2})
+
+    def test_evict_least_recently_used(self):
+        from aiorm.orm.query.cache import LRUCache
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_pop_clear(self):
+        from aiorm.orm.query.cache import LRUCache
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertIsNone(cache.pop('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        cache.reset_stats()
+        self.assertEqual((cache.hits, cache.misses, cache.evictions),
+                         (0, 0, 0))
+
+    def test_ttl(self):
+        from unittest import mock
+        from aiorm.orm.query.cache import LRUCache
+        cache = LRUCache(ttl=10)
+        with mock.patch('time.monotonic', return_value=100):
+            cache.set('a', 1)
+            cache.set('b', 2, ttl=20)
+        with mock.patch('time.monotonic', return_value=115):
+            self.assertNotIn('a', cache)
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+            self.assertEqual(len(cache), 1)
+
+
+class ResultCacheTestCase(TestCase):
+
+    def test_maxbytes(self):
+        from aiorm.orm.query.cache import ResultCache, _rows_size
+        rows = [(1, 'one'), (2, 'two')]
+        size = _rows_size(rows)
+        cache = ResultCache(maxbytes=size * 2)
+        cache.set('a', rows)
+        cache.set('b', rows)
+        self.assertEqual(cache.bytes, size * 2)
+        cache.set('c', rows)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.bytes, size * 2)
+        cache.set('d', rows * 10)  # larger than the cache
+        self.assertNotIn('d', cache)
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['bytes'],
+                          stats['maxbytes']), (2, 1, size * 2, size * 2))
+
+    def test_invalidate(self):
+        from aiorm.orm.query.cache import ResultCache
+        cache = ResultCache()
+        cache.set('a', [], tables={('db', 'a')})
+        cache.set('ab', [], tables={('db', 'a'), ('db', 'b')})
+        cache.set('b', [], tables={('db', 'b')})
+        cache.set('any', [])
+        generation = cache.generation
+        cache.invalidate(('db', 'a'))
+        self.assertEqual(cache.generation, generation + 1)
+        self.assertEqual([key for key in ('a', 'ab', 'b', 'any')
+                          if key in cache], ['b'])
+        cache.set('c', [], tables={('db', 'b')}, generation=generation)
+        self.assertNotIn('c', cache)
+        cache.invalidate()
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+        self.assertEqual(cache._tables, {})
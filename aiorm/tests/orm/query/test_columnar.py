@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone, timedelta
+
+from aiorm.tests.testing import TestCase
+from aiorm.tests.fixtures import driver
+from aiorm.tests.fixtures import dialect
+from aiorm.tests.fixtures import sample
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class ColumnarTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture,
+                 driver.DriverFixture,
+                 dialect.DialectFixture,
+                 ]
+
+    def test_dtype(self):
+        from aiorm.orm.query.columnar import NumpyDtype
+        self.assertEqual(sample.User.id.type.render_sql(NumpyDtype()),
+                         ('int64', None))
+        self.assertEqual(
+            sample.User.id.type.render_sql(NumpyDtype(nullable=True)),
+            ('float64', None))
+        self.assertEqual(sample.User.login.type.render_sql(NumpyDtype()),
+                         (object, None))
+        dtype, converter = sample.User.created_at.type.render_sql(
+            NumpyDtype())
+        self.assertEqual(dtype, 'datetime64[us]')
+        self.assertEqual(converter(datetime(2015, 1, 1, 2,
+                                            tzinfo=timezone(timedelta(
+                                                hours=2)))),
+                         datetime(2015, 1, 1))
+
+    def test_builder(self):
+        from aiorm.orm.query.columnar import ColumnsBuilder
+        builder = ColumnsBuilder(sample.Group, capacity=2)
+        builder.append([(datetime(2015, 1, 1), 1, 'one'),
+                        (datetime(2015, 1, 2), 2, 'two')])
+        builder.append([(None, 3, ['three'])])
+        self.assertEqual(builder.capacity, 4)
+        columns = builder.build()
+        self.assertEqual(sorted(columns), ['created_at', 'id', 'name'])
+        self.assertEqual(columns['id'].dtype, numpy.int64)
+        self.assertEqual(columns['id'].tolist(), [1, 2, 3])
+        self.assertEqual(columns['name'].tolist(), ['one', 'two', ['three']])
+        self.assertEqual(str(columns['created_at'][0]),
+                         '2015-01-01T00:00:00.000000')
+        self.assertTrue(numpy.isnat(columns['created_at'][2]))
+
+    def test_to_columns(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            driver.DummyCursor.return_many = [[(None, 1, 'one'),
+                                               (None, 2, 'two')],
+                                              [(None, 3, 'three')]]
+            yield from registry.connect('/sample')
+            columns = yield from stmt.Select(sample.Group).where(
+                sample.Group.name == 'one').to_columns(batch_size=2)
+            yield from registry.disconnect('sample')
+            self.assertEqual(columns['id'].tolist(), [1, 2, 3])
+            self.assertEqual(columns['name'].tolist(),
+                             ['one', 'two', 'three'])
+            self.assertEqual(driver.DummyCursor.return_many, [])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
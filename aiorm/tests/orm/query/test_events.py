@@ -0,0 +1,122 @@
+import asyncio
+
+from aiorm.tests.testing import TestCase
+from aiorm.tests.fixtures import driver
+from aiorm.tests.fixtures import dialect
+from aiorm.tests.fixtures import sample
+
+
+class WriteEventTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture,
+                 driver.DriverFixture,
+                 dialect.DialectFixture,
+                 ]
+
+    def test_values(self):
+        from aiorm.orm.query.events import WriteEvent
+        from aiorm.orm.query.statements import _set_columns
+        pref = _set_columns(sample.UserPreference(), [None, 1, 20, 2, 'x'])
+        pref.user_id = 3
+        event = WriteEvent(sample.UserPreference, 'update', [pref],
+                           [pref.__dict__['__loaded__']])
+        self.assertEqual(event.values('user_id'), {2, 3})
+        self.assertEqual(event.values('id'), {1})
+
+        event = WriteEvent(sample.UserGroup, 'delete',
+                           primary_keys=[(1, 2), (1, 3)])
+        self.assertEqual(event.values('group_id'), {1})
+        self.assertEqual(event.values('user_id'), {2, 3})
+
+        event = WriteEvent(sample.UserPreference, 'delete', primary_keys=[1])
+        self.assertIsNone(event.values('user_id'))
+        self.assertIsNone(WriteEvent(sample.User, 'copy').values('id'))
+
+    def test_publish(self):
+        from aiorm.orm.query import events
+
+        received = []
+
+        def callback(event):
+            received.append(event)
+
+        def failing(event):
+            raise ValueError(event)
+
+        events.subscribe(callback, sample.Group)
+        events.subscribe(callback, sample.Group)
+        events.subscribe(failing)
+        try:
+            with self.assertLogs('aiorm.orm.query.events', 'ERROR'):
+                events.publish(events.WriteEvent(sample.User, 'copy'))
+            self.assertEqual(received, [])
+            event = events.WriteEvent(sample.Group, 'copy')
+            with self.assertLogs('aiorm.orm.query.events', 'ERROR'):
+                events.publish(event)
+            self.assertEqual(received, [event])
+        finally:
+            events.unsubscribe(callback, sample.Group)
+            events.unsubscribe(failing)
+        events.publish(event)
+        self.assertEqual(received, [event])
+
+    def test_published_by_statements(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import events, statements as stmt
+
+            received = []
+            events.subscribe(received.append, sample.Group)
+            yield from registry.connect('/sample')
+            try:
+                driver.DummyCursor.return_one = [[None, 1, 'staff']]
+                group = yield from stmt.Insert(
+                    sample.Group(name='staff')).run()
+                group.name = 'admin'
+                driver.DummyCursor.return_one = [[None, 1, 'admin']]
+                yield from stmt.Update(group).run()
+                yield from stmt.Delete(group).run()
+                yield from stmt.Delete(sample.Group).run()
+                yield from stmt.Delete.many([1, 2], sample.Group).run()
+            finally:
+                events.unsubscribe(received.append, sample.Group)
+                yield from registry.disconnect('sample')
+
+            self.assertEqual([event.action for event in received],
+                             ['insert', 'update', 'delete', 'delete',
+                              'delete'])
+            self.assertEqual(received[1].values('name'), {'staff', 'admin'})
+            self.assertEqual(received[2].models, [group])
+            self.assertIsNone(received[3].values('id'))
+            self.assertEqual(received[4].values('id'), {1, 2})
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_insert_many_not_returning(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import events, statements as stmt
+
+            received = []
+            events.subscribe(received.append)
+            yield from registry.connect('/sample')
+            try:
+                yield from stmt.Insert.many([sample.Group(name='staff')],
+                                            returning=False).run()
+                yield from stmt.Insert.many(
+                    [sample.UserGroup(group_id=1, user_id=2)],
+                    returning=False).run()
+            finally:
+                events.unsubscribe(received.append)
+                yield from registry.disconnect('sample')
+
+            # the autoincrement keys are unknown
+            self.assertIsNone(received[0].models)
+            self.assertIsNone(received[0].keys())
+            self.assertEqual(received[1].keys(), {(1, 2)})
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
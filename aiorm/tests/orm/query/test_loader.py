@@ -0,0 +1,41 @@
+import asyncio
+
+from aiorm.tests.testing import TestCase
+from aiorm.tests.fixtures import driver
+from aiorm.tests.fixtures import dialect
+from aiorm.tests.fixtures import sample
+
+
+class BatchLoaderTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture,
+                 driver.DriverFixture,
+                 dialect.DialectFixture,
+                 ]
+
+    def test_get_loader(self):
+        from aiorm.orm.query.loader import get_loader
+        loop = asyncio.get_event_loop()
+        loader = get_loader(sample.Group.id, loop)
+        self.assertIs(get_loader(sample.Group.id, loop), loader)
+        self.assertIsNot(get_loader(sample.Group.name, loop), loader)
+
+    def test_load_error(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query.loader import BatchLoader
+
+            yield from registry.connect('/sample')
+            driver.DummyCursor.return_many = []
+            loader = BatchLoader(sample.Group.id, asyncio.get_event_loop())
+            futures = [loader.load(1), loader.load(2)]
+            self.assertIs(loader.load(1), futures[0])
+            for future in futures:
+                with self.assertRaises(IndexError):
+                    yield from future
+            self.assertEqual(loader._loading, {})
+            yield from registry.disconnect('sample')
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+
+from aiorm.tests.testing import TestCase
+from aiorm.tests.fixtures import driver
+from aiorm.tests.fixtures import sample
+
+DSN = os.environ.get('AIORM_TEST_DSN')
+""" url of a PostgreSQL database, e.g. postgresql://u:p@localhost/test """
+
+
+class InvalidationChannelTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture, driver.DriverFixture]
+
+    @asyncio.coroutine
+    def aioSetUp(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        from aiorm.orm.query import events
+        registry.register(Dialect)
+        yield from registry.connect('/sample')
+        self.executed = []
+        self.received = []
+
+        @asyncio.coroutine
+        def execute(cursor, query, parameters=None):
+            self.executed.append((query, parameters))
+
+        patch = mock.patch.object(driver.DummyCursor, 'execute', new=execute)
+        patch.start()
+        self.addCleanup(patch.stop)
+        driver.DummyDriver.notifies = asyncio.Queue()
+        self.addCleanup(delattr, driver.DummyDriver, 'notifies')
+        events.subscribe(self.received.append, sample.Group)
+        self.addCleanup(events.unsubscribe, self.received.append,
+                        sample.Group)
+
+    @asyncio.coroutine
+    def aioTearDown(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        registry.unregister(Dialect)
+        yield from registry.disconnect('sample')
+
+    def _notified(self):
+        return [json.loads(parameters[1])
+                for query, parameters in self.executed
+                if query == 'SELECT pg_notify(%s, %s)']
+
+    def test_payloads(self):
+        from aiorm.orm.query import notify
+        from aiorm.orm.query.events import WriteEvent
+        channel = notify.InvalidationChannel('sample')
+        group = sample.Group(id=1, name='staff')
+        payloads = channel.payloads([
+            WriteEvent(sample.Group, 'update', [group]),
+            WriteEvent(sample.Group, 'update', primary_keys=[(2,)]),
+            WriteEvent(sample.UserGroup, 'delete'),
+            WriteEvent(sample.UserGroup, 'delete', primary_keys=[(1, 2)]),
+            ])
+        payloads = [json.loads(payload) for payload in payloads]
+        self.assertEqual(len(payloads), 2)
+        self.assertEqual(payloads[0][:3], [channel.node, 'group', 'update'])
+        self.assertEqual(sorted(payloads[0][3]), [[1], [2]])
+        self.assertEqual(payloads[1],
+                         [channel.node, 'user_group', 'delete', None])
+
+        with mock.patch.object(notify, 'MAX_PAYLOAD_SIZE', 64):
+            payloads = channel.payloads([WriteEvent(
+                sample.Group, 'delete', primary_keys=[(1,), (2,), (3,)])])
+            self.assertEqual(len(payloads), 2)
+            self.assertEqual(sorted(key for payload in payloads
+                                    for key in json.loads(payload)[3]),
+                             [[1], [2], [3]])
+
+    def test_apply(self):
+        from aiorm.orm.query import notify
+        channel = notify.InvalidationChannel('sample')
+        channel.apply(json.dumps(['other', 'group', 'delete', [[1]]]))
+        channel.apply(json.dumps([channel.node, 'group', 'delete', [[2]]]))
+        channel.apply(json.dumps(['other', 'unknown', 'delete', None]))
+        with self.assertLogs('aiorm.orm.query.notify', 'WARNING'):
+            channel.apply('not json')
+        self.assertEqual(len(self.received), 1)
+        self.assertTrue(self.received[0].remote)
+        self.assertEqual(self.received[0].keys(), {(1,)})
+
+    def test_listen_notify(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import notify, statements as stmt
+
+            channel = notify.InvalidationChannel('sample')
+            yield from channel.start()
+            yield from asyncio.sleep(0)
+            self.assertEqual(self.executed,
+                             [('LISTEN "aiorm_invalidation"', None)])
+
+            # writes out of transactions are notified per loop iteration
+            yield from stmt.Delete.many([1, 2], sample.Group).run()
+            yield from stmt.Delete.many([3], sample.Group).run()
+            for _ in range(3):
+                yield from asyncio.sleep(0)
+            notified, = self._notified()
+            self.assertEqual(notified[:3], [channel.node, 'group', 'delete'])
+            self.assertEqual(sorted(notified[3]), [[1], [2], [3]])
+
+            # writes of a transaction are notified before its commit
+            del self.executed[:]
+            transaction = Transaction('sample')
+            yield from stmt.Delete.many([4], sample.Group).run(
+                cursor=transaction)
+            self.assertEqual(self._notified(), [])
+            yield from transaction.commit()
+            self.assertEqual(self._notified(),
+                             [[channel.node, 'group', 'delete', [[4]]]])
+            self.assertEqual(self.executed[-1], ('commit', None))
+            # published again once committed, but not notified again
+            for _ in range(3):
+                yield from asyncio.sleep(0)
+            self.assertEqual(len(self._notified()), 1)
+
+            # writes of other nodes are published
+            del self.received[:]
+            yield from driver.DummyDriver.notifies.put(mock.Mock(
+                payload=json.dumps(['other', 'group', 'update', [[5]]])))
+            yield from asyncio.sleep(0)
+            self.assertEqual([(event.action, event.remote, event.keys())
+                              for event in self.received],
+                             [('update', True, {(5,)})])
+
+            yield from channel.stop()
+            self.assertEqual(self.executed[-1],
+                             ('UNLISTEN "aiorm_invalidation"', None))
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+
+    def test_rollback(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import notify, statements as stmt
+
+            channel = notify.InvalidationChannel('sample')
+            yield from channel.start()
+            try:
+                transaction = Transaction('sample')
+                yield from stmt.Delete.many([4], sample.Group).run(
+                    cursor=transaction)
+                yield from transaction.rollback()
+                # the transaction is reused, the writes rolled back are
+                # not notified on its commit
+                yield from transaction.begin()
+                yield from transaction.commit()
+                for _ in range(3):
+                    yield from asyncio.sleep(0)
+                self.assertEqual(self._notified(), [])
+                self.assertIn(('commit', None), self.executed)
+
+                yield from stmt.Delete.many([5], sample.Group).run(
+                    cursor=transaction)
+                yield from transaction.commit()
+                self.assertEqual(self._notified(),
+                                 [[channel.node, 'group', 'delete', [[5]]]])
+            finally:
+                yield from channel.stop()
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+@unittest.skipUnless(DSN, 'AIORM_TEST_DSN is not set')
+class PostgresInvalidationChannelTestCase(TestCase):
+    """ Two nodes notified by a real PostgreSQL server """
+
+    _fixtures = [sample.SampleFixture]
+
+    @asyncio.coroutine
+    def aioSetUp(self):
+        from aiorm import registry
+        from aiorm.driver.postgresql.aiopg import Driver
+        from aiorm.orm.dialect.postgresql import Dialect
+        from aiorm.orm.query import events
+        registry.register(Driver)
+        registry.register(Dialect)
+        yield from registry.connect(DSN, name='sample')
+        self.received = []
+        events.subscribe(self.received.append, sample.Group)
+        self.addCleanup(events.unsubscribe, self.received.append,
+                        sample.Group)
+
+    @asyncio.coroutine
+    def aioTearDown(self):
+        from aiorm import registry
+        from aiorm.driver.postgresql.aiopg import Driver
+        from aiorm.orm.dialect.postgresql import Dialect
+        yield from registry.disconnect('sample')
+        registry.unregister(Dialect)
+        registry.unregister(Driver)
+
+    @asyncio.coroutine
+    def _wait_remote(self, count, timeout=5):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while (len([event for event in self.received if event.remote]) <
+               count and loop.time() < deadline):
+            yield from asyncio.sleep(0.05)
+        return [event for event in self.received if event.remote]
+
+    def test_committed_write_applied_remotely(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import notify, statements as stmt
+
+            channels = [notify.InvalidationChannel(
+                'sample', channel='aiorm_test_invalidation')
+                for _ in range(2)]
+            for channel in channels:
+                yield from channel.start()
+            try:
+                yield from asyncio.sleep(0.5)  # the listeners are ready
+                transaction = Transaction('sample')
+                yield from transaction.execute(
+                    'CREATE TEMP TABLE "group" (id int PRIMARY KEY, '
+                    'created_at timestamp, name varchar(255)) '
+                    'ON COMMIT DROP')
+                yield from stmt.Delete.many([42], sample.Group).run(
+                    cursor=transaction)
+
+                # notifications are delivered once committed
+                self.assertEqual((yield from self._wait_remote(1, 0.5)), [])
+                yield from transaction.commit()
+
+                # every node applies the write notified by the other one
+                received = yield from self._wait_remote(2)
+                self.assertEqual([(event.action, event.keys())
+                                  for event in received],
+                                 [('delete', {(42,)})] * 2)
+            finally:
+                for channel in channels:
+                    yield from channel.stop()
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+from uuid import uuid4
+
+from aiorm.tests.testing import TestCase
+from aiorm.tests.fixtures import sample
+
+
+class RowCodecTestCase(TestCase):
+
+    def test_encode_decode(self):
+        from aiorm.orm.declaration import types as orm
+        from aiorm.orm.query.shared import RowCodec
+        types = [orm.Integer(), orm.Boolean(), orm.Timestamp(),
+                 orm.Timestamp(), orm.String(), orm.UUID(), orm.JSONB(),
+                 orm.Text()]
+        codec = RowCodec([Mock(type=type_) for type_ in types])
+        row = (-42, True,
+               datetime(2015, 1, 2, 3, 4, 5, 6,
+                        tzinfo=timezone(timedelta(hours=2))),
+               datetime(2015, 1, 2, 3, 4, 5, 6), 'été', uuid4(),
+               {'a': [1, None]}, None)
+        data = codec.encode(row)
+        decoded, end = codec.decode(b'xx' + data, 2)
+        self.assertEqual(decoded, row)
+        self.assertEqual(decoded[2].utcoffset(), timedelta(hours=2))
+        self.assertIsNone(decoded[3].tzinfo)
+        self.assertEqual(end, len(data) + 2)
+
+
+class SharedEntityCacheTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture]
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'group')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def _cache(self, **kwargs):
+        from aiorm.orm.query.shared import SharedEntityCache
+        cache = SharedEntityCache(self.path, **kwargs)
+        cache.bind(sample.Group)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_get_set(self):
+        from aiorm.orm.query.cache import not_found
+        cache = self._cache(slots=16, slot_size=128, negative_ttl=5)
+        other = self._cache(slots=16, slot_size=128)
+        row = (datetime(2015, 1, 2, tzinfo=timezone.utc), 1, 'staff')
+        self.assertIsNone(cache.get((1,)))
+        cache.set((1,), row)
+        cache.set((2,), None)
+        self.assertEqual(other.get((1,)), row)
+        self.assertIs(other.get((2,)), not_found)
+        self.assertNotIn((3,), other)
+        self.assertIsNone(other.get(('not an integer',)))
+        self.assertEqual(len(other), 2)
+        self.assertEqual((other.hits, other.misses), (2, 1))
+
+        cache.set((3,), (None, 3, 'x' * 128))  # larger than a slot
+        self.assertNotIn((3,), cache)
+        self.assertEqual(cache.oversized, 1)
+
+    def test_evict(self):
+        cache = self._cache(slots=16)
+        other = self._cache(slots=16)
+        cache.set((1,), (None, 1, 'one'))
+        cache.set((2,), (None, 2, 'two'))
+        generation = other.generation
+        other.evict([(1,)])
+        self.assertEqual(cache.generation, generation + 1)
+        self.assertNotIn((1,), cache)
+        self.assertIn((2,), cache)
+        # rows read before an eviction are not cached
+        cache.set((1,), (None, 1, 'one'), generation)
+        self.assertNotIn((1,), other)
+        other.evict()
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        from unittest import mock
+        cache = self._cache(ttl=10)
+        with mock.patch('time.time', return_value=100):
+            cache.set((1,), (None, 1, 'one'))
+        with mock.patch('time.time', return_value=105):
+            self.assertIn((1,), cache)
+        with mock.patch('time.time', return_value=115):
+            self.assertNotIn((1,), cache)
+
+    def test_invalid_file(self):
+        self._cache(slots=16)
+        self.assertRaises(ValueError, self._cache, slots=32)
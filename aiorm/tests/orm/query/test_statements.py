@@ -139,6 +139,17 @@ class SelectTestCase(TestCase):
         join = stmt.Select(sample.User).left_join
         self.assertIsInstance(join, stmt.LeftJoin)
 
+    def test_statement_resolved_once(self):
+        from aiorm import registry
+        from aiorm.orm.query import statements as stmt
+        stmt.Select(sample.User).where
+        self.assertEqual(stmt._statements['where'],
+                         (registry.version, stmt.Where))
+        self.assertIsInstance(stmt.Select(sample.User).where.order_by,
+                              stmt.OrderBy)
+        self.assertRaises(AttributeError, getattr, stmt.Select(sample.User),
+                          'not_a_statement')
+
     def test_run(self):
 
         @asyncio.coroutine
@@ -189,6 +200,423 @@ class SelectTestCase(TestCase):
 
         asyncio.get_event_loop().run_until_complete(aiotest())
 
+    def test_stream(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            dummy_dialect = dialect.DummyDialect()
+            dummy_dialect.configure_mock(**{
+                'render_declare_cursor.return_value': 'declare',
+                'render_fetch.return_value': 'fetch',
+                'render_close_cursor.return_value': 'close',
+                'render_commit_transaction.return_value': 'commit'})
+            driver.DummyCursor.return_many = [[range(3), range(10, 13)],
+                                              [range(20, 23)]]
+
+            yield from registry.connect('/sample')
+            stream = stmt.Select(sample.Group).stream(batch_size=2)
+            self.assertIsInstance(stream, stmt.Stream)
+            ids = []
+            try:
+                while True:
+                    group = yield from stream.__anext__()
+                    ids.append(group.id)
+            except StopAsyncIteration:
+                pass
+            yield from registry.disconnect('sample')
+            self.assertEqual(ids, [1, 11, 21])
+            dummy_dialect.render_fetch.assert_called_with(stream._name, 2)
+            dummy_dialect.render_close_cursor.assert_called_once_with(
+                stream._name)
+            self.assertEqual(driver.DummyCursor.last_query, 'commit')
+            self.assertEqual(driver.DummyCursor.return_many, [])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_stream_transaction(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import statements as stmt
+
+            dummy_dialect = dialect.DummyDialect()
+            dummy_dialect.configure_mock(**{
+                'render_close_cursor.return_value': 'close'})
+            driver.DummyCursor.return_many = [[range(3), range(10, 13)]]
+
+            yield from registry.connect('/sample')
+            transaction = yield from Transaction('sample').begin()
+            stream = stmt.Select(sample.Group).where(
+                sample.Group.name == 'one').stream(batch_size=5,
+                                                   cursor=transaction)
+            groups = yield from stream.fetchmany()
+            self.assertEqual([group.id for group in groups], [1, 11])
+            self.assertEqual((yield from stream.fetchmany()), [])
+            self.assertEqual(driver.DummyCursor.last_query, 'close')
+            self.assertIsNotNone(transaction.cursor)
+            yield from transaction.commit()
+            yield from registry.disconnect('sample')
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_stream_identity_map(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import statements as stmt
+
+            driver.DummyCursor.return_one = [[None, 1, 'one']]
+            driver.DummyCursor.return_many = [[[None, 1, 'one'],
+                                               [None, 2, 'two']]]
+            yield from registry.connect('/sample')
+            transaction = yield from Transaction(
+                'sample', identity_map=True).begin()
+            group = yield from stmt.Get(sample.Group, 1).run(
+                cursor=transaction)
+            groups = yield from stmt.Select(sample.Group).stream(
+                batch_size=5, cursor=transaction).fetchmany()
+            self.assertIs(groups[0], group)
+            self.assertIs(transaction.identity_map.get(sample.Group, (2,)),
+                          groups[1])
+            yield from transaction.commit()
+            yield from registry.disconnect('sample')
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_paginate_after(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            dummy_dialect = dialect.DummyDialect()
+            driver.DummyCursor.return_many = [[range(3), range(10, 13),
+                                               range(20, 23)],
+                                              [range(30, 33)]]
+            yield from registry.connect('/sample')
+            order_by = stmt.Select(sample.Group).order_by(sample.Group.id)
+            page = yield from order_by.paginate_after(page_size=2)
+            self.assertIsInstance(page, stmt.Page)
+            self.assertEqual([group.id for group in page], [1, 11])
+            self.assertFalse(dummy_dialect.render_keyset.called)
+            dummy_dialect.render_limit.assert_called_once_with(3)
+            self.assertEqual(stmt.decode_page_token(page.next_token), [11])
+
+            page = yield from order_by.paginate_after(page.next_token,
+                                                      page_size=2)
+            yield from registry.disconnect('sample')
+            self.assertEqual([group.id for group in page], [31])
+            self.assertIsNone(page.next_token)
+            dummy_dialect.render_keyset.assert_called_once_with(
+                (sample.Group.id,), [11])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_paginate_after_values(self):
+        from aiorm.orm.query import statements as stmt
+        order_by = stmt.Select(sample.Group).order_by(sample.Group.name,
+                                                      sample.Group.id)
+        self.assertRaises(RuntimeError,
+                          asyncio.get_event_loop().run_until_complete,
+                          order_by.paginate_after(1))
+        order_by.limit(10)
+        self.assertRaises(RuntimeError,
+                          asyncio.get_event_loop().run_until_complete,
+                          order_by.paginate_after())
+
+    def test_iterate_all(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            driver.DummyCursor.return_many = [[range(3), range(10, 13),
+                                               range(20, 23)],
+                                              [range(20, 23)]]
+            yield from registry.connect('/sample')
+            iterator = stmt.Select(sample.Group).order_by(
+                sample.Group.id).iterate_all(page_size=2)
+            ids = []
+            try:
+                while True:
+                    group = yield from iterator.__anext__()
+                    ids.append(group.id)
+            except StopAsyncIteration:
+                pass
+            yield from registry.disconnect('sample')
+            self.assertEqual(ids, [1, 11, 21])
+            self.assertEqual(driver.DummyCursor.return_many, [])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_page_token(self):
+        from datetime import datetime, timezone
+        from uuid import uuid4
+        from aiorm.orm.query import statements as stmt
+        values = [datetime(2015, 1, 2, 3, 4, 5, 6),
+                  datetime(2015, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+                  datetime(2015, 1, 2).date(), uuid4(), 'name', 42]
+        token = stmt.encode_page_token(values)
+        self.assertIsInstance(token, str)
+        self.assertEqual(stmt.decode_page_token(token), values)
+        self.assertRaises(ValueError, stmt.decode_page_token, 'not a token')
+
+    def test_run_result(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            rows = [(None, 1, 'one'), (None, 2, 'two')]
+            driver.DummyCursor.return_many = [rows, rows, rows]
+            yield from registry.connect('/sample')
+            select = stmt.Select(sample.Group)
+            tuples = yield from select.run(result='tuple')
+            namedtuples = yield from select.run(result='namedtuple')
+            dicts = yield from select.where(
+                sample.Group.name == 'one').run(result='dict')
+            yield from registry.disconnect('sample')
+
+            self.assertIs(tuples, rows)
+            self.assertEqual(namedtuples[1].name, 'two')
+            self.assertEqual(namedtuples[1], rows[1])
+            self.assertIs(type(namedtuples[0]),
+                          stmt._row_type('Group',
+                                         ('created_at', 'id', 'name')))
+            self.assertEqual(type(namedtuples[0]).__name__, 'GroupRow')
+            self.assertEqual(dicts, [{'created_at': None, 'id': 1,
+                                      'name': 'one'},
+                                     {'created_at': None, 'id': 2,
+                                      'name': 'two'}])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_run_result_projection(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.orm.query.functions import count
+
+            driver.DummyCursor.return_one = [(42,)]
+            row = yield from stmt.Select(count(sample.Group.id)).run(
+                cursor=driver.DummyCursor(), fetchall=False,
+                result='namedtuple')
+            self.assertEqual(row.count, 42)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_run_invalid_result(self):
+        from aiorm.orm.query import statements as stmt
+        self.assertRaises(ValueError,
+                          asyncio.get_event_loop().run_until_complete,
+                          stmt.Select(sample.Group).run(result='object'))
+
+
+class CachedTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture, driver.DriverFixture]
+
+    @asyncio.coroutine
+    def aioSetUp(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        from aiorm.orm.query.cache import result_cache
+        registry.register(Dialect)
+        result_cache.clear()
+        yield from registry.connect('/sample')
+
+    @asyncio.coroutine
+    def aioTearDown(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        from aiorm.orm.query.cache import result_cache
+        registry.unregister(Dialect)
+        result_cache.clear()
+        yield from registry.disconnect('sample')
+
+    def test_run_cached(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.orm.query.cache import result_cache
+
+            driver.DummyCursor.return_many = [[[None, 1, 'one']],
+                                              [[None, 1, 'uno']]]
+            for _ in range(2):
+                groups = list((yield from stmt.Select(sample.Group).where(
+                    sample.Group.id == 1).cached(ttl=10).run()))
+                self.assertEqual([group.name for group in groups], ['one'])
+            self.assertEqual(result_cache.hits, 1)
+            self.assertEqual(len(driver.DummyCursor.return_many), 1)
+
+            # other parameters, other rows
+            driver.DummyCursor.return_many.insert(0, [])
+            self.assertEqual(list((yield from stmt.Select(sample.Group).where(
+                sample.Group.id == 2).cached().run())), [])
+
+            # not cached in a transaction, nor without cached
+            driver.DummyCursor.return_many.insert(0, [])
+            yield from stmt.Select(sample.Group).where(
+                sample.Group.id == 1).cached().run(cursor=driver.DummyCursor())
+            driver.DummyCursor.return_many.insert(0, [])
+            yield from stmt.Select(sample.Group).where(
+                sample.Group.id == 1).run()
+            self.assertEqual(len(result_cache), 2)
+
+            # a write of the table evicts its rows
+            yield from stmt.Delete(sample.Group).run()
+            self.assertEqual(len(result_cache), 0)
+            groups = list((yield from stmt.Select(sample.Group).where(
+                sample.Group.id == 1).cached().run()))
+            self.assertEqual([group.name for group in groups], ['uno'])
+            self.assertEqual(driver.DummyCursor.return_many, [])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_run_cached_tables(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.orm.query.cache import result_cache
+
+            driver.DummyCursor.return_one = [[None, 1, 'one']]
+            driver.DummyCursor.return_many = [[]]
+            group = yield from stmt.Get(sample.Group, 1).cached().run()
+            yield from stmt.Select(sample.Group).join(
+                sample.UserGroup).cached().run()
+            self.assertEqual((yield from stmt.Get(sample.Group, 1)
+                              .cached().run()).name, group.name)
+            self.assertEqual(len(result_cache), 2)
+
+            yield from stmt.Delete.many([(1, 2)], sample.UserGroup).run()
+            self.assertEqual(len(result_cache), 1)
+            yield from stmt.Delete(group).run()
+            self.assertEqual(len(result_cache), 0)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_entity_cache(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.orm.query.cache import EntityCache, not_found
+
+            cache = EntityCache(negative_ttl=5)
+            sample.Group.__meta__['cache'] = cache
+            try:
+                driver.DummyCursor.return_one = [[None, 1, 'one'], None]
+                for _ in range(2):
+                    group = yield from stmt.Get(sample.Group, 1).run()
+                    self.assertEqual(group.name, 'one')
+                    self.assertIsNone((yield from stmt.Get(sample.Group,
+                                                           2).run()))
+                self.assertEqual(driver.DummyCursor.return_one, [])
+                self.assertIs(cache.get((2,)), not_found)
+
+                # rows of selects and returned by writes are cached
+                driver.DummyCursor.return_many = [[[None, 3, 'three']]]
+                list((yield from stmt.Select(sample.Group).run()))
+                self.assertEqual(cache.get((3,)), (None, 3, 'three'))
+                driver.DummyCursor.return_one = [[None, 2, 'two']]
+                yield from stmt.Insert(sample.Group(name='two')).run()
+                self.assertEqual(cache.get((2,)), (None, 2, 'two'))
+
+                # writes evict the rows, not in a transaction
+                group.name = 'uno'
+                driver.DummyCursor.return_one = [[None, 1, 'uno']]
+                yield from stmt.Update(group).run(cursor=driver.DummyCursor())
+                self.assertNotIn((1,), cache)
+                yield from stmt.Delete.many([3], sample.Group).run()
+                self.assertNotIn((3,), cache)
+                yield from stmt.Delete(sample.Group).run()
+                self.assertEqual(len(cache), 0)
+            finally:
+                sample.Group.__meta__['cache'] = None
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_entity_cache_key(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+            from aiorm.orm.query.cache import EntityCache
+
+            cache = EntityCache(negative_ttl=5)
+            sample.Group.__meta__['cache'] = cache
+            try:
+                # the key of the rows, whatever the type of the values
+                driver.DummyCursor.return_one = [[None, 1, 'one'], None]
+                group = yield from stmt.Get(sample.Group, '1').run()
+                self.assertEqual(group.name, 'one')
+                group = yield from stmt.Get(sample.Group, 1).run()
+                self.assertEqual(group.name, 'one')
+                self.assertIsNone((yield from stmt.Get(sample.Group,
+                                                       '2').run()))
+                self.assertEqual(driver.DummyCursor.return_one, [])
+                self.assertEqual(len(cache), 2)
+
+                # writes evict them
+                yield from stmt.Delete.many([1, 2], sample.Group).run()
+                self.assertEqual(len(cache), 0)
+
+                # values that cannot be cast are queried
+                driver.DummyCursor.return_one = [None, None]
+                for _ in range(2):
+                    self.assertIsNone((yield from stmt.Get(sample.Group,
+                                                           1.5).run()))
+                self.assertEqual(driver.DummyCursor.return_one, [])
+                self.assertEqual(len(cache), 0)
+            finally:
+                sample.Group.__meta__['cache'] = None
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_caches_evicted_after_commit(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import statements as stmt
+            from aiorm.orm.query.cache import EntityCache, result_cache
+
+            cache = EntityCache()
+            sample.Group.__meta__['cache'] = cache
+            try:
+                group = sample.Group(id=1, name='new')
+                transaction = Transaction('sample')
+                driver.DummyCursor.return_one = [[None, 1, 'new']]
+                yield from stmt.Update(group).run(cursor=transaction)
+                # rows committed before the transaction are read meanwhile
+                driver.DummyCursor.return_one = [[None, 1, 'old'],
+                                                 [None, 1, 'old']]
+                yield from stmt.Get(sample.Group, 1).run()
+                yield from stmt.Get(sample.Group, 1).cached().run()
+                self.assertEqual(cache.get((1,)), (None, 1, 'old'))
+                self.assertEqual(len(result_cache), 1)
+
+                yield from transaction.commit()
+                self.assertNotIn((1,), cache)
+                self.assertEqual(len(result_cache), 0)
+            finally:
+                sample.Group.__meta__['cache'] = None
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
 
 class InsertTestCase(TestCase):
 
@@ -203,7 +631,9 @@ class InsertTestCase(TestCase):
         user = sample.User(login='bob', firstname='bob')
         query, parameters = stmt.Insert(user).render_sql()
         dummy_dialect = dialect.DummyDialect()
-        dummy_dialect.render_insert.assert_called_once_with(user)
+        dummy_dialect.render_insert.assert_called_once_with(user,
+                                                            returning=False)
+        dummy_dialect.render_returning.assert_called_once_with(sample.User)
 
     def test_run(self):
 
@@ -223,6 +653,180 @@ class InsertTestCase(TestCase):
 
         asyncio.get_event_loop().run_until_complete(aiotest())
 
+    def test_many_render_sql(self):
+        from aiorm.orm.query import statements as stmt
+        groups = [sample.Group(name='one'), sample.Group(name='two')]
+        query, parameters = stmt.Insert.many(groups).render_sql()
+        dummy_dialect = dialect.DummyDialect()
+        dummy_dialect.render_insert_many.assert_called_once_with(groups)
+        dummy_dialect.render_returning.assert_called_once_with(sample.Group)
+
+        dummy_dialect.reset_mock()
+        stmt.Insert.many(groups, returning=False).render_sql()
+        self.assertFalse(dummy_dialect.render_returning.called)
+
+    def test_many_run(self):
+
+        @asyncio.coroutine
+        def aiotest():
+
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            driver.DummyCursor.return_many = [[range(3), range(10, 13)],
+                                              [range(20, 23)]]
+            yield from registry.connect('/sample')
+            groups = [sample.Group(name='one'),
+                      sample.Group(name='two'),
+                      sample.Group(name='three')]
+            inserted = yield from stmt.Insert.many(groups, chunk_size=2).run()
+            yield from registry.disconnect('sample')
+            self.assertEqual(inserted, groups)
+            self.assertEqual([group.id for group in groups], [1, 11, 21])
+            self.assertEqual(groups[2].to_dict(),
+                             {'created_at': 20, 'id': 21, 'name': 22})
+            self.assertEqual(driver.DummyCursor.return_many, [])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_on_conflict(self):
+        from aiorm.orm.query import statements as stmt
+        user = sample.User(login='bob')
+        insert = stmt.Insert(user)
+        on_conflict = insert.on_conflict(sample.User.login, do_nothing=True)
+        self.assertIsInstance(on_conflict, stmt.OnConflict)
+        insert.render_sql()
+        dummy_dialect = dialect.DummyDialect()
+        dummy_dialect.render_on_conflict.assert_called_once_with(
+            sample.User.login, do_nothing=True)
+        self.assertTrue(on_conflict.skips_rows)
+        self.assertEqual(on_conflict.key_attributes(sample.User), ['login'])
+
+    def test_many_on_conflict_do_nothing(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            # the group "two" already exists
+            driver.DummyCursor.return_many = [[(0, 1, 'one'),
+                                               (0, 3, 'three')]]
+            yield from registry.connect('/sample')
+            groups = [sample.Group(name='one'),
+                      sample.Group(name='two'),
+                      sample.Group(name='three')]
+            insert = stmt.Insert.many(groups)
+            insert.on_conflict(sample.Group.name, do_nothing=True)
+            yield from insert.run()
+            yield from registry.disconnect('sample')
+            self.assertEqual([group.id for group in groups], [1, None, 3])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_many_chunks(self):
+        from aiorm.orm.query import statements as stmt
+        groups = [sample.Group(name=str(idx)) for idx in range(5)]
+        insert = stmt.Insert.many(groups)
+        insert.max_parameters = 4
+        self.assertEqual([len(chunk) for chunk in insert._chunks(groups)],
+                         [2, 2, 1])
+
+
+class CopyTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture,
+                 driver.DriverFixture,
+                 ]
+
+    @asyncio.coroutine
+    def aioSetUp(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        registry.register(Dialect)
+        yield from registry.connect('/sample')
+
+    @asyncio.coroutine
+    def aioTearDown(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        registry.unregister(Dialect)
+        yield from registry.disconnect('sample')
+
+    def test_render_sql(self):
+        from aiorm.orm.query import statements as stmt
+        query, parameters = stmt.Copy(sample.Group).render_sql()
+        self.assertEqual(query, 'COPY "group" ("created_at", "name")\n'
+                                'FROM STDIN WITH (FORMAT text)\n')
+        self.assertEqual(parameters, [])
+
+    def test_run_copy_from(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from datetime import datetime, timedelta, timezone
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            copied = []
+
+            @asyncio.coroutine
+            def copy_from(statement, chunks, cursor=None):
+                copied.append((statement, list(chunks), cursor))
+
+            registry.get_driver('sample').copy_from = copy_from
+            now = datetime(2015, 1, 1)
+            aware = datetime(2015, 1, 1, 2, tzinfo=timezone(timedelta(
+                hours=2)))
+            rows = iter([(now, 'one'),
+                         sample.Group(name='two', created_at=now),
+                         (aware, 'three')])
+            count = yield from (stmt.Copy(sample.Group)
+                                .from_iterable(rows, chunk_size=2)
+                                .run())
+            self.assertEqual(count, 3)
+            self.assertEqual(copied,
+                             [('COPY "group" ("created_at", "name")\n'
+                               'FROM STDIN WITH (FORMAT text)\n',
+                               [b'',
+                                b'2015-01-01 00:00:00+00\tone\n'
+                                b'2015-01-01 00:00:00+00\ttwo\n',
+                                b'2015-01-01 00:00:00+00\tthree\n',
+                                b''],
+                               None)])
+
+            # utc_now() defaults take the client time
+            del copied[:]
+            yield from stmt.Copy(sample.Group).from_iterable(
+                [sample.Group(name='four')]).run()
+            created_at = copied[0][1][1].split(b'\t')[0].decode()
+            created_at = datetime.strptime(created_at[:-3],
+                                           '%Y-%m-%d %H:%M:%S.%f')
+            self.assertLess(abs(datetime.utcnow() - created_at),
+                            timedelta(minutes=1))
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_run_insert_fallback(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm.orm.query import statements as stmt
+
+            rows = [('XXX now XXX', 'one'), sample.Group(name='two'),
+                    ('XXX now XXX', 'three')]
+            count = yield from (stmt.Copy(sample.Group)
+                                .from_iterable(rows, chunk_size=2)
+                                .run())
+            self.assertEqual(count, 3)
+            self.assertEqual(driver.DummyCursor.last_query,
+                             'INSERT INTO "group"("created_at", "name")\n'
+                             'VALUES (%s, %s)\n')
+            self.assertEqual(driver.DummyCursor.last_parameters,
+                             ['XXX now XXX', 'three'])
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
 
 class UpdateTestCase(TestCase):
 
@@ -238,6 +842,88 @@ class UpdateTestCase(TestCase):
         dummy_dialect = dialect.DummyDialect()
         dummy_dialect.render_update.assert_called_once_with(user)
 
+    def test_render_sql_changed(self):
+        from aiorm.orm.declaration.meta import mark_loaded
+        from aiorm.orm.query import statements as stmt
+        user = sample.User(id=23, login='alice', firstname='alice')
+        mark_loaded(user)
+        user.firstname = 'Alice'
+        stmt.Update(user).render_sql()
+        dummy_dialect = dialect.DummyDialect()
+        dummy_dialect.render_update.assert_called_once_with(
+            user, columns=['firstname'])
+
+    def test_run_unchanged(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.declaration.meta import mark_loaded
+            from aiorm.orm.query import statements as stmt
+            driver.DummyCursor.last_query = None
+            user = sample.User(id=23, login='alice')
+            mark_loaded(user)
+            yield from registry.connect('/sample')
+            updated = yield from stmt.Update(user).run()
+            yield from registry.disconnect('sample')
+            self.assertIs(updated, user)
+            self.assertIsNone(driver.DummyCursor.last_query)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_many_render_sql(self):
+        from aiorm.orm.query import statements as stmt
+        groups = [sample.Group(id=1, name='one')]
+        stmt.Update.many(groups).render_sql()
+        dummy_dialect = dialect.DummyDialect()
+        dummy_dialect.render_update_many.assert_called_once_with(
+            groups, ['created_at', 'name'])
+
+        dummy_dialect.reset_mock()
+        stmt.Update.many(groups, columns=[sample.Group.name]).render_sql()
+        dummy_dialect.render_update_many.assert_called_once_with(groups,
+                                                                 ['name'])
+
+    def test_many_immutable(self):
+        from aiorm.orm.query import statements as stmt
+        groups = [sample.Group(id=1, name='one')]
+        self.assertRaises(RuntimeError,
+                          stmt.Update.many(groups,
+                                           columns=['id']).render_sql)
+
+    def test_many_run(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            yield from registry.connect('/sample')
+            groups = [sample.Group(id=idx, name=str(idx)) for idx in range(3)]
+            count = yield from stmt.Update.many(groups, chunk_size=2).run()
+            yield from registry.disconnect('sample')
+            # the dummy cursor update one row per statement
+            self.assertEqual(count, 2)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_many_run_no_columns(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            yield from registry.connect('/sample')
+            groups = [sample.Group(id=1, name='one')]
+            driver.DummyCursor.last_query = None
+            count = yield from stmt.Update.many(groups, columns=[]).run()
+            yield from registry.disconnect('sample')
+            self.assertEqual(count, 0)
+            self.assertIsNone(driver.DummyCursor.last_query)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
 
 class DeleteTestCase(TestCase):
 
@@ -253,6 +939,71 @@ class DeleteTestCase(TestCase):
         dummy_dialect = dialect.DummyDialect()
         dummy_dialect.render_delete.assert_called_once_with(user)
 
+    def test_render_sql_where(self):
+        from aiorm.orm.query import statements as stmt
+        condition = Mock()
+        delete = stmt.Delete(sample.User)
+        delete.where(condition)
+        delete.render_sql()
+        dummy_dialect = dialect.DummyDialect()
+        dummy_dialect.render_delete_from.assert_called_once_with(sample.User)
+        dummy_dialect.render_where.assert_called_once_with(condition)
+
+    def test_run(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            yield from registry.connect('/sample')
+            driver.DummyCursor.rowcount = 3
+            count = yield from stmt.Delete(sample.User).where(Mock()).run()
+            driver.DummyCursor.rowcount = 1
+            yield from registry.disconnect('sample')
+            self.assertEqual(count, 3)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_many_render_sql(self):
+        from aiorm.orm.query import statements as stmt
+        dummy_dialect = dialect.DummyDialect()
+        users = [sample.User(id=1), sample.User(id=2)]
+        stmt.Delete.many(users).render_sql()
+        dummy_dialect.render_delete_many.assert_called_once_with(
+            sample.User, [(1,), (2,)])
+
+        dummy_dialect.reset_mock()
+        stmt.Delete.many([(1, 2), {'user_id': 4, 'group_id': 3}],
+                         model_class=sample.UserGroup).render_sql()
+        dummy_dialect.render_delete_many.assert_called_once_with(
+            sample.UserGroup, [(1, 2), (3, 4)])
+
+    def test_many_render_sql_error(self):
+        from aiorm.orm.query import statements as stmt
+        self.assertRaises(RuntimeError, stmt.Delete.many([1, 2]).render_sql)
+        self.assertRaises(RuntimeError,
+                          stmt.Delete.many([(1, 2, 3)],
+                                           model_class=sample.UserGroup
+                                           ).render_sql)
+
+    def test_many_run(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm.query import statements as stmt
+
+            yield from registry.connect('/sample')
+            count = yield from stmt.Delete.many(range(5),
+                                                model_class=sample.User,
+                                                chunk_size=2).run()
+            yield from registry.disconnect('sample')
+            # the dummy cursor delete one row per statement
+            self.assertEqual(count, 3)
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
 
 class JoinTestCase(TestCase):
 
@@ -309,3 +1060,83 @@ class WhereTestCase(TestCase):
         dummy_dialect = dialect.DummyDialect()
         where.render_sql(dummy_dialect)
         dummy_dialect.render_where.assert_called_once_with(condition)
+
+
+class SQLCacheTestCase(TestCase):
+
+    _fixtures = [sample.SampleFixture]
+
+    def setUp(self):
+        super().setUp()
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        from aiorm.orm.query.cache import sql_cache
+        registry.register(Dialect)
+        sql_cache.clear()
+        sql_cache.reset_stats()
+
+    def tearDown(self):
+        from aiorm import registry
+        from aiorm.orm.dialect.postgresql import Dialect
+        registry.unregister(Dialect)
+        super().tearDown()
+
+    def test_select_same_shape(self):
+        from aiorm.orm.query import statements as stmt
+        from aiorm.orm.query.cache import sql_cache
+
+        select = stmt.Select(sample.User)
+        select.where(sample.User.login == 'alice').order_by(sample.User.id)
+        query, parameters = select.render_sql()
+        self.assertEqual(parameters, ['alice'])
+        self.assertEqual((sql_cache.hits, sql_cache.misses), (0, 1))
+
+        select = stmt.Select(sample.User)
+        select.where(sample.User.login == 'bob').order_by(sample.User.id)
+        query2, parameters = select.render_sql()
+        self.assertIs(query2, query)
+        self.assertEqual(parameters, ['bob'])
+        self.assertEqual((sql_cache.hits, sql_cache.misses), (1, 1))
+
+    def test_select_other_shape(self):
+        from aiorm.orm import in_
+        from aiorm.orm.query import statements as stmt
+        from aiorm.orm.query.cache import sql_cache
+
+        select = stmt.Select(sample.User)
+        select.where(in_(sample.User.id, 1, 2))
+        query, parameters = select.render_sql()
+        self.assertEqual(parameters, [1, 2])
+        select = stmt.Select(sample.User)
+        select.where(in_(sample.User.id, 1, 2, 3))
+        query2, parameters = select.render_sql()
+        self.assertNotEqual(query2, query)
+        self.assertEqual(parameters, [1, 2, 3])
+        select = stmt.Select(sample.User)
+        select.where(sample.User.id > 1)
+        query3, parameters = select.render_sql()
+        self.assertNotEqual(query3, query)
+        self.assertEqual(sql_cache.misses, 3)
+
+    def test_get(self):
+        from aiorm.orm.query import statements as stmt
+        from aiorm.orm.query.cache import sql_cache
+
+        query, parameters = stmt.Get(sample.UserGroup, user_id=1,
+                                     group_id=2).render_sql()
+        self.assertEqual(parameters, [2, 1])
+        query2, parameters = stmt.Get(sample.UserGroup, user_id=3,
+                                      group_id=4).render_sql()
+        self.assertIs(query2, query)
+        self.assertEqual(parameters, [4, 3])
+        self.assertEqual(sql_cache.hits, 1)
+
+    def test_uncached_join_condition(self):
+        from aiorm.orm.query import statements as stmt
+        from aiorm.orm.query.cache import sql_cache
+
+        for _ in range(2):
+            select = stmt.Select(sample.User)
+            select.join(sample.UserGroup, ['"x".id = "y".id'])
+            select.render_sql()
+        self.assertEqual(len(sql_cache), 0)
@@ -100,6 +100,61 @@ class TransactionTestCase(TestCase):
             yield from registry.disconnect('sample')
         asyncio.get_event_loop().run_until_complete(aiotest())
 
+    def test_after_commit(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm import Transaction
+
+            yield from registry.connect('/sample')
+            callback = Mock()
+
+            transaction = yield from Transaction('sample').begin()
+            transaction.after_commit(callback)
+            transaction.after_commit(callback)
+            self.assertFalse(callback.called)
+            yield from transaction.commit()
+            callback.assert_called_once_with(transaction)
+
+            callback.reset_mock()
+            transaction = yield from Transaction('sample').begin()
+            transaction.after_commit(callback)
+            yield from transaction.rollback()
+            yield from transaction.begin()
+            yield from transaction.commit()
+            self.assertFalse(callback.called)
+
+            yield from registry.disconnect('sample')
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_after_rollback(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm import Transaction
+
+            yield from registry.connect('/sample')
+            callback = Mock()
+
+            transaction = yield from Transaction('sample').begin()
+            transaction.after_rollback(callback)
+            transaction.after_rollback(callback)
+            yield from transaction.rollback()
+            callback.assert_called_once_with(transaction)
+
+            callback.reset_mock()
+            transaction = yield from Transaction('sample').begin()
+            transaction.after_rollback(callback)
+            yield from transaction.commit()
+            yield from transaction.begin()
+            yield from transaction.rollback()
+            self.assertFalse(callback.called)
+
+            yield from registry.disconnect('sample')
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
     def test_transaction_execute(self):
 
         @asyncio.coroutine
@@ -151,3 +206,56 @@ class TransactionTestCase(TestCase):
             self.assertEqual(result, [('one',), ('two',)])
             yield from registry.disconnect('sample')
         asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_identity_map(self):
+
+        @asyncio.coroutine
+        def aiotest():
+            from aiorm import registry
+            from aiorm.orm import Transaction
+            from aiorm.orm.query import statements as stmt
+
+            driver.DummyCursor.return_one = [(None, 1, 'one')]
+            driver.DummyCursor.return_many = [[(None, 1, 'uno'),
+                                               (None, 2, 'two')]]
+            yield from registry.connect('/sample')
+            transaction = yield from Transaction('sample',
+                                                 identity_map=True).begin()
+            group = yield from stmt.Get(sample.Group, 1).run(transaction)
+            driver.DummyCursor.last_query = None
+            same = yield from stmt.Get(sample.Group, id=1).run(transaction)
+            self.assertIs(same, group)
+            self.assertIsNone(driver.DummyCursor.last_query)
+
+            groups = list((yield from stmt.Select(sample.Group).run(
+                transaction)))
+            self.assertIs(groups[0], group)
+            self.assertEqual(group.name, 'one')
+            self.assertEqual(len(transaction.identity_map), 2)
+
+            yield from stmt.Delete(groups[1]).run(transaction)
+            self.assertIsNone(transaction.identity_map.get(sample.Group,
+                                                           (2,)))
+            yield from stmt.Delete.many([1], model_class=sample.Group).run(
+                transaction)
+            self.assertEqual(len(transaction.identity_map), 0)
+
+            yield from transaction.commit()
+            yield from registry.disconnect('sample')
+
+        asyncio.get_event_loop().run_until_complete(aiotest())
+
+    def test_identity_map_clear(self):
+        from aiorm.orm.query.transaction import IdentityMap
+        identity_map = IdentityMap()
+        group = sample.Group(id=1)
+        user = sample.User(id=1)
+        self.assertIs(identity_map.add(group), group)
+        self.assertIs(identity_map.add(sample.Group(id=1)), group)
+        identity_map.add(user)
+        self.assertIs(identity_map.get(sample.User, (1,)), user)
+        identity_map.clear(sample.Group)
+        self.assertIsNone(identity_map.get(sample.Group, (1,)))
+        self.assertEqual(len(identity_map), 1)
+        identity_map.clear()
+        self.assertEqual(len(identity_map), 0)
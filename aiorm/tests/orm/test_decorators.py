@@ -52,6 +52,9 @@ class TableDecoratorTestCase(TestCase):
                           'collation': 'fr_FR.UTF8',
                           'columns': None,
                           'attributes': None,
+                          'compiled': None,
+                          'cache_results': False,
+                          'cache': None,
                           'pkv': None,
                           'database': 'db0',
                           'foreign_keys': {},
@@ -54,6 +54,40 @@ class TestRegistry(TestCase):
         registry.unregister(Adapter)
         registry.unregister(Adapter2)
 
+    def test_registry_cache(self):
+
+        from zope.interface import Interface, implementer
+        from aiorm import registry
+
+        class IAdaptable(Interface):
+            pass
+
+        class IAdapter(Interface):
+            pass
+
+        @implementer(IAdapter)
+        class Adapter:
+            pass
+
+        @implementer(IAdapter)
+        class Adapter2:
+            pass
+
+        version = registry.version
+        registry.register(Adapter, adapt=IAdaptable)
+        self.assertGreater(registry.version, version)
+        self.assertEqual(registry.get(IAdapter, adapt=IAdaptable), Adapter)
+        self.assertIn((IAdapter, IAdaptable), registry._lookup_cache)
+        self.assertEqual(registry.get(IAdapter, adapt=IAdaptable), Adapter)
+
+        version = registry.version
+        registry.unregister(Adapter, IAdaptable)
+        self.assertGreater(registry.version, version)
+        self.assertNotIn((IAdapter, IAdaptable), registry._lookup_cache)
+        registry.register(Adapter2, adapt=IAdaptable)
+        self.assertEqual(registry.get(IAdapter, adapt=IAdaptable), Adapter2)
+        registry.unregister(Adapter2, IAdaptable)
+
 class TestDriver(TestCase):
 
     _fixtures = [DriverFixture]
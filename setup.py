@@ -18,6 +18,7 @@ with open(os.path.join(here, NAME, '__init__.py')) as version:
 requires = ['venusian>=1.0a7', 'aiopg', 'zope.interface']
 tests_require = ['coverage', 'nose']
 extras_require = {'test': tests_require,
+                  'numpy': ['numpy'],
                   }
 
 setup(name=NAME,